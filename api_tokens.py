@@ -0,0 +1,83 @@
+"""
+Bearer tokens for the /api/v1 JSON API (routes/api_routes.py).
+
+A token belongs to an admin account and is shown once when it is created;
+only its SHA-256 digest is stored, so a token can be checked with one
+indexed lookup and a leaked database does not leak working tokens.
+
+    flask --app main api-token create admin@school.org --name "MIS sync"
+    flask --app main api-token list
+    flask --app main api-token revoke 3
+"""
+import hashlib
+import secrets
+
+import click
+
+from app import db
+
+
+def _digest(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def issue_token(user, name):
+    """Create a token for `user`; returns the plain token (not stored). The caller commits."""
+    from models import ApiToken
+
+    token = secrets.token_urlsafe(32)
+    db.session.add(ApiToken(user_id=user.id, name=name, token_hash=_digest(token)))
+    return token
+
+
+def token_user(token):
+    """The User a plain token belongs to, or None."""
+    from models import ApiToken, User
+
+    if not token:
+        return None
+    return User.query.join(ApiToken, ApiToken.user_id == User.id) \
+        .filter(ApiToken.token_hash == _digest(token)).first()
+
+
+def init_api_token_cli(app):
+    @app.cli.group('api-token')
+    def api_token():
+        """Manage /api/v1 bearer tokens."""
+
+    @api_token.command('create')
+    @click.argument('email')
+    @click.option('--name', default='api', show_default=True, help='What the token is for.')
+    def create_command(email, name):
+        """Create a token for an admin account and print it (it is not shown again)."""
+        from models import User
+
+        user = User.query.filter_by(email=email).first()
+        if user is None:
+            raise click.ClickException(f'No account with email {email}')
+        if user.role != 'admin':
+            raise click.ClickException('API tokens can only be issued to admin accounts')
+        token = issue_token(user, name)
+        db.session.commit()
+        click.echo(token)
+
+    @api_token.command('list')
+    def list_command():
+        """List tokens (never their values)."""
+        from models import ApiToken
+
+        for token in ApiToken.query.order_by(ApiToken.id):
+            click.echo(f'{token.id:>4}  {token.user.email:<40} {token.name:<30} {token.created_at:%Y-%m-%d %H:%M}')
+
+    @api_token.command('revoke')
+    @click.argument('token_id', type=int)
+    def revoke_command(token_id):
+        """Delete a token by id."""
+        from models import ApiToken
+
+        token = db.session.get(ApiToken, token_id)
+        if token is None:
+            raise click.ClickException(f'No token {token_id}')
+        db.session.delete(token)
+        db.session.commit()
+        click.echo(f'Token {token_id} ({token.name}) revoked.')
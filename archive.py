@@ -0,0 +1,182 @@
+"""
+Academic-year archival of absences, substitutions and transfer requests.
+
+Once an academic year has closed, its rows are moved from the live Absence,
+Substitution and SubstitutionTransfer tables into the Archived* tables
+(models.py) with INSERT ... SELECT and DELETE in one transaction. The live
+tables then only hold the current year, so the planner, dashboard and the
+date-filtered pages never scan old data. Archived years stay available on
+the history page and its PDF exports (pick the year there).
+
+An academic year is identified by the calendar year it starts in; it runs
+from the first of ACADEMIC_YEAR_START_MONTH to the day before the same date
+a year later.
+
+    flask --app main archive status
+    flask --app main archive year 2024
+    flask --app main archive closed      # every closed year still in the live tables
+"""
+from datetime import date
+
+import click
+from flask import current_app
+from sqlalchemy import delete, func, insert, select, union
+from sqlalchemy.orm import aliased
+
+from app import db
+from utils import bump_data_versions, get_current_date
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def academic_year_of(day):
+    """The academic year (by its starting calendar year) a date falls in."""
+    start_month = current_app.config['ACADEMIC_YEAR_START_MONTH']
+    return day.year if day.month >= start_month else day.year - 1
+
+
+def academic_year_bounds(year):
+    """[start, end) dates of an academic year."""
+    start_month = current_app.config['ACADEMIC_YEAR_START_MONTH']
+    return date(year, start_month, 1), date(year + 1, start_month, 1)
+
+
+def academic_year_label(year):
+    if current_app.config['ACADEMIC_YEAR_START_MONTH'] == 1:
+        return str(year)
+    return f'{year}-{(year + 1) % 100:02d}'
+
+
+def current_academic_year():
+    return academic_year_of(get_current_date())
+
+
+def archived_years():
+    """Academic years present in the archive, newest first."""
+    from models import ArchivedAbsence, ArchivedSubstitution, ArchivedSubstitutionTransfer
+
+    query = union(*(select(model.academic_year).distinct()
+                    for model in (ArchivedAbsence, ArchivedSubstitution, ArchivedSubstitutionTransfer)))
+    return sorted(db.session.execute(query).scalars(), reverse=True)
+
+
+def live_years():
+    """Academic years that still have rows in the live tables, oldest first."""
+    from models import Absence, Substitution
+
+    earliest = [db.session.query(func.min(model.date)).scalar() for model in (Absence, Substitution)]
+    earliest = [d for d in earliest if d is not None]
+    if not earliest:
+        return []
+    return list(range(academic_year_of(min(earliest)), current_academic_year() + 1))
+
+
+def archive_year(year):
+    """
+    Move one closed academic year into the archive tables.
+    Returns the number of rows moved per table.
+    """
+    from models import (Absence, Substitution, SubstitutionTransfer, Teacher, UncoveredSlot,
+                        ArchivedAbsence, ArchivedSubstitution, ArchivedSubstitutionTransfer)
+
+    if year >= current_academic_year():
+        raise ArchiveError(f'Academic year {academic_year_label(year)} has not closed yet')
+    start, end = academic_year_bounds(year)
+
+    def in_year(model):
+        return (model.date >= start) & (model.date < end)
+
+    original, substitute = aliased(Teacher), aliased(Teacher)
+    year_subs = select(Substitution.id).where(in_year(Substitution))
+    counts = {}
+
+    try:
+        dates = set(db.session.execute(
+            union(select(Absence.date).where(in_year(Absence)),
+                  select(Substitution.date).where(in_year(Substitution)))).scalars())
+
+        counts['absences'] = db.session.execute(insert(ArchivedAbsence).from_select(
+            ['id', 'academic_year', 'teacher_id', 'teacher_name', 'date', 'day', 'reported_by', 'periods',
+             'created_at'],
+            select(Absence.id, year, Absence.teacher_id, Teacher.name, Absence.date, Absence.day,
+                   Absence.reported_by, Absence.periods, Absence.created_at)
+            .join(Teacher, Teacher.id == Absence.teacher_id)
+            .where(in_year(Absence)))).rowcount
+
+        counts['substitutions'] = db.session.execute(insert(ArchivedSubstitution).from_select(
+            ['id', 'academic_year', 'original_teacher_id', 'original_teacher_name', 'teacher_id', 'teacher_name',
+             'date', 'day', 'period', 'class_name', 'section', 'created_at'],
+            select(Substitution.id, year, Substitution.original_teacher_id, original.name,
+                   Substitution.teacher_id, substitute.name, Substitution.date, Substitution.day,
+                   Substitution.period, Substitution.class_name, Substitution.section, Substitution.created_at)
+            .join(original, original.id == Substitution.original_teacher_id)
+            .join(substitute, substitute.id == Substitution.teacher_id)
+            .where(in_year(Substitution)))).rowcount
+
+        counts['transfers'] = db.session.execute(insert(ArchivedSubstitutionTransfer).from_select(
+            ['id', 'academic_year', 'substitution_id', 'original_teacher_id', 'original_teacher_name',
+             'new_teacher_id', 'new_teacher_name', 'reason', 'request_date', 'action_date', 'status',
+             'transfer_all'],
+            select(SubstitutionTransfer.id, year, SubstitutionTransfer.substitution_id,
+                   SubstitutionTransfer.original_teacher_id, original.name,
+                   SubstitutionTransfer.new_teacher_id, substitute.name, SubstitutionTransfer.reason,
+                   SubstitutionTransfer.request_date, SubstitutionTransfer.action_date,
+                   SubstitutionTransfer.status, SubstitutionTransfer.transfer_all)
+            .join(original, original.id == SubstitutionTransfer.original_teacher_id)
+            .join(substitute, substitute.id == SubstitutionTransfer.new_teacher_id)
+            .where(SubstitutionTransfer.substitution_id.in_(year_subs)))).rowcount
+
+        # Transfers first: they reference the substitutions being removed
+        db.session.execute(delete(SubstitutionTransfer)
+                           .where(SubstitutionTransfer.substitution_id.in_(year_subs)))
+        db.session.execute(delete(Substitution).where(in_year(Substitution)))
+        db.session.execute(delete(Absence).where(in_year(Absence)))
+        # Uncovered slots are planning state, not history; they go with the plans
+        db.session.execute(delete(UncoveredSlot).where(in_year(UncoveredSlot)))
+
+        bump_data_versions(dates=dates, roster=True)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    current_app.logger.info('Archived academic year %s: %s', academic_year_label(year), counts)
+    return counts
+
+
+def init_archive_cli(app):
+    @app.cli.group('archive')
+    def archive_cli():
+        """Move closed academic years into the archive tables."""
+
+    @archive_cli.command('status')
+    def status_command():
+        """Show which academic years are live and which are archived."""
+        current = current_academic_year()
+        click.echo(f'Current academic year: {academic_year_label(current)}')
+        closed = [y for y in live_years() if y < current]
+        click.echo('Closed years in the live tables: '
+                   + (', '.join(academic_year_label(y) for y in closed) or 'none'))
+        click.echo('Archived years: ' + (', '.join(academic_year_label(y) for y in archived_years()) or 'none'))
+
+    @archive_cli.command('year')
+    @click.argument('year', type=int)
+    def year_command(year):
+        """Archive the academic year starting in YEAR."""
+        try:
+            counts = archive_year(year)
+        except ArchiveError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'{academic_year_label(year)}: ' + ', '.join(f'{n} {kind}' for kind, n in counts.items()))
+
+    @archive_cli.command('closed')
+    def closed_command():
+        """Archive every closed academic year still in the live tables."""
+        closed = [y for y in live_years() if y < current_academic_year()]
+        if not closed:
+            click.echo('Nothing to archive.')
+        for year in closed:
+            counts = archive_year(year)
+            click.echo(f'{academic_year_label(year)}: ' + ', '.join(f'{n} {kind}' for kind, n in counts.items()))
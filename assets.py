@@ -0,0 +1,297 @@
+"""
+Static asset pipeline.
+
+* `flask assets vendor` downloads the pinned third-party libraries into
+  static/vendor/ so pages never depend on a CDN being reachable.
+* `flask assets build` minifies our own JS/CSS, copies vendored files,
+  concatenates the files every page loads into the BUNDLES, and writes
+  content-hashed copies to static/dist/ together with manifest.json. It
+  fails if a vendored library is missing, so a built deployment never
+  reaches for a CDN.
+* Text files in the build also get .gz (and .br) siblings, which the
+  compression middleware serves without compressing on each request.
+* Templates call `asset_url('js/main.js')`, which resolves the hashed file
+  through the manifest, or `asset_bundle('app.js')` for a bundle's URLs (its
+  member files when nothing is built). Hashed files are served with a
+  far-future immutable Cache-Control header.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import urllib.request
+
+import click
+from flask import current_app, request, url_for
+
+from compression import write_precompressed
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/5.15.4'
+
+# Pinned third-party assets: vendored path (under static/) -> upstream URL.
+# The version is part of the path so upgrades never collide with old files.
+VENDOR_ASSETS = {
+    'vendor/bootstrap-agent-dark-theme/bootstrap.min.css':
+        'https://cdn.replit.com/agent/bootstrap-agent-dark-theme.min.css',
+    'vendor/bootstrap-5.3.0/bootstrap.bundle.min.js':
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'vendor/sweetalert2-11.10.5/sweetalert2.min.css':
+        'https://cdn.jsdelivr.net/npm/sweetalert2@11.10.5/dist/sweetalert2.min.css',
+    'vendor/sweetalert2-11.10.5/sweetalert2.all.min.js':
+        'https://cdn.jsdelivr.net/npm/sweetalert2@11.10.5/dist/sweetalert2.all.min.js',
+    'vendor/htmx-1.9.2/htmx.min.js':
+        'https://unpkg.com/htmx.org@1.9.2/dist/htmx.min.js',
+    'vendor/fontawesome-5.15.4/css/all.min.css':
+        f'{FONT_AWESOME}/css/all.min.css',
+}
+for _family in ('fa-brands-400', 'fa-regular-400', 'fa-solid-900'):
+    for _ext in ('woff2', 'woff', 'ttf', 'eot', 'svg'):
+        VENDOR_ASSETS[f'vendor/fontawesome-5.15.4/webfonts/{_family}.{_ext}'] = \
+            f'{FONT_AWESOME}/webfonts/{_family}.{_ext}'
+
+# Files every page loads, concatenated in this order into bundle/<name>.
+# Font Awesome keeps its own file (its CSS finds the fonts by relative URL),
+# htmx stays in <head>, and page scripts load only on their pages.
+BUNDLES = {
+    'app.css': ['vendor/bootstrap-agent-dark-theme/bootstrap.min.css',
+                'vendor/sweetalert2-11.10.5/sweetalert2.min.css',
+                'css/style.css'],
+    'app.js': ['vendor/bootstrap-5.3.0/bootstrap.bundle.min.js',
+               'vendor/sweetalert2-11.10.5/sweetalert2.all.min.js',
+               'js/main.js'],
+}
+
+# Only these extensions get a content hash in their file name. Other files
+# (fonts) are referenced by relative URLs from CSS and keep their names; their
+# directory already carries the library version.
+HASHED_EXTENSIONS = ('.js', '.css')
+
+# Build outputs that get precompressed siblings (fonts are already compressed,
+# except the legacy formats)
+PRECOMPRESS_EXTENSIONS = ('.js', '.css', '.svg', '.ttf', '.eot')
+
+
+# ---------------------------------------------------------------------------
+# Minification
+# ---------------------------------------------------------------------------
+
+def minify_css(source):
+    try:
+        import rcssmin
+        return rcssmin.cssmin(source)
+    except ImportError:
+        pass
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    # Spaces around ':' are kept; they are significant in selectors like 'a :hover'
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """
+    Use rjsmin when installed. The fallback only removes indentation, blank
+    lines and whole-line comments, which is always safe for our sources.
+    """
+    try:
+        import rjsmin
+        return rjsmin.jsmin(source)
+    except ImportError:
+        pass
+    lines = []
+    in_block_comment = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_block_comment:
+            if '*/' in stripped:
+                in_block_comment = False
+            continue
+        if not stripped or stripped.startswith('//'):
+            continue
+        if stripped.startswith('/*') and not stripped.startswith('/*!'):
+            in_block_comment = '*/' not in stripped
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines) + '\n'
+
+
+# ---------------------------------------------------------------------------
+# Build
+# ---------------------------------------------------------------------------
+
+class AssetBuildError(Exception):
+    """The static build cannot be produced (e.g. a library is not vendored)."""
+
+
+def _iter_sources(static_dir):
+    for root, dirs, files in os.walk(static_dir):
+        rel_root = os.path.relpath(root, static_dir)
+        if rel_root.split(os.sep)[0] == DIST_DIR:
+            dirs[:] = []
+            continue
+        for name in sorted(files):
+            yield os.path.normpath(os.path.join(rel_root, name)).replace(os.sep, '/')
+
+
+def _write_output(dist_dir, target, data):
+    out = os.path.join(dist_dir, target)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'wb') as f:
+        f.write(data)
+    if os.path.splitext(target)[1] in PRECOMPRESS_EXTENSIONS:
+        write_precompressed(out, current_app.config)
+
+
+def _hashed_name(logical, data):
+    base, ext = os.path.splitext(logical)
+    return f'{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+
+
+def build_assets(static_dir):
+    """
+    Write minified, content-hashed copies and bundles into static/dist and
+    return the manifest. Raises AssetBuildError if a library is not vendored.
+    """
+    missing = [logical for logical in VENDOR_ASSETS if not os.path.exists(os.path.join(static_dir, logical))]
+    if missing:
+        raise AssetBuildError(f'{len(missing)} vendored file(s) missing, e.g. {missing[0]}; '
+                              f'run `flask assets vendor` first')
+
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+
+    manifest, texts = {}, {}
+    for logical in _iter_sources(static_dir):
+        src = os.path.join(static_dir, logical)
+        ext = os.path.splitext(logical)[1]
+
+        if ext in HASHED_EXTENSIONS:
+            with open(src, 'r', encoding='utf-8') as f:
+                text = f.read()
+            if not logical.startswith('vendor/'):
+                text = minify_js(text) if ext == '.js' else minify_css(text)
+            texts[logical] = text
+            data = text.encode('utf-8')
+            target = _hashed_name(logical, data)
+        else:
+            with open(src, 'rb') as f:
+                data = f.read()
+            target = logical
+
+        _write_output(dist_dir, target, data)
+        manifest[logical] = f'{DIST_DIR}/{target}'
+
+    for name, members in BUNDLES.items():
+        # ';' ends a last statement that relies on automatic semicolon insertion
+        separator = '\n;\n' if name.endswith('.js') else '\n'
+        data = separator.join(texts[member] for member in members).encode('utf-8')
+        target = _hashed_name(f'bundle/{name}', data)
+        _write_output(dist_dir, target, data)
+        manifest[f'bundle/{name}'] = f'{DIST_DIR}/{target}'
+
+    with open(os.path.join(dist_dir, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def vendor_assets(static_dir, force=False):
+    """Download the pinned third-party files into static/vendor. Returns the paths fetched."""
+    fetched = []
+    for logical, url in VENDOR_ASSETS.items():
+        dest = os.path.join(static_dir, logical)
+        if os.path.exists(dest) and not force:
+            continue
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        with open(dest, 'wb') as f:
+            f.write(data)
+        fetched.append(logical)
+    return fetched
+
+
+# ---------------------------------------------------------------------------
+# Runtime
+# ---------------------------------------------------------------------------
+
+_manifest_cache = {'mtime': None, 'data': {}}
+
+
+def load_manifest(static_dir):
+    """Read static/dist/manifest.json, re-reading only when the file changes."""
+    path = os.path.join(static_dir, DIST_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        _manifest_cache.update(mtime=None, data={})
+        return {}
+    if mtime != _manifest_cache['mtime']:
+        with open(path) as f:
+            _manifest_cache.update(mtime=mtime, data=json.load(f))
+    return _manifest_cache['data']
+
+
+def asset_url(logical):
+    """
+    URL for a static asset. Uses the hashed build output when available,
+    the unhashed file otherwise, and the upstream URL only for a vendored
+    library that has not been downloaded yet (development without a build;
+    `flask assets build` refuses to run in that state).
+    """
+    static_dir = current_app.static_folder
+    manifest = load_manifest(static_dir)
+    if logical in manifest:
+        return url_for('static', filename=manifest[logical])
+    if logical in VENDOR_ASSETS and not os.path.exists(os.path.join(static_dir, logical)):
+        return VENDOR_ASSETS[logical]
+    return url_for('static', filename=logical)
+
+
+def asset_bundle(name):
+    """URLs to load for a bundle: the built bundle, or its member files when nothing is built."""
+    manifest = load_manifest(current_app.static_folder)
+    if f'bundle/{name}' in manifest:
+        return [url_for('static', filename=manifest[f'bundle/{name}'])]
+    return [asset_url(member) for member in BUNDLES[name]]
+
+
+def init_assets(app):
+    app.add_template_global(asset_url)
+    app.add_template_global(asset_bundle)
+
+    @app.after_request
+    def cache_static_assets(response):
+        if request.endpoint == 'static' and response.status_code in (200, 304):
+            filename = (request.view_args or {}).get('filename', '')
+            if filename.startswith(f'{DIST_DIR}/'):
+                response.cache_control.no_cache = None
+                response.cache_control.public = True
+                response.cache_control.max_age = IMMUTABLE_MAX_AGE
+                response.cache_control.immutable = True
+        return response
+
+    @app.cli.group('assets')
+    def assets_cli():
+        """Vendor third-party assets and build fingerprinted bundles."""
+
+    @assets_cli.command('vendor')
+    @click.option('--force', is_flag=True, help='Re-download files that already exist.')
+    def vendor_command(force):
+        """Download pinned third-party libraries into static/vendor."""
+        fetched = vendor_assets(app.static_folder, force=force)
+        click.echo(f'Vendored {len(fetched)} file(s).')
+
+    @assets_cli.command('build')
+    def build_command():
+        """Minify, bundle and fingerprint static assets into static/dist."""
+        try:
+            manifest = build_assets(app.static_folder)
+        except AssetBuildError as e:
+            raise click.ClickException(str(e))
+        click.echo(f'Built {len(manifest)} asset(s) into {DIST_DIR}/.')
@@ -0,0 +1,110 @@
+"""
+Startup benchmark: cold-start time of `import main` and per-worker RSS under gunicorn.
+
+    python benchmarks/startup.py [--runs 5] [--workers 4]
+
+Cold start runs each import in a fresh interpreter. Worker RSS starts
+gunicorn with gunicorn.conf.py (preloaded), waits for the workers to boot,
+and reads resident and unique (private) memory from /proc (Linux only).
+With --fork, the workers are plain os.fork() children of a process that
+imported main, which approximates a preloaded gunicorn without needing it.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORK_SNIPPET = (
+    'import os, sys, time; import main; pids = []\n'
+    'for _ in range(int(sys.argv[1])):\n'
+    '    pid = os.fork()\n'
+    '    if pid == 0:\n'
+    '        time.sleep(3600); os._exit(0)\n'
+    '    pids.append(pid)\n'
+    'print(*pids, flush=True); time.sleep(3600)'
+)
+
+IMPORT_SNIPPET = (
+    'import time, resource; t = time.perf_counter(); import main; '
+    'print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+)
+
+
+def cold_start(runs):
+    timings, rss = [], []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.split()
+        timings.append(float(out[-2]) * 1000)
+        rss.append(int(out[-1]) / 1024)
+    print(f'cold start: median {statistics.median(timings):.0f} ms, '
+          f'min {min(timings):.0f} ms, max RSS {max(rss):.1f} MB ({runs} runs)')
+
+
+def _memory_mb(pid):
+    rss = private = 0
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            field, value = line.split()[:2]
+            if field == 'Rss:':
+                rss = int(value)
+            elif field in ('Private_Clean:', 'Private_Dirty:'):
+                private += int(value)
+    return rss / 1024, private / 1024
+
+
+def _report(master_pid, worker_pids):
+    for pid in [master_pid] + worker_pids:
+        rss, private = _memory_mb(pid)
+        role = 'master' if pid == master_pid else 'worker'
+        print(f'{role:6} {pid}: RSS {rss:.1f} MB, unique {private:.1f} MB')
+
+
+def forked_rss(workers, boot_wait):
+    master = subprocess.Popen([sys.executable, '-c', FORK_SNIPPET, str(workers)], cwd=ROOT,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        children = [int(p) for p in master.stdout.readline().split()]
+        if not children:
+            sys.exit(f'import main failed with status {master.wait()}')
+        time.sleep(boot_wait)
+        _report(master.pid, children)
+    finally:
+        master.kill()
+        master.wait()
+
+
+def worker_rss(workers, boot_wait):
+    env = dict(os.environ, GUNICORN_WORKERS=str(workers), GUNICORN_BIND='127.0.0.1:5099')
+    master = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+                              cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(boot_wait)
+        if master.poll() is not None:
+            sys.exit(f'gunicorn exited with status {master.returncode}; is it installed?')
+        children = subprocess.run(['pgrep', '-P', str(master.pid)],
+                                  capture_output=True, text=True).stdout.split()
+        _report(master.pid, [int(p) for p in children])
+    finally:
+        master.terminate()
+        master.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--boot-wait', type=float, default=3.0)
+    parser.add_argument('--skip-gunicorn', action='store_true')
+    parser.add_argument('--fork', action='store_true', help='fork plain workers instead of running gunicorn')
+    args = parser.parse_args()
+
+    cold_start(args.runs)
+    if args.fork:
+        forked_rss(args.workers, args.boot_wait)
+    elif not args.skip_gunicorn:
+        worker_rss(args.workers, args.boot_wait)
@@ -0,0 +1,71 @@
+"""
+In-process caches keyed by DataVersion.
+
+Entries are looked up by (namespace, key, versions) where `versions` is the
+tuple of DataVersion counters the value was computed from. A write bumps a
+counter, so stale entries are never returned; they simply age out of the LRU.
+Only plain data (dicts, lists, bytes) should be cached, never ORM instances.
+"""
+import threading
+from collections import OrderedDict
+
+from metrics import observe_cache
+from utils import get_data_versions
+
+
+class VersionedCache:
+    """Thread-safe LRU cache for values derived from versioned data."""
+
+    def __init__(self, name, max_entries=256):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+        observe_cache(self.name, value is not None)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_build(self, namespace, key, version_keys, builder, versions=None):
+        """
+        Return the cached value for the current versions of `version_keys`,
+        calling `builder()` on a miss. Pass `versions` if already fetched.
+        """
+        if versions is None:
+            versions = get_data_versions(*version_keys)
+        cache_key = (namespace, str(key), tuple(versions))
+        value = self.get(cache_key)
+        if value is None:
+            value = builder()
+            self.put(cache_key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Page data shared by full pages, HTMX fragments, reports and the live board
+data_cache = VersionedCache('data', max_entries=512)
+
+# Rendered report bytes
+report_cache = VersionedCache('report', max_entries=64)
+
+# ICS feed bytes, one per teacher and day (calendar_feed.py)
+feed_cache = VersionedCache('feed', max_entries=1024)
@@ -0,0 +1,217 @@
+"""
+iCalendar (ICS) feeds of each teacher's timetable and covers.
+
+A feed lists, for the school days from ICS_FEED_PAST_DAYS ago to
+ICS_FEED_DAYS ahead, the teacher's classes as timetabled on each date, the
+covers they give, their own classes that are being covered, and their
+absences. Class times come from PERIOD_TIMES. Events have stable UIDs, so
+calendar clients update them in place when the plan changes.
+
+The substitutions, absences and the teacher's name are read with one UNION
+query; the timetable and school calendar come from their in-process caches.
+Feeds are cached per teacher and date until the teacher's, the roster's or
+the calendar's DataVersion changes (schedule edits, absences, plans and
+transfers bump the teacher's), and served with an ETag and Last-Modified so
+polling clients mostly get a 304.
+
+Feed URLs carry a signed teacher id instead of requiring a login, as
+calendar apps cannot log in; see feed_token().
+"""
+from datetime import datetime, time, timedelta, timezone
+
+from flask import Response, current_app, request
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import aliased
+
+from app import db
+from cache import feed_cache
+from utils import (ALL_PERIODS, PERIOD_COUNT, data_version_key, format_periods, get_current_date,
+                   period_bit)
+
+PRODID = '-//Substitution Planner//Teacher Feed//EN'
+
+
+def _serializer():
+    return URLSafeSerializer(current_app.secret_key, salt='ics-feed')
+
+
+def feed_token(teacher_id):
+    """The secret part of a teacher's feed URL."""
+    return _serializer().dumps(teacher_id)
+
+
+def teacher_for_token(token):
+    """Teacher id of a feed token, or None if the token is not valid."""
+    try:
+        return int(_serializer().loads(token))
+    except (BadSignature, TypeError, ValueError):
+        return None
+
+
+def period_times():
+    """[(start, end)] times of periods 1-8 from PERIOD_TIMES ('08:00-08:45,...')."""
+    times = []
+    for spec in current_app.config['PERIOD_TIMES'][:PERIOD_COUNT]:
+        start, _, end = spec.partition('-')
+        times.append((time.fromisoformat(start.strip()), time.fromisoformat(end.strip())))
+    if len(times) < PERIOD_COUNT:
+        raise ValueError(f'PERIOD_TIMES must list {PERIOD_COUNT} periods')
+    return times
+
+
+def _escape(text):
+    return str(text).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _fold(line):
+    """Fold a content line at 75 octets (RFC 5545, 3.1)."""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts, start = [], 0
+    while start < len(data):
+        end = min(start + (75 if not parts else 74), len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:
+            end -= 1  # Never split a UTF-8 sequence
+        parts.append(data[start:end].decode('utf-8'))
+        start = end
+    return '\r\n '.join(parts)
+
+
+def _feed_rows(teacher_id, start, end):
+    """The teacher's name, covers given and received, and absences in [start, end], in one query."""
+    from models import Absence, Substitution, Teacher
+
+    other = aliased(Teacher)
+    no_date, no_int, no_text = literal(None, db.Date), literal(None, db.Integer), literal(None, db.String)
+    in_window = Substitution.date.between(start, end)
+    query = union_all(
+        select(literal('teacher'), no_date, no_int, no_text, no_text, Teacher.name, no_int)
+        .where(Teacher.id == teacher_id),
+        select(literal('cover'), Substitution.date, Substitution.period, Substitution.class_name,
+               Substitution.section, other.name, no_int)
+        .join(other, other.id == Substitution.original_teacher_id)
+        .where(Substitution.teacher_id == teacher_id, in_window),
+        select(literal('covered'), Substitution.date, Substitution.period, Substitution.class_name,
+               Substitution.section, other.name, no_int)
+        .join(other, other.id == Substitution.teacher_id)
+        .where(Substitution.original_teacher_id == teacher_id, in_window),
+        select(literal('absent'), Absence.date, no_int, no_text, no_text, no_text, Absence.periods)
+        .where(Absence.teacher_id == teacher_id, Absence.date.between(start, end)),
+    )
+    return db.session.execute(query).all()
+
+
+def build_feed(teacher_id, today):
+    """The ICS bytes of a teacher's feed around `today`, or None if there is no such teacher."""
+    from school_calendar import school_days
+    from timetable import routines_on
+
+    start = today - timedelta(days=current_app.config['ICS_FEED_PAST_DAYS'])
+    end = today + timedelta(days=current_app.config['ICS_FEED_DAYS'])
+    times = period_times()
+
+    name = None
+    covers, covered, absent = [], {}, {}
+    for kind, day, period, class_name, section, other, periods in _feed_rows(teacher_id, start, end):
+        if kind == 'teacher':
+            name = other
+        elif kind == 'cover':
+            covers.append((day, period, class_name, section, other))
+        elif kind == 'covered':
+            covered[(day, period)] = other
+        else:
+            absent[day] = periods
+    if name is None:
+        return None
+
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN', 'METHOD:PUBLISH',
+             f'X-WR-CALNAME:{_escape(name)} - Timetable', 'REFRESH-INTERVAL;VALUE=DURATION:PT15M',
+             'X-PUBLISHED-TTL:PT15M']
+
+    def event(uid, day, period, summary, description, transparent=False):
+        begin, finish = times[period - 1]
+        lines.extend(['BEGIN:VEVENT', f'UID:{uid}-{day:%Y%m%d}-p{period}-t{teacher_id}@substitution-planner',
+                      f'DTSTAMP:{stamp}',
+                      f'DTSTART:{datetime.combine(day, begin):%Y%m%dT%H%M%S}',
+                      f'DTEND:{datetime.combine(day, finish):%Y%m%dT%H%M%S}',
+                      f'SUMMARY:{_escape(summary)}', f'DESCRIPTION:{_escape(description)}'])
+        if transparent:
+            lines.append('TRANSP:TRANSPARENT')
+        lines.append('END:VEVENT')
+
+    for day, rotation in school_days(start, end):
+        mask = (absent[day] or ALL_PERIODS) if day in absent else 0
+        if day in absent:
+            lines.extend(['BEGIN:VEVENT', f'UID:absent-{day:%Y%m%d}-t{teacher_id}@substitution-planner',
+                          f'DTSTAMP:{stamp}', f'DTSTART;VALUE=DATE:{day:%Y%m%d}',
+                          f'DTEND;VALUE=DATE:{day + timedelta(days=1):%Y%m%d}',
+                          'SUMMARY:Absent' + ('' if absent[day] is None else f' (periods {format_periods(mask)})'),
+                          'TRANSP:TRANSPARENT', 'END:VEVENT'])
+        for slot in routines_on(day, rotation, teacher_id):
+            if slot.is_free:
+                continue
+            label = f'Class {slot.class_name}{slot.section or ""}'
+            if mask & period_bit(slot.period):
+                if (day, slot.period) in covered:
+                    event('class', day, slot.period, f'{label} (covered by {covered[(day, slot.period)]})',
+                          f'{rotation}, period {slot.period}', transparent=True)
+                continue
+            event('class', day, slot.period, label, f'{rotation}, period {slot.period}')
+    for day, period, class_name, section, original in covers:
+        event('cover', day, period, f'Cover: Class {class_name}{section or ""}',
+              f'Covering {original}, period {period}')
+
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(_fold(line) for line in lines) + '\r\n').encode('utf-8')
+
+
+def _feed_state(teacher_id):
+    """(version keys, versions, last modified) of a teacher's feed, in one query."""
+    from models import DataVersion
+
+    version_keys = [('teacher', teacher_id), ('roster',), ('calendar',)]
+    names = [data_version_key(*key) for key in version_keys]
+    rows = {key: (version, updated_at) for key, version, updated_at in db.session.query(
+        DataVersion.key, DataVersion.version, DataVersion.updated_at).filter(DataVersion.key.in_(names))}
+    versions = tuple(rows.get(name, (0, None))[0] for name in names)
+    modified = [updated_at for _, updated_at in rows.values() if updated_at is not None]
+    return version_keys, versions, max(modified) if modified else None
+
+
+def serve_feed(teacher_id):
+    """
+    A teacher's feed, built only when no cached copy exists for today and the
+    current data versions. Returns 304 when the client's ETag or
+    If-Modified-Since is still current, and None for an unknown teacher.
+    """
+    today = get_current_date()
+    version_keys, versions, modified = _feed_state(teacher_id)
+    etag = f"ics-{teacher_id}-{today:%Y%m%d}-{'.'.join(str(v) for v in versions)}"
+    # The window moves at midnight even when no data changed
+    midnight = datetime.combine(today, time.min)
+    last_modified = max(modified, midnight) if modified else midnight
+    last_modified = last_modified.astimezone(timezone.utc).replace(microsecond=0)
+
+    if request.if_none_match.contains(etag) or (
+            not request.if_none_match and request.if_modified_since
+            and last_modified <= request.if_modified_since):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        return response
+
+    data = feed_cache.get_or_build('ics', f'{teacher_id}:{today}', version_keys,
+                                   lambda: build_feed(teacher_id, today), versions=versions)
+    if data is None:
+        return None
+
+    response = Response(data, mimetype='text/calendar')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Content-Disposition'] = f'inline; filename="timetable-{teacher_id}.ics"'
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,142 @@
+"""
+Cover capacity: how many teachers can cover each rotation day x period, and
+whether that is enough for the absences to expect.
+
+In the timetable in force on a date, each teacher either teaches or is
+available (free period or nothing timetabled) in each day x period slot.
+A teacher's absence rate for a slot is the share of that rotation day's
+school days in the last CAPACITY_LOOKBACK_DAYS on which they were absent
+for that period. The expected demand of a slot is the sum of the rates of
+the teachers teaching then, its expected capacity the sum of the attendance
+rates of the teachers available then; slots whose demand exceeds their
+capacity are flagged, next to the uncovered slots the planner actually
+recorded in the same window.
+
+The teacher x day x period arrays are reduced with numpy when the optional
+package is installed, and with plain Python loops otherwise.
+"""
+from datetime import timedelta
+
+from flask import current_app
+
+from app import db
+from cache import data_cache
+from utils import ALL_PERIODS, PERIOD_COUNT
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+
+def _load(date_obj):
+    """Timetable, absences and uncovered slots for the report, as plain index lists."""
+    from models import Absence, Teacher, UncoveredSlot
+    from school_calendar import ROTATION_DAYS, school_days
+    from timetable import routines_on
+
+    start = date_obj - timedelta(days=current_app.config['CAPACITY_LOOKBACK_DAYS'])
+    teacher_index = {t: i for i, (t,) in enumerate(db.session.query(Teacher.id).order_by(Teacher.id))}
+    day_index = {day: i for i, day in enumerate(ROTATION_DAYS)}
+
+    teaching = []  # (teacher, day, period) indices of classes
+    for day, d in day_index.items():
+        teaching += [(teacher_index[slot.teacher_id], d, slot.period - 1)
+                     for slot in routines_on(date_obj, day)
+                     if not slot.is_free and slot.teacher_id in teacher_index]
+
+    absences = []  # (teacher, day, periods mask or None)
+    for teacher_id, day, periods in db.session.query(Absence.teacher_id, Absence.day, Absence.periods) \
+            .filter(Absence.date >= start, Absence.date < date_obj):
+        if day in day_index and teacher_id in teacher_index:
+            absences.append((teacher_index[teacher_id], day_index[day], periods))
+
+    day_counts = [0] * len(ROTATION_DAYS)
+    for _, day in school_days(start, date_obj - timedelta(days=1)):
+        day_counts[day_index[day]] += 1
+
+    uncovered = db.session.query(UncoveredSlot.day, UncoveredSlot.period, db.func.count(UncoveredSlot.id)) \
+        .filter(UncoveredSlot.date >= start, UncoveredSlot.date < date_obj) \
+        .group_by(UncoveredSlot.day, UncoveredSlot.period).all()
+    uncovered = {(day_index[day], period - 1): n for day, period, n in uncovered if day in day_index}
+
+    return start, len(teacher_index), list(ROTATION_DAYS), teaching, absences, day_counts, uncovered
+
+
+def _reduce_numpy(teachers, days, teaching, absences, day_counts):
+    shape = (teachers, days, PERIOD_COUNT)
+    busy = np.zeros(shape, dtype=bool)
+    if teaching:
+        t, d, p = np.array(teaching).T
+        busy[t, d, p] = True
+
+    absent = np.zeros(shape)
+    if absences:
+        t = np.array([a[0] for a in absences])
+        d = np.array([a[1] for a in absences])
+        masks = np.array([ALL_PERIODS if a[2] is None else a[2] for a in absences])
+        bits = (masks[:, None] >> np.arange(PERIOD_COUNT)) & 1
+        np.add.at(absent, (t, d), bits)
+    rates = absent / np.maximum(np.array(day_counts), 1)[None, :, None]
+
+    available = ~busy
+    return (available.sum(axis=0).tolist(),
+            (rates * busy).sum(axis=0).tolist(),
+            ((1 - rates) * available).sum(axis=0).tolist())
+
+
+def _reduce_python(teachers, days, teaching, absences, day_counts):
+    busy = [[[False] * PERIOD_COUNT for _ in range(days)] for _ in range(teachers)]
+    for t, d, p in teaching:
+        busy[t][d][p] = True
+    absent = [[[0] * PERIOD_COUNT for _ in range(days)] for _ in range(teachers)]
+    for t, d, mask in absences:
+        for p in range(PERIOD_COUNT):
+            if mask is None or mask >> p & 1:
+                absent[t][d][p] += 1
+
+    free = [[0] * PERIOD_COUNT for _ in range(days)]
+    demand = [[0.0] * PERIOD_COUNT for _ in range(days)]
+    capacity = [[0.0] * PERIOD_COUNT for _ in range(days)]
+    for t in range(teachers):
+        for d in range(days):
+            for p in range(PERIOD_COUNT):
+                rate = absent[t][d][p] / max(day_counts[d], 1)
+                if busy[t][d][p]:
+                    demand[d][p] += rate
+                else:
+                    free[d][p] += 1
+                    capacity[d][p] += 1 - rate
+    return free, demand, capacity
+
+
+def capacity_report(date_obj):
+    """
+    Capacity of every rotation day x period for the timetable in force on
+    `date_obj`, from the absences of the lookback window before it. Cached
+    until any write.
+    """
+    def build():
+        start, teachers, days, teaching, absences, day_counts, uncovered = _load(date_obj)
+        reduce = _reduce_numpy if np is not None else _reduce_python
+        free, demand, capacity = reduce(teachers, len(days), teaching, absences, day_counts)
+        grid = [[{
+            'day': day,
+            'period': p + 1,
+            'free': int(free[d][p]),
+            'expected_absent': round(demand[d][p], 2),
+            'expected_free': round(capacity[d][p], 2),
+            'uncovered': uncovered.get((d, p), 0),
+            'short': demand[d][p] > capacity[d][p],
+        } for d, day in enumerate(days)] for p in range(PERIOD_COUNT)]
+        return {
+            'date': date_obj,
+            'start': start,
+            'teachers': teachers,
+            'days': days,
+            'school_days': dict(zip(days, day_counts)),
+            'grid': grid,  # one row per period, one cell per rotation day
+            'short': [cell for row in grid for cell in row if cell['short']],
+        }
+
+    return data_cache.get_or_build('capacity', date_obj, [('all',)], build)
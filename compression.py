@@ -0,0 +1,158 @@
+"""
+Negotiated gzip / brotli compression for text responses.
+
+* Responses above COMPRESS_MIN_SIZE with a compressible mimetype are encoded
+  with the best encoding the client accepts (brotli when the optional
+  `brotli` package is installed, otherwise gzip).
+* Streamed responses are compressed chunk by chunk with a flush after each
+  chunk, so exports keep streaming.
+* Static files that `flask assets build` precompressed (.br / .gz siblings)
+  are served as-is; compressed bodies of cacheable pages (responses with an
+  ETag) are kept in an LRU keyed by a digest of the body, so a popular
+  unchanged page is compressed once and a session never gets another's.
+* COMPRESS_LEVEL / COMPRESS_BR_LEVEL trade CPU for bandwidth.
+"""
+import gzip
+import hashlib
+import os
+import zlib
+
+from flask import request
+
+from cache import VersionedCache
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'text/calendar',
+    'text/javascript', 'application/javascript', 'application/json',
+    'application/xml', 'image/svg+xml', 'font/ttf', 'application/vnd.ms-fontobject',
+}
+
+# Compressed bodies of responses that carry an ETag, keyed by (body digest, encoding)
+compressed_cache = VersionedCache('compressed', max_entries=256)
+
+PRECOMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Pick the first server-preferred encoding the client accepts."""
+    for encoding in available_encodings():
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress_bytes(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_LEVEL'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def compress_stream(chunks, encoding, config):
+    """Compress an iterable of byte chunks, flushing after each so nothing stalls."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config['COMPRESS_BR_LEVEL'])
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        compressor = zlib.compressobj(config['COMPRESS_LEVEL'], zlib.DEFLATED, 31)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def write_precompressed(path, config):
+    """Write .gz (and .br when available) siblings next to a built asset."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    for encoding in available_encodings():
+        with open(path + PRECOMPRESSED_SUFFIXES[encoding], 'wb') as f:
+            f.write(compress_bytes(data, encoding, config))
+
+
+def _mark_encoded(response, encoding):
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # Same resource, different bytes: a weak validator keeps 304s working
+        response.set_etag(etag, weak=True)
+
+
+def _static_precompressed(response, encoding, static_folder):
+    filename = (request.view_args or {}).get('filename', '')
+    path = os.path.join(static_folder, filename + PRECOMPRESSED_SUFFIXES[encoding])
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        data = f.read()
+    response.direct_passthrough = False
+    response.set_data(data)
+    _mark_encoded(response, encoding)
+    return True
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_ENABLED', True)
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_LEVEL', 5)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+
+    @app.after_request
+    def compress_response(response):
+        config = app.config
+        if not config['COMPRESS_ENABLED'] or request.method == 'HEAD':
+            return response
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if request.endpoint == 'static' and _static_precompressed(response, encoding, app.static_folder):
+            return response
+
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = compress_stream(response.response, encoding, config)
+            response.headers.pop('Content-Length', None)
+            _mark_encoded(response, encoding)
+            return response
+
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        # Keyed by the bytes, not the ETag: pages embed per-session content
+        # (CSRF token, flashes) that their ETag does not fully capture
+        etag, _ = response.get_etag()
+        cache_key = (hashlib.blake2b(data, digest_size=16).digest(), encoding) if etag else None
+        compressed = compressed_cache.get(cache_key) if cache_key else None
+        if compressed is None:
+            compressed = compress_bytes(data, encoding, config)
+            if cache_key:
+                compressed_cache.put(cache_key, compressed)
+
+        response.set_data(compressed)
+        _mark_encoded(response, encoding)
+        return response
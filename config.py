@@ -1,22 +1,84 @@
-
 import os
 
-class Config:
-    """Base configuration class."""
-    SECRET_KEY = os.environ.get('SESSION_SECRET', 'your-secret-key')
-    
-    # Use DATABASE_URL if available, otherwise construct from individual credentials
-    DATABASE_URL = os.environ.get('DATABASE_URL')
-    if not DATABASE_URL:
+
+def _database_url():
+    """DATABASE_URL if set, else a URL built from the PG* variables, else local SQLite."""
+    url = os.environ.get('DATABASE_URL')
+    if url:
+        return url
+    if os.environ.get('PGHOST'):
         db_user = os.environ.get('PGUSER')
         db_pass = os.environ.get('PGPASSWORD')
         db_host = os.environ.get('PGHOST')
-        db_port = os.environ.get('PGPORT')
+        db_port = os.environ.get('PGPORT', 5432)
         db_name = os.environ.get('PGDATABASE')
-        DATABASE_URL = f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
-        
-    SQLALCHEMY_DATABASE_URI = DATABASE_URL
+        return f"postgresql://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+    return 'sqlite:///school.db'
+
+
+def _env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+class Config:
+    """Base configuration class."""
+    SECRET_KEY = os.environ.get('SESSION_SECRET', 'temporary-dev-key')
+
+    SQLALCHEMY_DATABASE_URI = _database_url()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    WTF_CSRF_ENABLED = True
+
+    # Connection pool, per worker process (see db_pool.py). With 8 gunicorn
+    # workers the primary may see up to 8 x (DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # connections; size the pool to the number of threads per worker.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 300))
+    DB_PRE_PING = os.environ.get('DB_PRE_PING', 'idle')  # always | idle | never
+    DB_PING_IDLE_SECONDS = float(os.environ.get('DB_PING_IDLE_SECONDS', 30))
+
+    # Read replicas (see db_routing.py); each replica bind gets its own pool
+    DB_REPLICA_URLS = _env_list('DATABASE_REPLICA_URLS')
+    DB_REPLICA_POOL_SIZE = int(os.environ.get('DATABASE_REPLICA_POOL_SIZE', DB_POOL_SIZE))
+    DB_REPLICA_MAX_OVERFLOW = int(os.environ.get('DATABASE_REPLICA_MAX_OVERFLOW', DB_MAX_OVERFLOW))
+    DB_STICKY_SECONDS = int(os.environ.get('DB_STICKY_SECONDS', 10))
+
+    # Response compression (see compression.py)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') != '0'
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL', 5))
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+
+    # Month (1-12) an academic year starts in; closed years can be archived (see archive.py)
+    ACADEMIC_YEAR_START_MONTH = int(os.environ.get('ACADEMIC_YEAR_START_MONTH', 4))
+
+    # School calendar (see school_calendar.py): weekdays with classes (0 = Monday)
+    # and whether the rotation follows the weekday or advances one step per school day
+    SCHOOL_WEEKDAYS = [int(d) for d in os.environ.get('SCHOOL_WEEKDAYS', '0,1,2,3,4').split(',')]
+    CALENDAR_ROTATION = os.environ.get('CALENDAR_ROTATION', 'weekday')  # weekday | cycle
+
+    # Days of absence history behind the expected absences of the capacity report (capacity.py)
+    CAPACITY_LOOKBACK_DAYS = int(os.environ.get('CAPACITY_LOOKBACK_DAYS', 91))
+
+    # Class times of periods 1-8 and the days before/after today covered by the ICS feeds (calendar_feed.py)
+    PERIOD_TIMES = _env_list('PERIOD_TIMES') or ['08:00-08:45', '08:50-09:35', '09:40-10:25', '10:45-11:30',
+                                                 '11:35-12:20', '13:00-13:45', '13:50-14:35', '14:40-15:25']
+    ICS_FEED_PAST_DAYS = int(os.environ.get('ICS_FEED_PAST_DAYS', 7))
+    ICS_FEED_DAYS = int(os.environ.get('ICS_FEED_DAYS', 42))
+
+    # Notification outbox (see notifier.py): SMTP server and the `flask notify worker` loop
+    NOTIFY_ENABLED = os.environ.get('NOTIFY_ENABLED', '1') != '0'
+    MAIL_SERVER = os.environ.get('MAIL_SERVER', 'localhost')
+    MAIL_PORT = int(os.environ.get('MAIL_PORT', 25))
+    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', '0') == '1'
+    MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
+    MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_SENDER = os.environ.get('MAIL_SENDER', 'substitutions@localhost')
+    NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', 500))
+    NOTIFY_POLL_SECONDS = float(os.environ.get('NOTIFY_POLL_SECONDS', 5))
+    NOTIFY_MAX_ATTEMPTS = int(os.environ.get('NOTIFY_MAX_ATTEMPTS', 5))
+    NOTIFY_RETENTION_DAYS = int(os.environ.get('NOTIFY_RETENTION_DAYS', 30))
 
 class DevelopmentConfig(Config):
     """Development configuration."""
@@ -0,0 +1,159 @@
+"""
+Connection pool configuration and health metrics.
+
+engine_options() turns the DB_POOL_* settings from config.py into SQLAlchemy
+engine options for the primary and for each replica bind. Pools are
+InstrumentedQueuePool instances, which record how long each checkout waited
+for a connection (also exported to /metrics, see metrics.py), so the pool can be sized from data: if checkouts wait or
+time out, raise DB_POOL_SIZE / DB_MAX_OVERFLOW (keeping
+workers x (size + overflow) under the server's connection limit).
+
+Pre-ping strategies (DB_PRE_PING):
+* always  ping on every checkout (SQLAlchemy's pool_pre_ping)
+* idle    ping only connections unused for DB_PING_IDLE_SECONDS
+* never   rely on pool_recycle alone
+"""
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+from metrics import observe_pool_checkout, observe_pool_usage
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+
+class PoolMetrics:
+    """Checkout counters for one pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def record(self, waited, timed_out=False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            for index, bound in enumerate(WAIT_BUCKETS):
+                if waited <= bound:
+                    self.wait_buckets[index] += 1
+                    break
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'wait_total_seconds': round(self.wait_total, 6),
+                'wait_max_seconds': round(self.wait_max, 6),
+                'wait_buckets': dict(zip(WAIT_BUCKETS, self.wait_buckets)),
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long callers wait for a connection."""
+
+    def __init__(self, *args, bind_name='primary', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bind_name = bind_name
+        self.metrics = PoolMetrics()
+
+    def recreate(self):
+        # dispose() swaps in a fresh pool; keep the bind label for metrics
+        pool = super().recreate()
+        pool.bind_name = self.bind_name
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            waited = time.perf_counter() - started
+            self.metrics.record(waited, timed_out=True)
+            observe_pool_checkout(self, waited, timed_out=True)
+            raise
+        waited = time.perf_counter() - started
+        self.metrics.record(waited)
+        observe_pool_checkout(self, waited)
+        observe_pool_usage(self)
+        return entry
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        observe_pool_usage(self)
+
+
+def _ping_idle_connections(engine, idle_seconds):
+    """Ping a connection on checkout only if it sat unused for idle_seconds."""
+
+    @event.listens_for(engine, 'checkout')
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        last_used = connection_record.info.get('last_checkin')
+        if last_used is None or time.monotonic() - last_used < idle_seconds:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        except Exception:
+            # The pool discards this connection and retries with a new one
+            raise exc.DisconnectionError()
+        finally:
+            cursor.close()
+
+    @event.listens_for(engine, 'checkin')
+    def remember_checkin(dbapi_connection, connection_record):
+        connection_record.info['last_checkin'] = time.monotonic()
+
+
+def engine_options(config, pool_size=None, max_overflow=None):
+    """SQLAlchemy engine options from the DB_POOL_* settings."""
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'] if pool_size is None else pool_size,
+        'max_overflow': config['DB_MAX_OVERFLOW'] if max_overflow is None else max_overflow,
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_PRE_PING'] == 'always',
+    }
+
+
+def init_pool_events(app, db):
+    """Label pools with their bind name and install the idle pre-ping listener."""
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if isinstance(engine.pool, InstrumentedQueuePool):
+                engine.pool.bind_name = key or 'primary'
+            if app.config['DB_PRE_PING'] == 'idle':
+                _ping_idle_connections(engine, app.config['DB_PING_IDLE_SECONDS'])
+
+
+def pool_stats(db):
+    """Current usage and checkout metrics for every bind: {bind name: {...}}."""
+    stats = {}
+    for key, engine in db.engines.items():
+        pool = engine.pool
+        size = pool.size() if hasattr(pool, 'size') else None
+        entry = {
+            'size': size,
+            'in_use': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+            'idle': pool.checkedin() if hasattr(pool, 'checkedin') else None,
+            # QueuePool.overflow() counts down from -size; only positive values are extra connections
+            'overflow': max(pool.overflow(), 0) if hasattr(pool, 'overflow') else None,
+            'max_overflow': getattr(pool, '_max_overflow', None),
+        }
+        metrics = getattr(pool, 'metrics', None)
+        if metrics is not None:
+            entry.update(metrics.snapshot())
+        stats[key or 'primary'] = entry
+    return stats
@@ -0,0 +1,89 @@
+"""
+Read-replica routing.
+
+Replicas are configured as extra Flask-SQLAlchemy binds ('replica_0',
+'replica_1', ...) built from DATABASE_REPLICA_URLS. Views decorated with
+@read_only run their queries on one replica (picked once per request);
+everything else, and any write (a flush or an INSERT/UPDATE/DELETE statement),
+goes to the primary.
+
+A request that writes marks the user's session so that their following
+requests read from the primary for DB_STICKY_SECONDS, hiding replication lag
+right after a save. With no replicas configured everything uses the primary.
+"""
+import random
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_SESSION_KEY = '_db_primary_until'
+
+
+def replica_binds(replica_urls, pool_options=None):
+    """SQLALCHEMY_BINDS entries for the replica URLs, each with its own pool options."""
+    binds = {}
+    for index, url in enumerate(replica_urls):
+        binds[f'{REPLICA_BIND_PREFIX}{index}'] = dict(pool_options or {}, url=url)
+    return binds
+
+
+def read_only(view):
+    """Route this view's queries to a replica unless the user just wrote."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _replica_engine(db):
+    if not has_request_context() or not g.get('db_read_only') or g.get('db_wrote'):
+        return None
+    if session.get(STICKY_SESSION_KEY, 0) > time.time():
+        return None
+    if 'db_replica' not in g:
+        keys = [key for key in db.engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+        g.db_replica = random.choice(keys) if keys else None
+    return db.engines[g.db_replica] if g.db_replica else None
+
+
+class RoutingSession(Session):
+    """Session that sends reads from @read_only views to a replica."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing:
+            engine = _replica_engine(self._db)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(db_session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _mark_statement_write(orm_execute_state):
+    # Bulk session.execute(insert/update) and Query.update/delete never flush.
+    # This runs before the bind is chosen, so the statement goes to the primary too
+    if has_request_context() and (orm_execute_state.is_insert or orm_execute_state.is_update
+                                  or orm_execute_state.is_delete):
+        g.db_wrote = True
+
+
+def init_routing(app):
+    app.config.setdefault('DB_REPLICA_URLS', [])
+    app.config.setdefault('DB_STICKY_SECONDS', 10)
+
+    @app.after_request
+    def stick_to_primary(response):
+        # Token-authenticated API requests (g.stateless) have no session to mark
+        if g.get('db_wrote') and not g.get('stateless') and current_app.config['DB_REPLICA_URLS']:
+            session[STICKY_SESSION_KEY] = time.time() + current_app.config['DB_STICKY_SECONDS']
+        return response
@@ -0,0 +1,180 @@
+"""
+Live substitution board: an in-process publish/subscribe broker that pushes
+substitution plan diffs to server-sent event (SSE) streams.
+
+Each date has one shared snapshot per worker process. When a write commits,
+the route calls publish_plan_change(date); the broker recomputes the plan
+once, diffs it against the previous snapshot and fans the diff out to every
+open stream for that date. Streams also check the date's DataVersion counter
+while idle so that changes committed by another worker are picked up, still
+with a single recomputation per change per process.
+"""
+import json
+import queue
+import threading
+
+from app import db
+from utils import get_data_versions, cached_substitution_plan
+
+# Seconds between keep-alive comments / cross-worker version checks
+HEARTBEAT_INTERVAL = 15
+# Maximum number of undelivered events per subscriber before it is dropped
+SUBSCRIBER_BACKLOG = 50
+# Queued in place of a dropped subscriber's backlog; its stream then ends
+_CLOSE = ('close', None)
+
+
+def plan_snapshot(date_obj):
+    """Return {slot_key: row} for every substitution on a date, from the shared plan cache."""
+    plan = cached_substitution_plan(date_obj)
+    return {row['slot']: dict(row, period=period) for period, rows in plan.items() for row in rows}
+
+
+def diff_snapshots(old, new):
+    """
+    Split the difference between two snapshots into added, removed and
+    reassigned slots. Rows whose substitute is unchanged but whose details
+    moved (new row id after replanning, pending transfer count) are 'updated'.
+    """
+    added = [new[key] for key in new.keys() - old.keys()]
+    removed = [old[key] for key in old.keys() - new.keys()]
+    reassigned, updated = [], []
+    for key in new.keys() & old.keys():
+        if new[key]['substitute_teacher'] != old[key]['substitute_teacher']:
+            reassigned.append(new[key])
+        elif new[key] != old[key]:
+            updated.append(new[key])
+
+    by_period = lambda row: row['period']
+    return {
+        'added': sorted(added, key=by_period),
+        'removed': sorted(removed, key=by_period),
+        'reassigned': sorted(reassigned, key=by_period),
+        'updated': sorted(updated, key=by_period),
+    }
+
+
+def _version_label(version):
+    """The (date, roster) counters as sent to clients: '12.3'."""
+    return None if version is None else '.'.join(str(v) for v in version)
+
+
+class _DateChannel:
+    def __init__(self):
+        self.version = None  # (date version, roster version) of the snapshot
+        self.snapshot = {}
+        self.subscribers = set()
+
+
+class PlanBroker:
+    """Fan-out of plan diffs to SSE subscribers, one channel per date."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def subscribe(self, date_obj):
+        """Register a subscriber queue; the first event is the current full snapshot."""
+        q = queue.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        with self._lock:
+            channel = self._channels.setdefault(date_obj, _DateChannel())
+            channel.subscribers.add(q)
+        self.refresh(date_obj)
+        with self._lock:
+            q.put_nowait(('snapshot', {'version': _version_label(channel.version),
+                                       'substitutions': list(channel.snapshot.values())}))
+        return q
+
+    def unsubscribe(self, date_obj, q):
+        with self._lock:
+            channel = self._channels.get(date_obj)
+            if channel is None:
+                return
+            channel.subscribers.discard(q)
+            if not channel.subscribers:
+                del self._channels[date_obj]
+
+    def subscriber_count(self, date_obj=None):
+        with self._lock:
+            if date_obj is not None:
+                channel = self._channels.get(date_obj)
+                return len(channel.subscribers) if channel else 0
+            return sum(len(c.subscribers) for c in self._channels.values())
+
+    def refresh(self, date_obj):
+        """
+        Recompute the snapshot if the date's DataVersion moved, and push the
+        diff to all subscribers. Nothing is computed when nobody is listening.
+        """
+        with self._lock:
+            channel = self._channels.get(date_obj)
+            if channel is None:
+                return
+
+        version = get_data_versions(('date', date_obj), ('roster',))
+        if version == channel.version:
+            return
+
+        snapshot = plan_snapshot(date_obj)
+
+        with self._lock:
+            # Another thread may have stored the same or a newer plan meanwhile; never go back.
+            # Both counters only grow, so a newer state is >= in each of them
+            if channel.version is not None and (
+                    version == channel.version or any(new < old for new, old in zip(version, channel.version))):
+                return
+            changes = diff_snapshots(channel.snapshot, snapshot)
+            first_load = channel.version is None
+            channel.version = version
+            channel.snapshot = snapshot
+            if first_load or not any(changes.values()):
+                return
+            payload = dict(changes, version=_version_label(version))
+            for q in list(channel.subscribers):
+                try:
+                    q.put_nowait(('plan', payload))
+                except queue.Full:
+                    # A stalled client; drop it rather than buffering forever. Its
+                    # stream ends, and the browser reconnects for a fresh snapshot
+                    channel.subscribers.discard(q)
+                    with q.mutex:
+                        q.queue.clear()
+                    q.put_nowait(_CLOSE)
+
+
+broker = PlanBroker()
+
+
+def publish_plan_change(date_obj):
+    """Call after committing a write that affects the plan for date_obj."""
+    broker.refresh(date_obj)
+
+
+def format_sse(event, data, event_id=None):
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def plan_event_stream(date_obj):
+    """Generator producing the SSE stream for one date's plan."""
+    q = broker.subscribe(date_obj)
+    # Don't hold a pooled connection for the lifetime of the stream
+    db.session.remove()
+    try:
+        yield f'retry: {HEARTBEAT_INTERVAL * 1000}\n\n'
+        while True:
+            try:
+                event, data = q.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                broker.refresh(date_obj)
+                db.session.remove()
+                yield ': keep-alive\n\n'
+                continue
+            if (event, data) == _CLOSE:
+                return
+            yield format_sse(event, data, data.get('version'))
+    finally:
+        broker.unsubscribe(date_obj, q)
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, SelectField, DateField, HiddenField
-from wtforms.validators import DataRequired, Email, Length, ValidationError
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, SubmitField, SelectField, DateField, HiddenField, BooleanField
+from wtforms.validators import DataRequired, Email, Length, Optional, ValidationError
 from models import Teacher, User
 from datetime import datetime
 
@@ -28,16 +29,42 @@ class TeacherForm(FlaskForm):
 
 class AbsenceForm(FlaskForm):
     date = DateField('Date', validators=[DataRequired()], default=datetime.now)
+    # Normally taken from the school calendar; pick a day only to override it
     day = SelectField('Day', choices=[
+        ('', 'From calendar'),
         ('Day 1', 'Day 1'),
         ('Day 2', 'Day 2'),
         ('Day 3', 'Day 3'),
         ('Day 4', 'Day 4'),
         ('Day 5', 'Day 5')
-    ], validators=[DataRequired()])
+    ], validators=[Optional()])
     # We don't include selected_teachers here but handle it manually in the route
     # because we need to process multiple checkbox values
     submit = SubmitField('Mark Absences')
+    
+    def validate_date(self, field):
+        from school_calendar import day_for_date
+        if field.data and not self.day.data and day_for_date(field.data) is None:
+            raise ValidationError('There is no school on this date. Choose a day to plan it anyway.')
+
+class AbsenceRangeForm(FlaskForm):
+    teacher_id = SelectField('Teacher', coerce=int, validators=[DataRequired()])
+    start_date = DateField('From', validators=[DataRequired()], default=datetime.now)
+    end_date = DateField('To', validators=[DataRequired()], default=datetime.now)
+    reason = StringField('Reason', validators=[Optional(), Length(max=200)])
+    submit = SubmitField('Record Leave')
+    
+    def validate_end_date(self, field):
+        if self.start_date.data and field.data:
+            if field.data < self.start_date.data:
+                raise ValidationError('The leave cannot end before it starts.')
+            if (field.data - self.start_date.data).days > 366:
+                raise ValidationError('Leave can cover at most one year.')
+
+class HolidayForm(FlaskForm):
+    date = DateField('Date', validators=[DataRequired()])
+    name = StringField('Name', validators=[DataRequired(), Length(max=100)])
+    submit = SubmitField('Add Holiday')
 
 class TransferRequestForm(FlaskForm):
     substitution_id = HiddenField('Substitution ID', validators=[DataRequired()])
@@ -58,4 +85,14 @@ class AdminForm(FlaskForm):
     def validate_email(self, field):
         user = User.query.filter_by(email=field.data).first()
         if user:
-            raise ValidationError('This email address is already in use.')
\ No newline at end of file
+            raise ValidationError('This email address is already in use.')
+
+class ImportForm(FlaskForm):
+    kind = SelectField('Import', choices=[
+        ('teachers', 'Teachers (teacher_id, name, email, phone)'),
+        ('timetable', 'Timetable (teacher_id, day, period, class_name, section)')
+    ], validators=[DataRequired()])
+    file = FileField('File', validators=[FileRequired(), FileAllowed(['csv', 'xlsx'], 'CSV or XLSX files only')])
+    replace = BooleanField('Replace the existing timetable of every teacher in the file')
+    effective_from = DateField('Timetable effective from', validators=[Optional()])
+    submit = SubmitField('Import')
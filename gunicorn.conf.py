@@ -0,0 +1,79 @@
+"""
+Gunicorn settings: `gunicorn -c gunicorn.conf.py main:app`.
+
+The app is imported once in the master (preload_app) and workers are forked
+from it, sharing the imported code copy-on-write. Connections opened in the
+master must not be shared with the children, so each worker drops the
+inherited engine pool right after the fork and opens its own connections.
+
+With PROMETHEUS_MULTIPROC_DIR set, workers write metrics to files in that
+directory (see metrics.py); it is emptied when the master starts and a
+worker's live gauges are dropped when it exits.
+
+Live board streams (GET /admin/substitution/stream, see events.py) stay open
+for as long as a screen shows the board, so under the default threaded
+worker each one holds a thread that ordinary pages then cannot use. Serve
+them from a second gunicorn running an async worker, where an idle stream
+costs a greenlet rather than a thread (requires `pip install gevent`):
+
+    gunicorn -c gunicorn.conf.py main:app                              # pages, :5000
+    GUNICORN_WORKER_CLASS=gevent GUNICORN_BIND=0.0.0.0:5001 \
+        gunicorn -c gunicorn.conf.py main:app                              # streams, :5001
+
+and have the proxy send that one path to the stream server, e.g. for nginx:
+
+    location /admin/substitution/stream {
+        proxy_pass http://127.0.0.1:5001;
+        proxy_buffering off;
+        proxy_read_timeout 1h;
+    }
+
+An async worker takes GUNICORN_WORKER_CONNECTIONS (default 1000) streams.
+It does not preload the app: gevent must patch the standard library before
+the app (and its locks and queues) is imported. With PostgreSQL, install
+psycogreen as well so database calls yield to other streams.
+"""
+import glob
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 1000))
+preload_app = worker_class not in ('gevent', 'eventlet')
+
+
+def post_fork(server, worker):
+    if not preload_app:
+        return  # Nothing inherited, and importing the app here would precede gevent's patching
+    from app import db
+    from main import app
+
+    with app.app_context():
+        # close=False: leave the parent's sockets alone, just forget them here
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            return
+        patch_psycopg()
+
+
+def on_starting(server):
+    multiproc_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if multiproc_dir:
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,441 @@
+"""
+Bulk import of teachers and timetables from CSV or XLSX.
+
+Teachers file columns:   teacher_id, name, email, phone[, password]
+Timetable file columns:  teacher_id, day, period, class_name[, section]
+
+`teacher_id` is the school's teacher code (Teacher.teacher_id). Rows are
+read as a stream and processed in chunks of IMPORT_CHUNK_SIZE: each chunk is
+validated, written with a few set-based statements (teachers with one
+INSERT ... ON CONFLICT, timetable slots as a copy-on-write timetable version
+effective from today or --effective, see timetable.py) and committed, so
+a large file never sits in memory and a bad row only costs its own line in
+the error report. Login accounts are created for new teachers only; their
+password hashes (first name unless a password column is given, as in
+add_teacher) are computed in a process pool. Web and API imports do not wait
+for them: the accounts are saved with a placeholder that never matches, and
+a background thread runs the pool and stores the real hashes afterwards.
+
+XLSX files need the optional `openpyxl` package.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import click
+from email_validator import EmailNotValidError, validate_email
+from flask import current_app
+from sqlalchemy import select, update
+from werkzeug.security import generate_password_hash
+
+from app import db
+from utils import bump_data_versions, get_current_date
+
+IMPORT_CHUNK_SIZE = 500
+DAYS = ('Day 1', 'Day 2', 'Day 3', 'Day 4', 'Day 5')
+PERIODS = range(1, 9)
+
+TEACHER_COLUMNS = ('teacher_id', 'name', 'email', 'phone')
+TIMETABLE_COLUMNS = ('teacher_id', 'day', 'period', 'class_name')
+KINDS = ('teachers', 'timetable')
+
+# password_hash of an account whose hash is still being computed; no password matches it
+PENDING_PASSWORD_HASH = '!pending'
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be imported (unreadable, missing columns)."""
+
+
+class ImportReport:
+    """Counts and per-row errors for one import run."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.saved = 0      # rows written (inserted or updated)
+        self.created = 0    # teachers that did not exist before
+        self.accounts = 0   # login accounts created
+        self.errors = []  # (row number, message)
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    def error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+        return self
+
+    def errors_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(['row', 'error'])
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Reading
+# ---------------------------------------------------------------------------
+
+def _normalize_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    yield [_normalize_header(h) for h in header]
+    yield from reader
+
+
+def _xlsx_rows(stream, sheet_name):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportFileError('Reading .xlsx files requires the openpyxl package; upload a CSV instead.')
+    workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+    try:
+        names = {name.lower(): name for name in workbook.sheetnames}
+        sheet = workbook[names.get(sheet_name, workbook.sheetnames[0])]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        yield [_normalize_header(h) for h in header]
+        for row in rows:
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def read_records(stream, filename, kind):
+    """Yield (row number, {column: value}) for each data row of a CSV or XLSX file."""
+    if filename.lower().endswith('.xlsx'):
+        rows = _xlsx_rows(stream, kind)
+    else:
+        rows = _csv_rows(stream)
+
+    header = next(rows, None)
+    required = TEACHER_COLUMNS if kind == 'teachers' else TIMETABLE_COLUMNS
+    missing = [column for column in required if column not in (header or [])]
+    if missing:
+        raise ImportFileError(f'Missing column(s): {", ".join(missing)}')
+
+    for number, row in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in row):
+            continue
+        record = dict.fromkeys(header, '')
+        record.update((column, str(value).strip()) for column, value in zip(header, row))
+        yield number, record
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+# ---------------------------------------------------------------------------
+# Writing
+# ---------------------------------------------------------------------------
+
+def _upsert(table, rows, index_elements, update_columns):
+    """INSERT ... ON CONFLICT DO UPDATE for PostgreSQL and SQLite."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ImportFileError(f'Bulk import is not supported on {dialect}')
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+    db.session.execute(stmt)
+
+
+def _hash_passwords(passwords, workers):
+    if len(passwords) < 2 or workers == 1:
+        return [generate_password_hash(p) for p in passwords]
+    # spawn: forking a threaded web worker is unsafe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(generate_password_hash, passwords, chunksize=8))
+
+
+_hash_executor = None
+
+
+def _hash_later(accounts):
+    """
+    Hash [(user id, password)] in the process pool from a background thread
+    and store the hashes, so the request does not wait for them.
+    """
+    from models import User
+
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='password-hash')
+    app = current_app._get_current_object()
+
+    def store_hashes():
+        with app.app_context():
+            try:
+                hashes = _hash_passwords([password for _, password in accounts], os.cpu_count())
+                db.session.execute(update(User), [{'id': user_id, 'password_hash': password_hash}
+                                                  for (user_id, _), password_hash in zip(accounts, hashes)])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Could not store password hashes for %d imported account(s)', len(accounts))
+            finally:
+                db.session.remove()
+
+    _hash_executor.submit(store_hashes)
+
+
+def _validate_teacher(record):
+    errors = []
+    code, name, phone = record.get('teacher_id', ''), record.get('name', ''), record.get('phone', '')
+    if not code:
+        errors.append('teacher_id is required')
+    elif not 2 <= len(code) <= 20:
+        errors.append('teacher_id must be 2-20 characters')
+    if not 2 <= len(name) <= 64:
+        errors.append('name must be 2-64 characters')
+    if not 10 <= len(phone) <= 15:
+        errors.append('phone must be 10-15 characters')
+    try:
+        record['email'] = validate_email(record.get('email', ''), check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        errors.append(f'invalid email: {e}')
+    return errors
+
+
+def import_teachers(records, report, hash_workers=None, hash_later=False):
+    """
+    Upsert Teacher rows and create accounts for teachers that have none; a
+    changed email is copied to the teacher's account. With hash_later=True
+    the password hashes are computed after the import returns.
+    """
+    from models import Teacher, User
+
+    seen_codes, seen_emails = set(), set()
+    for chunk in _chunks(records, IMPORT_CHUNK_SIZE):
+        valid = []
+        for number, record in chunk:
+            report.rows += 1
+            errors = _validate_teacher(record)
+            if record.get('teacher_id') in seen_codes:
+                errors.append(f'duplicate teacher_id {record["teacher_id"]} in file')
+            if record.get('email') in seen_emails:
+                errors.append(f'duplicate email {record["email"]} in file')
+            if errors:
+                report.error(number, '; '.join(errors))
+                continue
+            seen_codes.add(record['teacher_id'])
+            seen_emails.add(record['email'])
+            valid.append((number, record))
+        if not valid:
+            continue
+
+        codes = [r['teacher_id'] for _, r in valid]
+        emails = [r['email'] for _, r in valid]
+        existing = dict(db.session.execute(
+            select(Teacher.teacher_id, Teacher.id).where(Teacher.teacher_id.in_(codes))).all())
+        # An email may only move with its own teacher
+        email_owners = dict(db.session.execute(
+            select(Teacher.email, Teacher.teacher_id).where(Teacher.email.in_(emails))).all())
+        user_emails = dict(db.session.execute(
+            select(User.email, User.teacher_id).where(User.email.in_(emails))).all())
+
+        rows = []
+        for number, record in valid:
+            owner = email_owners.get(record['email'])
+            if owner is not None and owner != record['teacher_id']:
+                report.error(number, f'email {record["email"]} belongs to teacher {owner}')
+                continue
+            # Unless it is this teacher's own account, another login has the email
+            if record['email'] in user_emails and (record['teacher_id'] not in existing
+                                                   or user_emails[record['email']] != existing[record['teacher_id']]):
+                report.error(number, f'email {record["email"]} is already used by another account')
+                continue
+            rows.append((number, record))
+        if not rows:
+            continue
+
+        _upsert(Teacher.__table__,
+                [{'teacher_id': r['teacher_id'], 'name': r['name'], 'email': r['email'], 'phone': r['phone']}
+                 for _, r in rows],
+                ['teacher_id'], ['name', 'email', 'phone'])
+        report.saved += len(rows)
+        report.created += sum(1 for _, r in rows if r['teacher_id'] not in existing)
+
+        ids = dict(db.session.execute(
+            select(Teacher.teacher_id, Teacher.id).where(Teacher.teacher_id.in_([r['teacher_id'] for _, r in rows]))
+        ).all())
+        accounts = {account.teacher_id: account for account in db.session.execute(
+            select(User.id, User.teacher_id, User.email, User.username).where(User.teacher_id.in_(ids.values())))}
+        # Keep existing accounts' logins in step with the teacher's email
+        moved = []
+        for _, r in rows:
+            account = accounts.get(ids[r['teacher_id']])
+            if account is not None and account.email != r['email']:
+                change = {'id': account.id, 'email': r['email']}
+                if account.username == account.email:
+                    change['username'] = r['email']
+                moved.append(change)
+        if moved:
+            db.session.execute(update(User), moved)
+
+        new_accounts = [r for _, r in rows if ids[r['teacher_id']] not in accounts]
+        passwords = [r.get('password') or r['name'].split()[0] for r in new_accounts]
+        if new_accounts:
+            hashes = [PENDING_PASSWORD_HASH] * len(new_accounts) if hash_later else \
+                _hash_passwords(passwords, hash_workers or os.cpu_count())
+            db.session.execute(User.__table__.insert(), [
+                {'username': r['email'], 'email': r['email'], 'password_hash': password_hash,
+                 'role': 'teacher', 'teacher_id': ids[r['teacher_id']]}
+                for r, password_hash in zip(new_accounts, hashes)
+            ])
+            report.accounts += len(new_accounts)
+
+        bump_data_versions(teachers=ids.values(), roster=True)
+        db.session.commit()
+        if new_accounts and hash_later:
+            user_ids = dict(db.session.execute(select(User.teacher_id, User.id).where(
+                User.teacher_id.in_([ids[r['teacher_id']] for r in new_accounts]))).all())
+            _hash_later([(user_ids[ids[r['teacher_id']]], password) for r, password in zip(new_accounts, passwords)])
+    return report.finish()
+
+
+def _validate_slot(record):
+    errors = []
+    day = record.get('day', '')
+    if day.isdigit():
+        day = record['day'] = f'Day {day}'
+    if day not in DAYS:
+        errors.append(f'day must be one of {", ".join(DAYS)}')
+    try:
+        record['period'] = int(float(record.get('period', '')))
+        if record['period'] not in PERIODS:
+            raise ValueError
+    except ValueError:
+        errors.append('period must be a number from 1 to 8')
+    if not 1 <= len(record.get('class_name', '')) <= 20:
+        errors.append('class_name must be 1-20 characters')
+    if len(record.get('section', '')) > 10:
+        errors.append('section must be at most 10 characters')
+    return errors
+
+
+def import_timetable(records, report, replace=False, effective_from=None):
+    """
+    Set the listed (teacher, day, period) slots from `effective_from` (default
+    today) on, as a copy-on-write timetable version (timetable.py). With
+    replace=True, the rest of each teacher's timetable is emptied the first
+    time the teacher appears in the file, like saving the grid in edit_schedule.
+    """
+    from models import Teacher, TeacherRoutine
+    from timetable import active_routines, save_timetable
+
+    if effective_from is None:
+        effective_from = get_current_date()
+
+    teacher_ids = {}
+    cleared, seen_slots = set(), set()
+    for chunk in _chunks(records, IMPORT_CHUNK_SIZE):
+        unknown = {r['teacher_id'] for _, r in chunk} - teacher_ids.keys()
+        if unknown:
+            teacher_ids.update(db.session.execute(
+                select(Teacher.teacher_id, Teacher.id).where(Teacher.teacher_id.in_(unknown))).all())
+
+        rows = {}
+        for number, record in chunk:
+            report.rows += 1
+            errors = _validate_slot(record)
+            teacher_id = teacher_ids.get(record['teacher_id'])
+            if teacher_id is None:
+                errors.append(f'unknown teacher_id {record["teacher_id"]}')
+            if errors:
+                report.error(number, '; '.join(errors))
+                continue
+            slot = (teacher_id, record['day'], record['period'])
+            if slot in seen_slots:
+                report.error(number, f'duplicate slot {record["day"]} period {record["period"]} '
+                                     f'for {record["teacher_id"]}')
+                continue
+            seen_slots.add(slot)
+            rows[slot] = (record['class_name'], record.get('section', ''))
+        if not rows:
+            continue
+
+        touched = {teacher_id for teacher_id, _, _ in rows}
+        changes = {}
+        if replace and touched - cleared:
+            # Empty the rest of these teachers' timetables from the same date
+            current = active_routines(effective_from).with_entities(
+                TeacherRoutine.teacher_id, TeacherRoutine.day, TeacherRoutine.period) \
+                .filter(TeacherRoutine.teacher_id.in_(touched - cleared))
+            changes = {slot: None for slot in current}
+            cleared |= touched
+        changes.update(rows)
+        save_timetable(changes, effective_from)
+        report.saved += len(rows)
+        db.session.commit()
+    return report.finish()
+
+
+def run_import(kind, stream, filename, replace=False, hash_workers=None, effective_from=None, hash_later=False):
+    """Import one file; returns an ImportReport. Raises ImportFileError for unusable files."""
+    report = ImportReport(kind)
+    records = read_records(stream, filename, kind)
+    try:
+        if kind == 'teachers':
+            return import_teachers(records, report, hash_workers=hash_workers, hash_later=hash_later)
+        return import_timetable(records, report, replace=replace, effective_from=effective_from)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def init_import_cli(app):
+    @app.cli.command('import')
+    @click.argument('kind', type=click.Choice(KINDS))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--replace', is_flag=True, help='Timetable: clear each listed teacher\'s schedule first.')
+    @click.option('--effective', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Timetable: date the imported timetable applies from (default: today).')
+    @click.option('--workers', type=int, default=None, help='Processes for password hashing (default: CPUs).')
+    @click.option('--report', 'report_path', type=click.Path(dir_okay=False),
+                  help='Write the per-row error report to this CSV file.')
+    def import_command(kind, path, replace, effective, workers, report_path):
+        """Bulk import teachers or timetable rows from a CSV or XLSX file."""
+        with open(path, 'rb') as f:
+            try:
+                report = run_import(kind, f, path, replace=replace, hash_workers=workers,
+                                    effective_from=effective.date() if effective else None)
+            except ImportFileError as e:
+                raise click.ClickException(str(e))
+        click.echo(f'{report.rows} row(s) read, {report.saved} saved '
+                   f'({report.created} new teacher(s), {report.accounts} account(s)), '
+                   f'{len(report.errors)} error(s) in {report.duration:.1f}s.')
+        if report_path:
+            with open(report_path, 'w', newline='') as f:
+                f.write(report.errors_csv())
+        else:
+            for number, message in report.errors[:50]:
+                click.echo(f'  row {number}: {message}')
+            if len(report.errors) > 50:
+                click.echo(f'  ... {len(report.errors) - 50} more; use --report to save them all.')
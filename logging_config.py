@@ -0,0 +1,139 @@
+"""
+Logging setup, driven by environment variables:
+
+* LOG_LEVEL            root level (default INFO)
+* LOG_LEVELS           per-logger overrides, e.g. "utils=DEBUG,sqlalchemy.engine=WARNING"
+* LOG_FORMAT           "text" (default) or "json" for one JSON object per line
+* LOG_DEBUG_SAMPLE_RATE  fraction of requests whose DEBUG records are kept (default 1.0)
+* LOG_REQUESTS         "1" to emit one access record per request with its timing
+
+Every record logged while handling a request carries the request id (taken
+from X-Request-ID when a proxy sets it, generated otherwise), which is also
+returned in the X-Request-ID response header. Sampling is decided once per
+request so a sampled request keeps all of its debug records.
+
+Use %-style arguments (logger.debug("x=%s", x)) so messages are only
+formatted when a handler actually emits them.
+"""
+import json
+import logging
+import os
+import random
+import sys
+import time
+import uuid
+import zlib
+
+from flask import g, has_request_context, request
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+# Attributes every LogRecord has; anything else was passed through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach request id, method and path to records logged during a request."""
+
+    def filter(self, record):
+        if has_request_context() and 'request_id' in g:
+            record.request_id = g.request_id
+            record.method = request.method
+            record.path = request.path
+        else:
+            record.request_id = '-'
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep DEBUG records for only a fraction of requests."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate >= 1.0:
+            return True
+        if has_request_context() and 'log_sampled' in g:
+            return g.log_sampled
+        return random.random() < self.rate
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line with the standard fields plus any `extra=` values."""
+
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(level=None, fmt=None, logger_levels=None, sample_rate=None):
+    """Install a single stderr handler on the root logger. Safe to call more than once."""
+    level = (level or os.environ.get('LOG_LEVEL', 'INFO')).upper()
+    fmt = fmt or os.environ.get('LOG_FORMAT', 'text')
+    if logger_levels is None:
+        logger_levels = _parse_levels(os.environ.get('LOG_LEVELS', ''))
+    if sample_rate is None:
+        sample_rate = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', 1.0))
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    handler.addFilter(RequestContextFilter())
+    handler.addFilter(DebugSamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        if getattr(existing, '_app_handler', False):
+            root.removeHandler(existing)
+    handler._app_handler = True
+    root.addHandler(handler)
+    root.setLevel(level)
+    for name, logger_level in logger_levels.items():
+        logging.getLogger(name).setLevel(logger_level)
+    return sample_rate
+
+
+def init_logging(app):
+    sample_rate = configure_logging()
+    log_requests = os.environ.get('LOG_REQUESTS', '0') == '1'
+    access_log = logging.getLogger('access')
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+        if sample_rate < 1.0:
+            # Stable per request id, so upstream and downstream services agree
+            g.log_sampled = zlib.crc32(g.request_id.encode()) % 10000 < sample_rate * 10000
+
+    @app.after_request
+    def finish_request_log(response):
+        request_id = g.get('request_id')
+        if request_id is None:
+            return response
+        response.headers['X-Request-ID'] = request_id
+        if log_requests:
+            duration_ms = (time.perf_counter() - g.request_started) * 1000
+            access_log.info('%s %s %d %.1fms', request.method, request.path, response.status_code, duration_ms,
+                            extra={'status': response.status_code, 'duration_ms': round(duration_ms, 1),
+                                   'endpoint': request.endpoint})
+        return response
@@ -1,4 +1,10 @@
-from app import app  # noqa: F401
+from app import create_app, init_schema
+
+app = create_app()
 
 if __name__ == "__main__":
+    # The development server creates missing tables for convenience;
+    # deployments run `flask --app main init-db` instead.
+    with app.app_context():
+        init_schema()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,157 @@
+"""
+Prometheus metrics, served at /metrics.
+
+Requires the optional `prometheus_client` package; without it every
+recording helper is a no-op and /metrics answers 503.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR to an empty directory shared by
+all workers. Each worker then writes its samples to files there and /metrics
+aggregates them, so any worker can answer a scrape (gunicorn.conf.py cleans
+the directory on start and marks workers dead when they exit). Without it,
+/metrics reports only the worker that served the scrape.
+
+Set METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics.
+"""
+import hmac
+import os
+import time
+
+from flask import Response, abort, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # optional dependency
+    prometheus_client = None
+
+PREFIX = 'tasv'
+
+# Histogram buckets (seconds, or slot counts for PLANNING_SLOTS)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PLANNING_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SLOT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+# name -> callable returning the current number of waiting jobs
+_queues = {}
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram(
+        f'{PREFIX}_request_duration_seconds', 'Request latency by endpoint',
+        ['endpoint', 'method'], buckets=REQUEST_BUCKETS)
+    REQUESTS = Counter(
+        f'{PREFIX}_requests_total', 'Requests by endpoint and status',
+        ['endpoint', 'method', 'status'])
+    PLANNING_DURATION = Histogram(
+        f'{PREFIX}_find_substitutes_duration_seconds', 'Duration of one find_substitutes run',
+        buckets=PLANNING_BUCKETS)
+    PLANNING_SLOTS = Histogram(
+        f'{PREFIX}_find_substitutes_slots', 'Slots handled per find_substitutes run',
+        ['outcome'], buckets=SLOT_BUCKETS)
+    CACHE_REQUESTS = Counter(
+        f'{PREFIX}_cache_requests_total', 'In-process cache lookups',
+        ['cache', 'result'])
+    POOL_CHECKOUT_WAIT = Histogram(
+        f'{PREFIX}_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection',
+        ['bind'], buckets=POOL_WAIT_BUCKETS)
+    POOL_TIMEOUTS = Counter(
+        f'{PREFIX}_db_pool_checkout_timeouts_total', 'Checkouts that timed out', ['bind'])
+    POOL_IN_USE = Gauge(
+        f'{PREFIX}_db_pool_connections_in_use', 'Connections checked out', ['bind'],
+        multiprocess_mode='livesum')
+    POOL_OVERFLOW = Gauge(
+        f'{PREFIX}_db_pool_overflow_connections', 'Connections open beyond pool_size', ['bind'],
+        multiprocess_mode='livesum')
+    POOL_SIZE = Gauge(
+        f'{PREFIX}_db_pool_size', 'Configured pool size', ['bind'],
+        multiprocess_mode='livesum')
+
+
+def observe_cache(cache_name, hit):
+    if prometheus_client is not None:
+        CACHE_REQUESTS.labels(cache_name, 'hit' if hit else 'miss').inc()
+
+
+def observe_planning(duration, assigned, uncovered):
+    if prometheus_client is not None:
+        PLANNING_DURATION.observe(duration)
+        PLANNING_SLOTS.labels('assigned').observe(assigned)
+        PLANNING_SLOTS.labels('uncovered').observe(uncovered)
+
+
+def observe_pool_checkout(pool, waited, timed_out=False):
+    if prometheus_client is None:
+        return
+    bind = getattr(pool, 'bind_name', 'primary')
+    if timed_out:
+        POOL_TIMEOUTS.labels(bind).inc()
+    else:
+        POOL_CHECKOUT_WAIT.labels(bind).observe(waited)
+
+
+def observe_pool_usage(pool):
+    """Refresh the in-use / overflow gauges after a checkout or checkin."""
+    if prometheus_client is None or not hasattr(pool, 'checkedout'):
+        return
+    bind = getattr(pool, 'bind_name', 'primary')
+    POOL_IN_USE.labels(bind).set(pool.checkedout())
+    POOL_OVERFLOW.labels(bind).set(max(pool.overflow(), 0))
+    POOL_SIZE.labels(bind).set(pool.size())
+
+
+def register_queue(name, depth):
+    """Report `depth()` as tasv_job_queue_depth{queue=name} at scrape time."""
+    _queues[name] = depth
+
+
+class _QueueDepthCollector:
+    """Queue depths are read from the database when scraped, so every worker agrees."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def collect(self):
+        family = GaugeMetricFamily(f'{PREFIX}_job_queue_depth', 'Jobs waiting per queue', labels=['queue'])
+        with self.app.app_context():
+            for name, depth in sorted(_queues.items()):
+                family.add_metric([name], depth())
+        yield family
+
+
+def _registry(app):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = CollectorRegistry()
+        registry.register(prometheus_client.REGISTRY)
+    registry.register(_QueueDepthCollector(app))
+    return registry
+
+
+def init_metrics(app):
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if prometheus_client is not None and started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        if prometheus_client is None:
+            return Response('prometheus_client is not installed\n', status=503, mimetype='text/plain')
+        token = app.config['METRICS_TOKEN']
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            abort(401)
+        data = prometheus_client.generate_latest(_registry(app))
+        return Response(data, content_type=prometheus_client.CONTENT_TYPE_LATEST)
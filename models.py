@@ -1,6 +1,10 @@
 from app import db
 from flask_login import UserMixin
-from datetime import datetime
+from datetime import date, datetime
+
+# Validity bounds of TeacherRoutine rows with no explicit start or end
+TIMETABLE_START = date.min
+TIMETABLE_END = date.max
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,6 +18,19 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.username}>'
 
+class ApiToken(db.Model):
+    """Bearer token of the /api/v1 JSON API (see api_tokens.py); only its SHA-256 is stored."""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(64), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    user = db.relationship('User', backref=db.backref('api_tokens', cascade="all, delete-orphan"))
+
+    def __repr__(self):
+        return f'<ApiToken {self.name} of {self.user_id}>'
+
 class Teacher(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
@@ -26,10 +43,14 @@ class Teacher(db.Model):
     users = db.relationship('User', backref='teacher', lazy=True, cascade="all, delete-orphan")
     routines = db.relationship('TeacherRoutine', backref='teacher', lazy=True, cascade="all, delete-orphan")
     absences = db.relationship('Absence', backref='teacher', lazy=True, cascade="all, delete-orphan")
+    absence_ranges = db.relationship('AbsenceRange', backref='teacher', lazy=True, cascade="all, delete-orphan")
+    notifications = db.relationship('Notification', backref='teacher', lazy=True, cascade="all, delete-orphan")
     substitutions = db.relationship('Substitution', backref='substitute_teacher', lazy=True, 
                                     foreign_keys='Substitution.teacher_id', cascade="all, delete-orphan")
     original_substitutions = db.relationship('Substitution', backref='original_teacher', lazy=True, 
                                            foreign_keys='Substitution.original_teacher_id', cascade="all, delete-orphan")
+    workload = db.relationship('TeacherWorkload', backref='teacher', lazy=True, cascade="all, delete-orphan")
+    uncovered_slots = db.relationship('UncoveredSlot', backref='teacher', lazy=True, cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<Teacher {self.name}>'
@@ -42,9 +63,14 @@ class TeacherRoutine(db.Model):
     class_name = db.Column(db.String(20), nullable=False)  # Class name or 'Free'
     section = db.Column(db.String(10), nullable=True)  # A, B, C, etc.
     is_free = db.Column(db.Boolean, default=False)  # If this is a free period
+    # The slot applies to dates in [valid_from, valid_to); see timetable.py
+    valid_from = db.Column(db.Date, nullable=False, default=TIMETABLE_START)
+    valid_to = db.Column(db.Date, nullable=False, default=TIMETABLE_END)
     
     __table_args__ = (
-        db.UniqueConstraint('teacher_id', 'day', 'period', name='unique_teacher_schedule'),
+        db.UniqueConstraint('teacher_id', 'day', 'period', 'valid_from', name='unique_teacher_schedule'),
+        db.Index('ix_teacher_routine_day_validity', 'day', 'valid_from', 'valid_to'),
+        db.Index('ix_teacher_routine_class_slot', 'class_name', 'section', 'day', 'period'),
     )
     
     def __repr__(self):
@@ -56,6 +82,8 @@ class Absence(db.Model):
     date = db.Column(db.Date, nullable=False)
     day = db.Column(db.String(10), nullable=False)  # Monday, Tuesday, etc.
     reported_by = db.Column(db.String(20), nullable=False, default='admin')  # 'admin' or 'self'
+    range_id = db.Column(db.Integer, db.ForeignKey('absence_range.id'), nullable=True)  # Set for multi-day leave
+    periods = db.Column(db.Integer, nullable=True)  # Bitmask of absent periods (bit 0 = period 1); None = whole day
     created_at = db.Column(db.DateTime, default=datetime.now)
     
     __table_args__ = (
@@ -65,6 +93,21 @@ class Absence(db.Model):
     def __repr__(self):
         return f'<Absence {self.teacher.name} on {self.date}>'
 
+class AbsenceRange(db.Model):
+    """Leave over several days, expanded into one Absence per school day."""
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+    reason = db.Column(db.String(200), nullable=True)
+    reported_by = db.Column(db.String(20), nullable=False, default='admin')
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    absences = db.relationship('Absence', backref='absence_range', lazy=True, cascade="all, delete-orphan")
+    
+    def __repr__(self):
+        return f'<AbsenceRange {self.teacher.name} {self.start_date} to {self.end_date}>'
+
 class Substitution(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     original_teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
@@ -76,9 +119,27 @@ class Substitution(db.Model):
     section = db.Column(db.String(10), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.now)
     
+    __table_args__ = (
+        db.Index('ix_substitution_date_class', 'date', 'class_name', 'section'),
+    )
+    
     def __repr__(self):
         return f'<Substitution {self.substitute_teacher.name} for {self.original_teacher.name} on {self.date} Period {self.period}>'
 
+class UncoveredSlot(db.Model):
+    """A class of an absent teacher that the planner found no free teacher for."""
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)  # Absent teacher
+    date = db.Column(db.Date, nullable=False, index=True)
+    day = db.Column(db.String(10), nullable=False)
+    period = db.Column(db.Integer, nullable=False)
+    class_name = db.Column(db.String(20), nullable=False)
+    section = db.Column(db.String(10), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<UncoveredSlot {self.date} Period {self.period} class {self.class_name}{self.section or ""}>'
+
 class SubstitutionTransfer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     substitution_id = db.Column(db.Integer, db.ForeignKey('substitution.id'), nullable=False)
@@ -97,3 +158,121 @@ class SubstitutionTransfer(db.Model):
     
     def __repr__(self):
         return f'<SubstitutionTransfer from {self.original_teacher.name} to {self.new_teacher.name}, status: {self.status}>'
+
+class Notification(db.Model):
+    """Outbox row: a message for a teacher, sent in per-recipient batches by notifier.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)  # Recipient
+    kind = db.Column(db.String(30), nullable=False)  # 'assignment', 'transfer_approved', 'transfer_rejected'
+    payload = db.Column(db.Text, nullable=False)  # JSON details, rendered when sent
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.String(200), nullable=True)
+    
+    __table_args__ = (
+        db.Index('ix_notification_pending', 'sent_at', 'teacher_id'),
+    )
+    
+    def __repr__(self):
+        return f'<Notification {self.kind} for {self.teacher_id}{" (sent)" if self.sent_at else ""}>'
+
+class SchoolHoliday(db.Model):
+    """A date without classes (holiday, closure); see school_calendar.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    
+    def __repr__(self):
+        return f'<SchoolHoliday {self.name} on {self.date}>'
+
+class TimetableVersion(db.Model):
+    """A date from which a changed timetable applies; see timetable.py."""
+    id = db.Column(db.Integer, primary_key=True)
+    effective_from = db.Column(db.Date, unique=True, nullable=False)
+    note = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    def __repr__(self):
+        return f'<TimetableVersion from {self.effective_from}>'
+
+class CalendarDay(db.Model):
+    """Precomputed calendar: every date of a built academic year and its rotation day."""
+    date = db.Column(db.Date, primary_key=True)
+    academic_year = db.Column(db.Integer, nullable=False, index=True)
+    day = db.Column(db.String(10), nullable=True)  # 'Day 1'..'Day 5', None if there is no school
+    holiday = db.Column(db.String(100), nullable=True)
+    
+    def __repr__(self):
+        return f'<CalendarDay {self.date} {self.day or "no school"}>'
+
+class TeacherWorkload(db.Model):
+    """Covers given and received by a teacher in one week, maintained by workload.py."""
+    teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), primary_key=True)
+    week_start = db.Column(db.Date, primary_key=True, index=True)  # Monday of the week
+    covers_given = db.Column(db.Integer, nullable=False, default=0)  # Periods covered for others
+    covers_received = db.Column(db.Integer, nullable=False, default=0)  # Own periods covered by others
+    
+    def __repr__(self):
+        return f'<TeacherWorkload {self.teacher_id} week of {self.week_start}: +{self.covers_given}/-{self.covers_received}>'
+
+class DataVersion(db.Model):
+    """Monotonic change counter for a slice of data (e.g. 'date:2025-05-01', 'teacher:3')."""
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.key}={self.version}>'
+
+# Archive tables: rows of closed academic years moved out of the live tables by
+# archive.py. Ids are kept from the live rows; teacher names are copied so the
+# history survives teachers being deleted later (hence no foreign keys).
+
+class ArchivedAbsence(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    academic_year = db.Column(db.Integer, nullable=False, index=True)  # Year the academic year starts in
+    teacher_id = db.Column(db.Integer, nullable=False)
+    teacher_name = db.Column(db.String(64), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    day = db.Column(db.String(10), nullable=False)
+    reported_by = db.Column(db.String(20), nullable=False)
+    periods = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ArchivedAbsence {self.teacher_name} on {self.date}>'
+
+class ArchivedSubstitution(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    academic_year = db.Column(db.Integer, nullable=False, index=True)
+    original_teacher_id = db.Column(db.Integer, nullable=False)
+    original_teacher_name = db.Column(db.String(64), nullable=False)
+    teacher_id = db.Column(db.Integer, nullable=False)  # Substitute teacher
+    teacher_name = db.Column(db.String(64), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    day = db.Column(db.String(10), nullable=False)
+    period = db.Column(db.Integer, nullable=False)
+    class_name = db.Column(db.String(20), nullable=False)
+    section = db.Column(db.String(10), nullable=True)
+    created_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<ArchivedSubstitution {self.teacher_name} for {self.original_teacher_name} on {self.date} Period {self.period}>'
+
+class ArchivedSubstitutionTransfer(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    academic_year = db.Column(db.Integer, nullable=False, index=True)
+    substitution_id = db.Column(db.Integer, nullable=False)  # ArchivedSubstitution.id
+    original_teacher_id = db.Column(db.Integer, nullable=False)
+    original_teacher_name = db.Column(db.String(64), nullable=False)
+    new_teacher_id = db.Column(db.Integer, nullable=False)
+    new_teacher_name = db.Column(db.String(64), nullable=False)
+    reason = db.Column(db.Text, nullable=False)
+    request_date = db.Column(db.DateTime, nullable=False)
+    action_date = db.Column(db.DateTime, nullable=True)
+    status = db.Column(db.String(20), nullable=False)
+    transfer_all = db.Column(db.Boolean, default=False)
+    
+    def __repr__(self):
+        return f'<ArchivedSubstitutionTransfer from {self.original_teacher_name} to {self.new_teacher_name}, status: {self.status}>'
@@ -0,0 +1,206 @@
+"""
+Teacher notifications through an outbox table.
+
+Writes that teachers should hear about (new cover assignments from the
+planner, transfer approvals and rejections) add Notification rows in their
+own transaction with one bulk insert, so a request never waits for mail.
+A separate worker process drains the outbox: it takes up to
+NOTIFY_BATCH_SIZE pending rows, groups them per recipient, renders one
+email per teacher and sends them all over a single SMTP connection.
+
+    flask --app main notify worker     # run alongside the web workers
+    flask --app main notify drain      # one pass, e.g. from cron or by hand
+
+Rows that fail are retried on later passes up to NOTIFY_MAX_ATTEMPTS; sent
+rows are deleted after NOTIFY_RETENTION_DAYS. To try it locally, run a
+debugging SMTP server that prints every message, e.g.
+
+    python -m aiosmtpd -n -l localhost:1025        # or, on Python <= 3.11:
+    python -m smtpd -n -c DebuggingServer localhost:1025
+
+and start the worker with MAIL_PORT=1025.
+"""
+import json
+import smtplib
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from email.message import EmailMessage
+
+import click
+from flask import current_app
+from sqlalchemy import update
+
+from app import db
+
+def enqueue(notifications):
+    """
+    Add (teacher id, kind, payload dict) notifications to the current
+    session with one bulk insert; the caller commits.
+    """
+    from models import Notification
+
+    rows = [{'teacher_id': teacher_id, 'kind': kind, 'payload': json.dumps(payload, default=str),
+             'created_at': datetime.now(), 'attempts': 0}
+            for teacher_id, kind, payload in notifications]
+    if rows and current_app.config['NOTIFY_ENABLED']:
+        db.session.execute(Notification.__table__.insert(), rows)
+
+
+def slot_payload(day, period, class_name, section, original_teacher_id, **extra):
+    """The payload describing one covered class."""
+    return dict(extra, date=day.isoformat(), period=period, class_name=class_name, section=section or '',
+                original_teacher_id=original_teacher_id)
+
+
+def _render_line(kind, payload, names):
+    slot = (f'Class {payload["class_name"]}{payload["section"]}, period {payload["period"]} '
+            f'on {date.fromisoformat(payload["date"]):%A %d %B %Y}')
+    if kind == 'assignment':
+        return f'You are covering {slot} for {names.get(payload["original_teacher_id"], "an absent colleague")}.'
+    if kind == 'transfer_approved':
+        return f'Your transfer request was approved: {slot} is now covered by ' \
+               f'{names.get(payload["new_teacher_id"], "another teacher")}.'
+    return f'Your transfer request was rejected: you are still covering {slot}.'
+
+
+def _message(sender, name, email, notifications, names):
+    """One email for all of a teacher's pending notifications, oldest first."""
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = email
+    if len(notifications) == 1:
+        message['Subject'] = {'assignment': 'New cover assignment',
+                              'transfer_approved': 'Transfer request approved',
+                              'transfer_rejected': 'Transfer request rejected'}[notifications[0].kind]
+    else:
+        message['Subject'] = f'{len(notifications)} substitution updates'
+    lines = [f'Dear {name},', '']
+    lines += [f'- {_render_line(n.kind, json.loads(n.payload), names)}' for n in notifications]
+    lines += ['', 'Your dashboard has the full plan.']
+    message.set_content('\n'.join(lines))
+    return message
+
+
+def _connect(config):
+    smtp = smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30)
+    if config['MAIL_USE_TLS']:
+        smtp.starttls()
+    if config['MAIL_USERNAME']:
+        smtp.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'] or '')
+    return smtp
+
+
+def drain_outbox():
+    """
+    Send one batch of pending notifications, one email per recipient over a
+    single SMTP connection. Returns (notifications sent, failed).
+    """
+    from models import Notification, Teacher
+
+    config = current_app.config
+    pending = Notification.query.filter(Notification.sent_at.is_(None),
+                                        Notification.attempts < config['NOTIFY_MAX_ATTEMPTS']) \
+        .order_by(Notification.id).limit(config['NOTIFY_BATCH_SIZE']) \
+        .with_for_update(skip_locked=True).all()  # PostgreSQL: concurrent workers take different rows
+    if not pending:
+        db.session.rollback()
+        return 0, 0
+
+    by_teacher = defaultdict(list)
+    referenced = set()
+    for notification in pending:
+        by_teacher[notification.teacher_id].append(notification)
+        payload = json.loads(notification.payload)
+        referenced.update(payload[key] for key in ('original_teacher_id', 'new_teacher_id') if key in payload)
+    teachers = {t.id: (t.name, t.email) for t in db.session.query(Teacher.id, Teacher.name, Teacher.email)
+                .filter(Teacher.id.in_(by_teacher.keys() | referenced))}
+    names = {teacher_id: name for teacher_id, (name, _) in teachers.items()}
+
+    sent, failed = [], {}
+    try:
+        smtp = _connect(config)
+    except (OSError, smtplib.SMTPException) as e:
+        current_app.logger.warning('Cannot reach SMTP server %s:%s: %s', config['MAIL_SERVER'], config['MAIL_PORT'], e)
+        failed = {n.id: f'connect: {e}' for n in pending}
+    else:
+        try:
+            for teacher_id, notifications in by_teacher.items():
+                if teacher_id not in teachers:
+                    failed.update((n.id, 'recipient no longer exists') for n in notifications)
+                    continue
+                name, email = teachers[teacher_id]
+                try:
+                    smtp.send_message(_message(config['MAIL_SENDER'], name, email, notifications, names))
+                    sent += [n.id for n in notifications]
+                except smtplib.SMTPServerDisconnected as e:
+                    failed.update((n.id, str(e) or 'server disconnected') for n in notifications)
+                    break  # The rest stay pending for the next pass
+                except smtplib.SMTPException as e:
+                    failed.update((n.id, str(e)) for n in notifications)
+                except OSError as e:
+                    # Timeout or reset: the connection is gone, but what was sent is still recorded below
+                    failed.update((n.id, f'{type(e).__name__}: {e}') for n in notifications)
+                    break
+        finally:
+            try:
+                smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                smtp.close()
+
+    now = datetime.now()
+    if sent:
+        db.session.execute(update(Notification), [{'id': i, 'sent_at': now} for i in sent])
+    if failed:
+        attempts = {n.id: n.attempts for n in pending}
+        db.session.execute(update(Notification), [
+            {'id': i, 'attempts': attempts[i] + 1, 'last_error': error[:200]} for i, error in failed.items()])
+    Notification.query.filter(Notification.sent_at < now - timedelta(days=config['NOTIFY_RETENTION_DAYS'])) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    if failed:
+        current_app.logger.warning('%d notification(s) could not be sent', len(failed))
+    return len(sent), len(failed)
+
+
+def pending_count():
+    """Notifications waiting to be sent (or retried)."""
+    from models import Notification
+
+    return Notification.query.filter(Notification.sent_at.is_(None),
+                                     Notification.attempts < current_app.config['NOTIFY_MAX_ATTEMPTS']).count()
+
+
+def init_notify_cli(app):
+    @app.cli.group('notify')
+    def notify():
+        """Send queued teacher notifications."""
+
+    @notify.command('drain')
+    def drain_command():
+        """Send everything pending, batch by batch, then exit."""
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = drain_outbox()
+            total_sent, total_failed = total_sent + sent, total_failed + failed
+            if not sent or failed:
+                break  # Failures are retried by a later run, not in a tight loop
+        click.echo(f'{total_sent} notification(s) sent, {total_failed} failed.')
+
+    @notify.command('worker')
+    @click.option('--interval', type=float, default=None,
+                  help='Seconds between polls when the outbox is empty (default: NOTIFY_POLL_SECONDS).')
+    def worker_command(interval):
+        """Keep draining the outbox until interrupted."""
+        interval = interval or app.config['NOTIFY_POLL_SECONDS']
+        click.echo(f'Sending notifications via {app.config["MAIL_SERVER"]}:{app.config["MAIL_PORT"]}; Ctrl+C to stop.')
+        while True:
+            try:
+                sent, _ = drain_outbox()
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Notification batch failed')
+                sent = 0
+            db.session.remove()
+            if not sent:
+                time.sleep(interval)
@@ -0,0 +1,294 @@
+"""
+Server-side PDF reports.
+
+Reports are rendered with a small built-in PDF writer (standard Helvetica
+fonts, no external dependencies) so that printing works on machines that
+cannot reach a CDN. Rendered bytes are cached per
+(report type, key, data version); a write that changes the underlying data
+bumps its DataVersion counters and the next request renders a fresh copy.
+"""
+from datetime import timedelta
+
+from flask import Response, request
+
+from cache import report_cache
+from utils import get_data_versions, get_data_updated_at, cached_substitution_plan
+
+DAYS = ['Day 1', 'Day 2', 'Day 3', 'Day 4', 'Day 5']
+PERIODS = range(1, 9)
+
+# Page geometry in PostScript points
+A4_PORTRAIT = (595, 842)
+A4_LANDSCAPE = (842, 595)
+MARGIN = 40
+
+
+def _escape(text):
+    """Escape a string for use inside a PDF literal string."""
+    text = str(text).replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return text.encode('latin-1', 'replace').decode('latin-1')
+
+
+class PDFDocument:
+    """Minimal multi-page PDF writer for text and simple grid tables."""
+
+    def __init__(self, title, pagesize=A4_PORTRAIT):
+        self.title = title
+        self.width, self.height = pagesize
+        self.pages = []
+        self.y = 0
+        self.add_page()
+
+    def add_page(self):
+        self.pages.append([])
+        self.y = self.height - MARGIN
+
+    def _ops(self):
+        return self.pages[-1]
+
+    def text(self, x, y, value, size=10, bold=False):
+        font = 'F2' if bold else 'F1'
+        self._ops().append(f'BT /{font} {size} Tf {x:.1f} {y:.1f} Td ({_escape(value)}) Tj ET')
+
+    def rect(self, x, y, w, h, gray=None):
+        if gray is None:
+            self._ops().append(f'{x:.1f} {y:.1f} {w:.1f} {h:.1f} re S')
+        else:
+            self._ops().append(f'{gray:.2f} g {x:.1f} {y:.1f} {w:.1f} {h:.1f} re f 0 g')
+
+    def heading(self, value, size=16):
+        self.ensure_space(size + 8)
+        self.text(MARGIN, self.y - size, value, size=size, bold=True)
+        self.y -= size + 8
+
+    def paragraph(self, value, size=10):
+        self.ensure_space(size + 6)
+        self.text(MARGIN, self.y - size, value, size=size)
+        self.y -= size + 6
+
+    def ensure_space(self, needed):
+        if self.y - needed < MARGIN + 20:
+            self.add_page()
+
+    @staticmethod
+    def _fit(value, width, size):
+        """Truncate a cell value so it fits the column (Helvetica averages ~0.5em)."""
+        value = '' if value is None else str(value)
+        max_chars = max(int((width - 6) / (size * 0.5)), 1)
+        if len(value) > max_chars:
+            return value[:max(max_chars - 1, 1)] + '~'
+        return value
+
+    def table(self, headers, rows, widths=None, size=9):
+        """Draw a grid table, repeating the header row on each new page."""
+        usable = self.width - 2 * MARGIN
+        if widths is None:
+            widths = [usable / len(headers)] * len(headers)
+        else:
+            scale = usable / sum(widths)
+            widths = [w * scale for w in widths]
+        row_height = size + 8
+
+        def draw_row(cells, header=False):
+            self.ensure_space(row_height)
+            top = self.y
+            x = MARGIN
+            if header:
+                self.rect(MARGIN, top - row_height, usable, row_height, gray=0.85)
+            for cell, width in zip(cells, widths):
+                self.rect(x, top - row_height, width, row_height)
+                self.text(x + 3, top - row_height + 5, self._fit(cell, width, size), size=size, bold=header)
+                x += width
+            self.y -= row_height
+
+        draw_row(headers, header=True)
+        for row in rows:
+            if self.y - row_height < MARGIN + 20:
+                self.add_page()
+                draw_row(headers, header=True)
+            draw_row(row)
+        self.y -= 8
+
+    def render(self):
+        """Serialize the document to PDF bytes."""
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(None)
+        pages_id = add(None)
+        regular = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        bold = add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+
+        page_ids = []
+        total = len(self.pages)
+        for number, ops in enumerate(self.pages, 1):
+            footer = (f'BT /F1 8 Tf {MARGIN} {MARGIN - 15} Td '
+                      f'({_escape(f"{self.title} - page {number} of {total}")}) Tj ET')
+            stream = '\n'.join(ops + [footer]).encode('latin-1')
+            content = add(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+            page_ids.append(add(
+                (f'<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {self.width} {self.height}] '
+                 f'/Resources << /Font << /F1 {regular} 0 R /F2 {bold} 0 R >> >> '
+                 f'/Contents {content} 0 R >>').encode('latin-1')
+            ))
+
+        kids = ' '.join(f'{pid} 0 R' for pid in page_ids)
+        objects[catalog - 1] = f'<< /Type /Catalog /Pages {pages_id} 0 R >>'.encode('latin-1')
+        objects[pages_id - 1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('latin-1')
+        info = add(f'<< /Title ({_escape(self.title)}) /Producer (Teacher Substitution System) >>'.encode('latin-1'))
+
+        out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+        xref = len(out)
+        out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+        for offset in offsets:
+            out += b'%010d 00000 n \n' % offset
+        out += (f'trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R /Info {info} 0 R >>\n'
+                f'startxref\n{xref}\n%%EOF\n').encode('latin-1')
+        return bytes(out)
+
+
+# ---------------------------------------------------------------------------
+# Report builders
+# ---------------------------------------------------------------------------
+
+def _data_as_of(doc, as_of):
+    # Cached reports are served long after they are rendered, so show the data's time, not the render's
+    if as_of is not None:
+        doc.paragraph(f'Data as of {as_of:%Y-%m-%d %H:%M}', size=8)
+
+
+def build_substitution_plan_pdf(date_obj, as_of=None):
+    """Daily substitution plan, one table per period."""
+    plan = cached_substitution_plan(date_obj)
+    doc = PDFDocument(f'Substitution Plan {date_obj}')
+    doc.heading('Substitution Plan')
+    doc.paragraph(f'Date: {date_obj}')
+    _data_as_of(doc, as_of)
+
+    for period, subs in plan.items():
+        doc.heading(f'Period {period}', size=12)
+        if subs:
+            doc.table(
+                ['Original Teacher', 'Substitute Teacher', 'Class', 'Section'],
+                [[s['original_teacher'], s['substitute_teacher'] or 'UNCOVERED', s['class_name'], s['section'] or '']
+                 for s in subs],
+                widths=[3, 3, 2, 1]
+            )
+        else:
+            doc.paragraph('No substitutions needed for this period.', size=9)
+    return doc.render()
+
+
+def build_teacher_week_pdf(teacher, week_start, as_of=None):
+    """A teacher's weekly timetable plus the covers assigned to them that week."""
+    from models import Substitution
+    from timetable import active_routines
+
+    routines = active_routines(week_start).filter_by(teacher_id=teacher.id).all()
+    grid = {(r.day, r.period): r for r in routines}
+
+    week_end = week_start + timedelta(days=6)
+    covers = Substitution.query.filter(
+        Substitution.teacher_id == teacher.id,
+        Substitution.date >= week_start,
+        Substitution.date <= week_end
+    ).order_by(Substitution.date, Substitution.period).all()
+
+    doc = PDFDocument(f'Weekly Schedule {teacher.name}', pagesize=A4_LANDSCAPE)
+    doc.heading('Weekly Schedule')
+    doc.paragraph(f'Teacher: {teacher.name} (ID: {teacher.teacher_id})')
+    doc.paragraph(f'Week of {week_start} to {week_end}', size=9)
+    _data_as_of(doc, as_of)
+
+    rows = []
+    for period in PERIODS:
+        row = [str(period)]
+        for day in DAYS:
+            entry = grid.get((day, period))
+            if entry is None:
+                row.append('')
+            elif entry.is_free:
+                row.append('Free')
+            else:
+                row.append(f'{entry.class_name} {entry.section or ""}'.strip())
+        rows.append(row)
+    doc.table(['Period'] + DAYS, rows, widths=[1] + [3] * len(DAYS))
+
+    doc.heading('Substitutions This Week', size=12)
+    if covers:
+        doc.table(
+            ['Date', 'Day', 'Period', 'Covering For', 'Class', 'Section'],
+            [[c.date, c.day, c.period, c.original_teacher.name, c.class_name, c.section or '']
+             for c in covers],
+            widths=[2, 1.5, 1, 3, 2, 1]
+        )
+    else:
+        doc.paragraph('No substitutions assigned this week.', size=9)
+    return doc.render()
+
+
+def build_history_pdf(kind, year=None, as_of=None):
+    """History export for absences, substitutions or transfers, live or for an archived academic year."""
+    from utils import history_query, history_row
+
+    rows = [history_row(kind, item) for item in history_query(kind, year).all()]
+    if kind == 'absences':
+        title = 'Absence History'
+        headers = ['Date', 'Day', 'Teacher', 'Periods', 'Reported By', 'Created At']
+        widths = [2, 1.5, 4, 2, 2, 3]
+        rows = [[r['date'], r['day'], r['teacher'], r['periods'], r['reported_by'], r['created_at']]
+                for r in rows]
+    elif kind == 'substitutions':
+        title = 'Substitution History'
+        headers = ['Date', 'Period', 'Original Teacher', 'Substitute Teacher', 'Class', 'Section']
+        widths = [2, 1, 4, 4, 2, 1]
+        rows = [[r['date'], r['period'], r['original_teacher'], r['substitute_teacher'], r['class_name'],
+                 r['section'] or ''] for r in rows]
+    else:
+        title = 'Transfer History'
+        headers = ['Request Date', 'From', 'To', 'Reason', 'Status', 'Action Date']
+        widths = [3, 3, 3, 5, 2, 3]
+        rows = [[r['request_date'], r['original_teacher'], r['new_teacher'], r['reason'], r['status'],
+                 r['action_date'] or '-'] for r in rows]
+    if year is not None:
+        from archive import academic_year_label
+        title = f'{title} {academic_year_label(year)}'
+
+    doc = PDFDocument(title, pagesize=A4_LANDSCAPE)
+    doc.heading(title)
+    _data_as_of(doc, as_of)
+    doc.table(headers, rows, widths=widths)
+    return doc.render()
+
+
+def serve_report(report_type, key, version_keys, builder, filename):
+    """
+    Serve a PDF report, rendering it only when no cached copy exists for the
+    current data version. The ETag is derived from the version so a client
+    holding the current copy gets a 304 without the report being rendered.
+    `builder(as_of)` gets the time the data last changed, for the report to show.
+    """
+    versions = get_data_versions(*version_keys)
+    etag = f"{report_type}-{key}-{'.'.join(str(v) for v in versions)}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    data = report_cache.get_or_build(report_type, key, version_keys,
+                                     lambda: builder(get_data_updated_at(*version_keys)), versions=versions)
+
+    response = Response(data, mimetype='application/pdf')
+    response.set_etag(etag)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
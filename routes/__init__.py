@@ -1,5 +1,10 @@
 # Routes package
-from flask import render_template, request
+import hashlib
+import time
+from functools import wraps
+
+from flask import render_template, request, session, current_app, make_response
+from flask_login import current_user
 
 def render_template_with_htmx(template_name, **context):
     """
@@ -11,4 +16,64 @@ def render_template_with_htmx(template_name, **context):
         context['layout'] = 'htmx_layout.html'
     
     # For normal requests, render with base template
-    return render_template(template_name, **context)
\ No newline at end of file
+    return render_template(template_name, **context)
+
+def page_etag(version_keys):
+    """
+    Compute a weak ETag for the current page from the DataVersion counters it
+    depends on. Everything else that changes the rendered HTML is mixed in:
+    the URL, the user (navbar), the HTMX layout, the session's CSRF token
+    and its lifetime window (pages embed a signed token that expires).
+    """
+    from utils import get_data_versions, data_version_key
+
+    versions = get_data_versions(*version_keys)
+    csrf_window = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600) or 0
+    parts = [
+        request.full_path,
+        str(current_user.get_id()),
+        '1' if request.headers.get('HX-Request') else '0',
+        str(int(time.time() // (csrf_window // 2)) if csrf_window else 0),
+        # A new login starts a new CSRF token, so pages cached before it are stale
+        hashlib.sha1(str(session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'), '')).encode('utf-8'))
+        .hexdigest(),
+    ]
+    parts += [f'{data_version_key(*key)}={version}' for key, version in zip(version_keys, versions)]
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+def conditional_page(version_keys_for):
+    """
+    Decorator for read-only pages. `version_keys_for(**view_args)` returns the
+    (scope, ident) DataVersion keys the page depends on; it may return None
+    to opt out (e.g. when the user is not allowed to see the page).
+
+    When the client's If-None-Match matches, a 304 is returned before the view
+    runs, so no page data is queried and nothing is rendered.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are rendered once; never short-circuit them
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            version_keys = version_keys_for(**kwargs)
+            if version_keys is None:
+                return view(*args, **kwargs)
+
+            etag = page_etag(version_keys)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('HX-Request')
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
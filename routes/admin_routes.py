@@ -1,38 +1,73 @@
 
-from flask import Blueprint, request, redirect, url_for, flash, jsonify, current_app
-from routes import render_template_with_htmx as render_template
+from flask import Blueprint, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context
+from flask import render_template as render_fragment
+from routes import render_template_with_htmx as render_template, conditional_page
 from flask_login import login_required, current_user
-from models import Teacher, TeacherRoutine, Absence, Substitution, SubstitutionTransfer, User
-from forms import TeacherForm, AbsenceForm
+from models import Teacher, Absence, AbsenceRange, Substitution, SubstitutionTransfer, User
+from forms import TeacherForm, AbsenceForm, AbsenceRangeForm, ImportForm, HolidayForm
 from app import db
-from utils import get_current_date, find_substitutes, generate_substitution_plan
+from db_routing import read_only
+from db_pool import pool_stats
+from utils import (get_current_date, find_substitutes, bump_data_versions, cached_substitution_plan,
+                   mark_absence_range, cancel_absence_range, decide_transfers, parse_periods,
+                   dashboard_counts, pending_transfer_rows, history_page, HISTORY_KINDS)
+from reports import serve_report, build_substitution_plan_pdf, build_teacher_week_pdf, build_history_pdf
+from events import publish_plan_change, plan_event_stream
+from importer import run_import, ImportFileError
+from archive import archived_years, academic_year_label, academic_year_bounds, academic_year_of, current_academic_year
+from school_calendar import day_for_date, add_holiday, remove_holiday, holidays_in_year, ROTATION_DAYS
+from capacity import capacity_report
+from workload import record_covers, cover_change, workload_summary, teacher_weeks
+from timetable import (active_routines, save_timetable, teacher_change_dates, class_conflicts,
+                       class_sections, class_timetable)
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 
 admin_routes = Blueprint('admin_routes', __name__)
 
+def _admin_versions(*keys):
+    """DataVersion keys for an admin page, or None for non-admins (no ETag)."""
+    if not current_user.is_authenticated or current_user.role != 'admin':
+        return None
+    return list(keys)
+
+def _plan_date_arg():
+    date_str = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return date_str
+
 @admin_routes.route('/admin/dashboard')
 @login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',), ('date', get_current_date())))
 def dashboard():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
         return redirect(url_for('index'))
         
     today = get_current_date()
-    absent_count = Absence.query.filter_by(date=today).count()
-    teacher_count = Teacher.query.count()
-    substitution_count = Substitution.query.filter_by(date=today).count()
-    transfer_requests = SubstitutionTransfer.query.filter_by(status='pending').count()
+    counts = dashboard_counts(today)
     
     return render_template('admin/dashboard.html', 
-                          absent_count=absent_count, 
-                          teacher_count=teacher_count,
-                          substitution_count=substitution_count,
-                          transfer_requests=transfer_requests,
-                          today=today)
+                          today=today,
+                          **counts)
+
+@admin_routes.route('/admin/fragments/dashboard_counters')
+@login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',), ('date', get_current_date())))
+def dashboard_counters_fragment():
+    if current_user.role != 'admin':
+        return '', 403
+    
+    return render_fragment('admin/partials/_dashboard_counters.html',
+                           **dashboard_counts(get_current_date()))
 
 @admin_routes.route('/admin/teachers')
 @login_required
+@read_only
 def teachers():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
@@ -71,6 +106,7 @@ def add_teacher():
             teacher_id=teacher.id
         )
         db.session.add(user)
+        bump_data_versions(teachers=[teacher.id], roster=True)
         db.session.commit()
         
         flash('Teacher added successfully!', 'success')
@@ -78,6 +114,31 @@ def add_teacher():
     
     return render_template('admin/teacher_edit.html', form=form, teacher=None)
 
+@admin_routes.route('/admin/import', methods=['GET', 'POST'])
+@login_required
+def import_data():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    form = ImportForm()
+    report = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            report = run_import(form.kind.data, upload.stream, upload.filename,
+                                replace=form.replace.data, effective_from=form.effective_from.data,
+                                hash_later=True)
+        except ImportFileError as e:
+            flash(str(e), 'danger')
+        else:
+            current_app.logger.info("Imported %s: %d rows, %d saved, %d errors in %.1fs",
+                                    report.kind, report.rows, report.saved, len(report.errors), report.duration)
+            flash(f'Import finished: {report.saved} row(s) saved, {len(report.errors)} error(s).',
+                  'warning' if report.errors else 'success')
+    
+    return render_template('admin/import.html', form=form, report=report)
+
 @admin_routes.route('/admin/teachers/edit/<int:teacher_id>', methods=['GET', 'POST'])
 @login_required
 def edit_teacher(teacher_id):
@@ -93,6 +154,7 @@ def edit_teacher(teacher_id):
     
     if form.validate_on_submit():
         form.populate_obj(teacher)
+        bump_data_versions(teachers=[teacher.id], roster=True)
         db.session.commit()
         flash('Teacher updated successfully!', 'success')
         return redirect(url_for('admin_routes.teachers'))
@@ -108,32 +170,6 @@ def edit_schedule(teacher_id):
         
     teacher = Teacher.query.get_or_404(teacher_id)
     
-    if request.method == 'POST':
-        # Delete existing schedule
-        TeacherRoutine.query.filter_by(teacher_id=teacher_id).delete()
-        
-        # Parse the submitted routine data
-        routine_data = json.loads(request.form.get('routine_data', '{}'))
-        
-        # Save new schedule entries
-        for day in routine_data:
-            for period_num, period_data in enumerate(routine_data[day], 1):
-                if period_data:  # Skip if empty
-                    routine_entry = TeacherRoutine(
-                        teacher_id=teacher_id,
-                        day=day,
-                        period=period_num,
-                        class_name=period_data.get('class', ''),
-                        section=period_data.get('section', ''),
-                        is_free=(period_data.get('class', '') == 'Free')
-                    )
-                    db.session.add(routine_entry)
-        
-        db.session.commit()
-        flash('Schedule updated successfully!', 'success')
-        return redirect(url_for('admin_routes.teachers'))
-    
-    # Get existing schedule or create empty template
     schedule = {}
     days = ['Day 1', 'Day 2', 'Day 3', 'Day 4', 'Day 5']
     periods = range(1, 9)  # 8 periods
@@ -142,20 +178,69 @@ def edit_schedule(teacher_id):
     for day in days:
         schedule[day] = [None] * 8  # 8 periods
     
-    # Fill in existing data
-    routine_entries = TeacherRoutine.query.filter_by(teacher_id=teacher_id).all()
-    for entry in routine_entries:
-        schedule[entry.day][entry.period-1] = {
-            'class': entry.class_name,
-            'section': entry.section,
-            'is_free': entry.is_free
-        }
+    if request.method == 'POST':
+        try:
+            effective_from = datetime.strptime(request.form.get('effective_from', ''), '%Y-%m-%d').date()
+        except ValueError:
+            effective_from = get_current_date()
+        
+        # Parse the submitted routine data
+        routine_data = json.loads(request.form.get('routine_data', '{}'))
+        
+        # Every slot of the grid: (class, section), or None if left empty
+        changes = {}
+        for day in routine_data:
+            for period_num, period_data in enumerate(routine_data[day], 1):
+                changes[(teacher_id, day, period_num)] = \
+                    (period_data.get('class', ''), period_data.get('section', '')) if period_data else None
+        
+        # A class-section can only have one teacher per period; check the slots being changed
+        current = {(r.day, r.period): (r.class_name, r.section or '')
+                   for r in active_routines(effective_from).filter_by(teacher_id=teacher_id)}
+        booked = {(day, period): value for (_, day, period), value in changes.items()
+                  if value and (value[0], value[1] or '') != current.get((day, period))}
+        conflicts = class_conflicts(teacher_id, booked, effective_from)
+        if not conflicts:
+            changed = save_timetable(changes, effective_from)
+            db.session.commit()
+            flash(f'Schedule updated from {effective_from} ({changed} periods changed).', 'success')
+            return redirect(url_for('admin_routes.teachers'))
+        
+        for day, period, class_name, section, name in conflicts:
+            flash(f'{day} period {period}: Class {class_name}{section} is already taught by {name}.', 'danger')
+        # Show the submitted grid again so it can be corrected
+        as_of = effective_from
+        for day in routine_data:
+            for period_num, period_data in enumerate(routine_data[day], 1):
+                if day in schedule and period_data:
+                    schedule[day][period_num-1] = {
+                        'class': period_data.get('class', ''),
+                        'section': period_data.get('section', ''),
+                        'is_free': period_data.get('class', '') == 'Free'
+                    }
+    else:
+        # Get the schedule in force on ?date= (default today)
+        try:
+            as_of = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            as_of = get_current_date()
+        
+        # Fill in existing data
+        routine_entries = active_routines(as_of).filter_by(teacher_id=teacher_id).all()
+        for entry in routine_entries:
+            schedule[entry.day][entry.period-1] = {
+                'class': entry.class_name,
+                'section': entry.section,
+                'is_free': entry.is_free
+            }
     
     return render_template('admin/teacher_edit.html', 
                           teacher=teacher, 
                           schedule=schedule,
                           days=days,
-                          periods=periods)
+                          periods=periods,
+                          as_of=as_of,
+                          change_dates=teacher_change_dates(teacher_id))
 
 @admin_routes.route('/admin/absence', methods=['GET', 'POST'])
 @login_required
@@ -166,25 +251,34 @@ def mark_absence():
     
     form = AbsenceForm()
     
-    # For debugging
-    if request.method == 'POST':
-        current_app.logger.debug(f"Form data received: {request.form}")
-        current_app.logger.debug(f"Request headers: {request.headers}")
-        selected_teachers = request.form.getlist('selected_teachers')
-        current_app.logger.debug(f"Selected teachers: {selected_teachers}")
-    
     if form.validate_on_submit():
-        # Process the form submission
+        # Process the form submission; the day comes from the school calendar unless overridden
         date = form.date.data
-        day = form.day.data
+        day = form.day.data or day_for_date(date)
         selected_teachers = request.form.getlist('selected_teachers')
         
-        current_app.logger.info(f"Processing absence form. Date: {date}, Day: {day}, Selected teachers: {selected_teachers}")
+        current_app.logger.info("Processing absence form. Date: %s, Day: %s, Selected teachers: %s",
+                                date, day, selected_teachers)
+        
+        # Optional absent periods per teacher ('5-8'); empty means the whole day
+        periods = {}
+        for teacher_id in selected_teachers:
+            try:
+                periods[teacher_id] = parse_periods(request.form.get(f'periods_{teacher_id}', ''))
+            except ValueError:
+                message = f'Invalid periods "{request.form.get(f"periods_{teacher_id}")}". Use e.g. 5-8 or 1,3.'
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return jsonify({'success': False, 'message': message}), 400
+                flash(message, 'danger')
+                return redirect(url_for('admin_routes.mark_absence'))
         
         try:
-            # Mark all teachers as present initially
-            deleted_count = Absence.query.filter_by(date=date).delete()
-            current_app.logger.info(f"Deleted {deleted_count} previous absence records")
+            # Mark all teachers as present initially. Leave days belong to their
+            # AbsenceRange (cancelled with it), so only single-day absences are replaced
+            deleted_count = Absence.query.filter(Absence.date == date, Absence.range_id.is_(None)).delete()
+            current_app.logger.info("Deleted %d previous absence records", deleted_count)
+            on_leave = {teacher_id for (teacher_id,) in db.session.query(Absence.teacher_id).filter(
+                Absence.date == date, Absence.range_id.isnot(None))}
             
             # Mark selected teachers as absent
             added_count = 0
@@ -192,6 +286,8 @@ def mark_absence():
                 try:
                     # Convert to integer since form data comes as strings
                     teacher_id_int = int(teacher_id)
+                    if teacher_id_int in on_leave:
+                        continue  # Already absent through their leave range
                     
                     # Check if teacher exists
                     teacher = Teacher.query.get(teacher_id_int)
@@ -200,25 +296,27 @@ def mark_absence():
                             teacher_id=teacher_id_int,
                             date=date,
                             day=day,
-                            reported_by='admin'
+                            reported_by='admin',
+                            periods=periods.get(teacher_id)
                         )
                         db.session.add(absence)
                         added_count += 1
                     else:
-                        current_app.logger.error(f"Teacher with ID {teacher_id_int} not found")
+                        current_app.logger.error("Teacher with ID %d not found", teacher_id_int)
                 except ValueError:
-                    current_app.logger.error(f"Invalid teacher ID format: {teacher_id}")
+                    current_app.logger.error("Invalid teacher ID format: %r", teacher_id)
                     continue
             
             db.session.commit()
-            current_app.logger.info(f"Added {added_count} new absence records")
+            current_app.logger.info("Added %d new absence records", added_count)
             
             # Generate substitution plan
             try:
                 find_substitutes(date, day)
                 current_app.logger.info("Substitution plan generated successfully")
-            except Exception as e:
-                current_app.logger.error(f"Error generating substitution plan: {str(e)}")
+                publish_plan_change(date)
+            except Exception:
+                current_app.logger.exception("Error generating substitution plan")
                 db.session.rollback()
                 flash('Error generating substitution plan. Please try again.', 'danger')
                 
@@ -239,8 +337,8 @@ def mark_absence():
                     'redirect': url_for('admin_routes.substitution')
                 })
             return redirect(url_for('admin_routes.substitution'))
-        except Exception as e:
-            current_app.logger.error(f"Error processing absence form: {str(e)}")
+        except Exception:
+            current_app.logger.exception("Error processing absence form")
             db.session.rollback()
             flash('An error occurred while processing absences. Please try again.', 'danger')
             
@@ -252,7 +350,7 @@ def mark_absence():
                 }), 500
     elif request.method == 'POST':
         # If form validation failed
-        current_app.logger.error(f"Form validation errors: {form.errors}")
+        current_app.logger.warning("Form validation errors: %s", form.errors)
         flash('Please correct the errors in the form.', 'danger')
         
         # Handle AJAX request
@@ -268,10 +366,59 @@ def mark_absence():
         form.date.data = datetime.now().date()
     
     teachers = Teacher.query.all()
-    return render_template('admin/absence.html', form=form, teachers=teachers)
+    range_form = AbsenceRangeForm()
+    range_form.teacher_id.choices = [(t.id, f'{t.name} ({t.teacher_id})') for t in teachers]
+    ranges = AbsenceRange.query.filter(AbsenceRange.end_date >= get_current_date()) \
+        .order_by(AbsenceRange.start_date).all()
+    return render_template('admin/absence.html', form=form, teachers=teachers,
+                          range_form=range_form, ranges=ranges)
+
+@admin_routes.route('/admin/absence/range', methods=['POST'])
+@login_required
+def mark_absence_range_view():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    form = AbsenceRangeForm()
+    form.teacher_id.choices = [(t.id, t.name) for t in Teacher.query.all()]
+    if not form.validate_on_submit():
+        for errors in form.errors.values():
+            for error in errors:
+                flash(error, 'danger')
+        return redirect(url_for('admin_routes.mark_absence'))
+    
+    try:
+        absence_range, dates = mark_absence_range(form.teacher_id.data, form.start_date.data, form.end_date.data,
+                                                  reason=form.reason.data or None)
+    except Exception:
+        current_app.logger.exception("Error recording leave for teacher %d", form.teacher_id.data)
+        db.session.rollback()
+        flash('An error occurred while recording the leave. Please try again.', 'danger')
+        return redirect(url_for('admin_routes.mark_absence'))
+    
+    for date in dates:
+        publish_plan_change(date)
+    flash(f'Leave recorded for {absence_range.teacher.name}: {len(dates)} school day(s) planned.', 'success')
+    return redirect(url_for('admin_routes.mark_absence'))
+
+@admin_routes.route('/admin/absence/range/<int:range_id>/cancel', methods=['POST'])
+@login_required
+def cancel_absence_range_view(range_id):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    dates = cancel_absence_range(range_id)
+    for date in dates:
+        publish_plan_change(date)
+    flash(f'Leave cancelled; {len(dates)} day(s) replanned.', 'success')
+    return redirect(url_for('admin_routes.mark_absence'))
 
 @admin_routes.route('/admin/substitution')
 @login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('date', _plan_date_arg()), ('roster',)))
 def substitution():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
@@ -280,24 +427,70 @@ def substitution():
     date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
     
     # Get substitution plan for the date
-    plan = generate_substitution_plan(date)
+    plan = cached_substitution_plan(date)
     
     return render_template('admin/substitution.html', 
                           date=date,
                           plan=plan)
 
+@admin_routes.route('/admin/fragments/substitution/period/<int:period>')
+@login_required
+@read_only
+@conditional_page(lambda period: _admin_versions(('date', _plan_date_arg()), ('roster',)))
+def period_fragment(period):
+    if current_user.role != 'admin':
+        return '', 403
+    
+    date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+    plan = cached_substitution_plan(date)
+    if period not in plan:
+        return '', 404
+    
+    return render_fragment('admin/partials/_period_covers.html',
+                           date=date,
+                           period=period,
+                           subs=plan[period])
+
+@admin_routes.route('/admin/substitution/stream')
+@login_required
+def substitution_stream():
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    date_obj = _plan_date_arg()
+    if isinstance(date_obj, str):
+        return jsonify({'success': False, 'message': 'Invalid date'}), 400
+    
+    response = Response(stream_with_context(plan_event_stream(date_obj)),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Disable proxy buffering (nginx)
+    return response
+
 @admin_routes.route('/admin/transfer_requests')
 @login_required
+@read_only
 def transfer_requests():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
         return redirect(url_for('index'))
     
     # Get pending transfer requests
-    transfers = SubstitutionTransfer.query.filter_by(status='pending').all()
+    transfers = pending_transfer_rows()
     
     return render_template('admin/transfers.html', transfers=transfers)
 
+@admin_routes.route('/admin/fragments/pending_transfers')
+@login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',)))
+def pending_transfers_fragment():
+    if current_user.role != 'admin':
+        return '', 403
+    
+    return render_fragment('admin/partials/_pending_transfers.html',
+                           transfers=pending_transfer_rows())
+
 @admin_routes.route('/admin/approve_transfer/<int:transfer_id>', methods=['POST'])
 @login_required
 def approve_transfer(transfer_id):
@@ -305,16 +498,12 @@ def approve_transfer(transfer_id):
         return jsonify({'success': False, 'message': 'Access denied'})
     
     transfer = SubstitutionTransfer.query.get_or_404(transfer_id)
-    substitution = Substitution.query.get_or_404(transfer.substitution_id)
-    
-    # Update the substitution assignment
-    substitution.teacher_id = transfer.new_teacher_id
-    
-    # Mark transfer as approved
-    transfer.status = 'approved'
-    transfer.action_date = datetime.now()
+    Substitution.query.get_or_404(transfer.substitution_id)
     
+    # Moves the cover to the new teacher (a transfer already decided is left alone)
+    decide_transfers({transfer.id: 'approved'})
     db.session.commit()
+    publish_plan_change(transfer.substitution.date)
     
     return jsonify({'success': True})
 
@@ -325,10 +514,9 @@ def reject_transfer(transfer_id):
         return jsonify({'success': False, 'message': 'Access denied'})
     
     transfer = SubstitutionTransfer.query.get_or_404(transfer_id)
-    transfer.status = 'rejected'
-    transfer.action_date = datetime.now()
-    
+    decide_transfers({transfer.id: 'rejected'})
     db.session.commit()
+    publish_plan_change(transfer.substitution.date)
     
     return jsonify({'success': True})
 
@@ -346,34 +534,297 @@ def delete_teacher(teacher_id):
         if user:
             db.session.delete(user)
         
+        # Their substitutions go with them; take them off the other teachers' counters
+        record_covers(cover_change(sub, -1) for sub in teacher.substitutions + teacher.original_substitutions)
+        
         # Teacher model has cascade relationships configured, 
         # so this should delete routines, absences, and substitutions
         db.session.delete(teacher)
+        bump_data_versions(teachers=[teacher_id], roster=True)
         db.session.commit()
         
         return jsonify({'success': True})
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Error deleting teacher: {str(e)}")
+        current_app.logger.exception("Error deleting teacher %d", teacher_id)
         return jsonify({'success': False, 'message': str(e)})
 
 @admin_routes.route('/admin/history')
 @login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',)))
 def history():
     if current_user.role != 'admin':
         flash('Access denied.', 'danger')
         return redirect(url_for('index'))
     
-    # Get absences history
-    absences = Absence.query.order_by(Absence.date.desc()).all()
-    
-    # Get substitution history
-    substitutions = Substitution.query.order_by(Substitution.date.desc()).all()
+    # ?year= shows an archived academic year; the default is the live tables
+    years = archived_years()
+    year = request.args.get('year', type=int)
+    if year not in years:
+        year = None
     
-    # Get transfer history
-    transfers = SubstitutionTransfer.query.order_by(SubstitutionTransfer.request_date.desc()).all()
+    # First page of each history table; further pages load via history_fragment
+    absences, absences_has_next = history_page('absences', year=year)
+    substitutions, substitutions_has_next = history_page('substitutions', year=year)
+    transfers, transfers_has_next = history_page('transfers', year=year)
     
     return render_template('admin/history.html', 
+                          year=year,
+                          archived_years=[(y, academic_year_label(y)) for y in years],
                           absences=absences,
+                          absences_has_next=absences_has_next,
                           substitutions=substitutions,
-                          transfers=transfers)
+                          substitutions_has_next=substitutions_has_next,
+                          transfers=transfers,
+                          transfers_has_next=transfers_has_next)
+
+@admin_routes.route('/admin/fragments/history/<kind>')
+@login_required
+@read_only
+@conditional_page(lambda kind: _admin_versions(('all',)))
+def history_fragment(kind):
+    if current_user.role != 'admin':
+        return '', 403
+    if kind not in HISTORY_KINDS:
+        return '', 404
+    
+    page = max(request.args.get('page', 1, type=int), 1)
+    year = request.args.get('year', type=int)
+    rows, has_next = history_page(kind, page, year=year)
+    
+    return render_fragment('admin/partials/_history_rows.html',
+                           kind=kind,
+                           year=year,
+                           rows=rows,
+                           page=page,
+                           has_next=has_next)
+
+@admin_routes.route('/admin/reports/substitution.pdf')
+@login_required
+@read_only
+def substitution_report():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    date_str = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+    try:
+        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date.', 'danger')
+        return redirect(url_for('admin_routes.substitution'))
+    
+    return serve_report('plan', date_obj,
+                        [('date', date_obj), ('roster',)],
+                        lambda as_of: build_substitution_plan_pdf(date_obj, as_of),
+                        f'substitution_plan_{date_obj}.pdf')
+
+@admin_routes.route('/admin/reports/schedule/<int:teacher_id>.pdf')
+@login_required
+@read_only
+def schedule_report(teacher_id):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    teacher = Teacher.query.get_or_404(teacher_id)
+    today = get_current_date()
+    week_start = today - timedelta(days=today.weekday())
+    
+    return serve_report('week', f'{teacher.id}:{week_start}',
+                        [('teacher', teacher.id), ('roster',)],
+                        lambda as_of: build_teacher_week_pdf(teacher, week_start, as_of),
+                        f"schedule_{teacher.name.replace(' ', '_')}_{week_start}.pdf")
+
+@admin_routes.route('/admin/reports/history/<kind>.pdf')
+@login_required
+@read_only
+def history_report(kind):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    if kind not in HISTORY_KINDS:
+        flash('Unknown history export.', 'danger')
+        return redirect(url_for('admin_routes.history'))
+    
+    year = request.args.get('year', type=int)
+    
+    return serve_report('history', f'{kind}:{year or "live"}',
+                        [('all',)],
+                        lambda as_of: build_history_pdf(kind, year, as_of),
+                        f'{kind}_history_{academic_year_label(year)}.pdf' if year else f'{kind}_history.pdf')
+
+@admin_routes.route('/admin/calendar', methods=['GET', 'POST'])
+@login_required
+def school_calendar():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    form = HolidayForm()
+    if form.validate_on_submit():
+        add_holiday(form.date.data, form.name.data.strip())
+        flash(f'Holiday on {form.date.data} saved.', 'success')
+        return redirect(url_for('admin_routes.school_calendar', year=academic_year_of(form.date.data)))
+    
+    year = request.args.get('year', current_academic_year(), type=int)
+    today = get_current_date()
+    upcoming = [(today + timedelta(days=offset), day_for_date(today + timedelta(days=offset)))
+                for offset in range(14)]
+    
+    return render_template('admin/calendar.html',
+                          form=form,
+                          year=year,
+                          year_label=academic_year_label(year),
+                          holidays=holidays_in_year(year),
+                          upcoming=upcoming)
+
+@admin_routes.route('/admin/calendar/holiday/<date>/delete', methods=['POST'])
+@login_required
+def delete_holiday(date):
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    try:
+        date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Invalid date.', 'danger')
+        return redirect(url_for('admin_routes.school_calendar'))
+    
+    if remove_holiday(date_obj):
+        flash(f'Holiday on {date_obj} removed.', 'success')
+    return redirect(url_for('admin_routes.school_calendar', year=academic_year_of(date_obj)))
+
+def _workload_range():
+    """(start, end) from ?start=&end=, defaulting to the current academic year so far."""
+    today = get_current_date()
+    default_start = academic_year_bounds(current_academic_year())[0]
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else default_start
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+    except ValueError:
+        start, end = default_start, today
+    return start, max(start, end)
+
+@admin_routes.route('/admin/analytics/workload')
+@login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',)))
+def workload():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    start, end = _workload_range()
+    today = get_current_date()
+    presets = [
+        ('This Week', today - timedelta(days=today.weekday())),
+        ('Last 4 Weeks', today - timedelta(days=today.weekday() + 21)),
+        ('Academic Year', academic_year_bounds(current_academic_year())[0]),
+    ]
+    
+    return render_template('admin/workload.html',
+                          rows=workload_summary(start, end),
+                          start=start,
+                          end=end,
+                          today=today,
+                          presets=presets)
+
+@admin_routes.route('/admin/api/workload')
+@login_required
+@read_only
+def workload_api():
+    """Covers given/received per teacher (or week by week for ?teacher=<id>), read from the rollup."""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    start, end = _workload_range()
+    result = {'success': True, 'start': start.isoformat(), 'end': end.isoformat()}
+    teacher_id = request.args.get('teacher', type=int)
+    if teacher_id is not None:
+        result['teacher'] = teacher_id
+        result['weeks'] = [dict(week, week_start=week['week_start'].isoformat())
+                           for week in teacher_weeks(teacher_id, start, end)]
+    else:
+        result['teachers'] = workload_summary(start, end)
+    return jsonify(result)
+
+def _date_arg():
+    """?date= as a date, defaulting to today."""
+    try:
+        return datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return get_current_date()
+
+@admin_routes.route('/admin/analytics/capacity')
+@login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',), ('date', get_current_date())))
+def capacity():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    return render_template('admin/capacity.html', report=capacity_report(_date_arg()))
+
+@admin_routes.route('/admin/api/capacity')
+@login_required
+@read_only
+def capacity_api():
+    """Free teachers, expected absences and shortfalls per rotation day and period."""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    report = capacity_report(_date_arg())
+    return jsonify(dict(report, success=True, date=report['date'].isoformat(), start=report['start'].isoformat()))
+
+def _class_request():
+    """(date, class name, section) from ?date=&class_name=&section= (date defaults to today)."""
+    return _date_arg(), request.args.get('class_name', '').strip(), request.args.get('section', '').strip()
+
+@admin_routes.route('/admin/classes')
+@login_required
+@read_only
+@conditional_page(lambda: _admin_versions(('all',), ('date', get_current_date())))
+def class_view():
+    if current_user.role != 'admin':
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    date_obj, class_name, section = _class_request()
+    sections = class_sections(date_obj)
+    if not class_name and sections:
+        class_name, section = sections[0]
+    
+    return render_template('admin/classes.html',
+                          date=date_obj,
+                          sections=sections,
+                          timetable=class_timetable(date_obj, class_name, section) if class_name else None,
+                          days=list(ROTATION_DAYS))
+
+@admin_routes.route('/admin/api/classes')
+@login_required
+@read_only
+def class_api():
+    """Class-sections timetabled on ?date=, or with ?class_name=&section= that class's timetable and covers."""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    date_obj, class_name, section = _class_request()
+    if not class_name:
+        return jsonify({'success': True, 'date': date_obj.isoformat(),
+                        'classes': [{'class_name': c, 'section': s} for c, s in class_sections(date_obj)]})
+    timetable = class_timetable(date_obj, class_name, section)
+    return jsonify(dict(timetable, success=True, date=date_obj.isoformat()))
+
+@admin_routes.route('/admin/system/db_pools')
+@login_required
+def db_pools():
+    """Connection pool usage and checkout wait metrics for this worker, per bind."""
+    if current_user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    
+    return jsonify({'success': True, 'pools': pool_stats(db)})
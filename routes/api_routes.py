@@ -0,0 +1,375 @@
+"""
+/api/v1: JSON API over teachers, timetable slots, absences, substitutions
+and transfer requests, for integrations such as the school MIS.
+
+Requests authenticate with `Authorization: Bearer <token>` (api_tokens.py);
+no session cookie is read or set and CSRF does not apply.
+
+Reading:  GET /api/v1/<resource>[/<id>]
+    ?fields=id,name       sparse fieldset (only these columns are selected; id is always included)
+    ?limit=100            page size (at most MAX_PAGE_SIZE)
+    ?cursor=...           next_cursor of the previous page (keyset on id, stable under inserts)
+    plus the resource's filters, e.g. /api/v1/substitutions?from=2026-11-02&to=2026-11-06
+
+Writing (a JSON list of objects; valid items are saved and the others
+reported by index, like the bulk import):
+    POST  /api/v1/teachers       create or update by teacher_id (the school's code)
+    POST  /api/v1/routines       set (teacher_id, day, period) slots from ?effective_from= (default today)
+    POST  /api/v1/absences       create or update by (teacher_id, date), then replan those dates
+    PATCH /api/v1/transfers      approve or reject pending requests: [{"id": 7, "status": "approved"}]
+"""
+import base64
+from collections import namedtuple
+from datetime import date, datetime
+
+from flask import Blueprint, current_app, g, jsonify, request
+from sqlalchemy import and_
+
+from api_tokens import token_user
+from app import db
+from db_routing import read_only
+from models import Absence, Substitution, SubstitutionTransfer, Teacher, TeacherRoutine
+from school_calendar import ROTATION_DAYS, day_for_date
+from utils import PERIOD_COUNT, decide_transfers, get_current_date, parse_periods, record_absences
+
+api_routes = Blueprint('api_routes', __name__, url_prefix='/api/v1')
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BULK_ITEMS = 5000
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ApiError(f'Invalid date {value!r}; use YYYY-MM-DD')
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(f'Invalid number {value!r}')
+
+
+# fields: the columns a client may select; filters: query parameter -> SQL condition
+Resource = namedtuple('Resource', 'model fields filters')
+
+RESOURCES = {
+    'teachers': Resource(Teacher, ('id', 'teacher_id', 'name', 'email', 'phone', 'created_at'), {
+        'teacher_id': lambda v: Teacher.teacher_id == v,
+    }),
+    'routines': Resource(TeacherRoutine, ('id', 'teacher_id', 'day', 'period', 'class_name', 'section',
+                                          'is_free', 'valid_from', 'valid_to'), {
+        'teacher_id': lambda v: TeacherRoutine.teacher_id == _int(v),
+        'day': lambda v: TeacherRoutine.day == v,
+        'class_name': lambda v: TeacherRoutine.class_name == v,
+        'section': lambda v: TeacherRoutine.section == v,
+        'as_of': lambda v: and_(TeacherRoutine.valid_from <= _date(v), TeacherRoutine.valid_to > _date(v)),
+    }),
+    'absences': Resource(Absence, ('id', 'teacher_id', 'date', 'day', 'periods', 'reported_by',
+                                   'range_id', 'created_at'), {
+        'teacher_id': lambda v: Absence.teacher_id == _int(v),
+        'date': lambda v: Absence.date == _date(v),
+        'from': lambda v: Absence.date >= _date(v),
+        'to': lambda v: Absence.date <= _date(v),
+    }),
+    'substitutions': Resource(Substitution, ('id', 'original_teacher_id', 'teacher_id', 'date', 'day',
+                                             'period', 'class_name', 'section', 'created_at'), {
+        'teacher_id': lambda v: Substitution.teacher_id == _int(v),
+        'original_teacher_id': lambda v: Substitution.original_teacher_id == _int(v),
+        'date': lambda v: Substitution.date == _date(v),
+        'from': lambda v: Substitution.date >= _date(v),
+        'to': lambda v: Substitution.date <= _date(v),
+    }),
+    'transfers': Resource(SubstitutionTransfer, ('id', 'substitution_id', 'original_teacher_id',
+                                                 'new_teacher_id', 'reason', 'request_date', 'action_date',
+                                                 'status', 'transfer_all'), {
+        'status': lambda v: SubstitutionTransfer.status == v,
+        'substitution_id': lambda v: SubstitutionTransfer.substitution_id == _int(v),
+        'original_teacher_id': lambda v: SubstitutionTransfer.original_teacher_id == _int(v),
+        'new_teacher_id': lambda v: SubstitutionTransfer.new_teacher_id == _int(v),
+    }),
+}
+
+
+@api_routes.before_request
+def authenticate():
+    """Bearer token auth; the session is never touched."""
+    g.stateless = True
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    user = token_user(token.strip()) if scheme.lower() == 'bearer' else None
+    if user is None:
+        response = jsonify({'success': False, 'message': 'Missing or invalid API token'})
+        response.headers['WWW-Authenticate'] = 'Bearer'
+        return response, 401
+    if user.role != 'admin':
+        return jsonify({'success': False, 'message': 'Access denied'}), 403
+    g.api_user = user
+
+
+@api_routes.errorhandler(ApiError)
+def api_error(error):
+    return jsonify({'success': False, 'message': error.message}), error.status
+
+
+def _resource(name):
+    if name not in RESOURCES:
+        raise ApiError(f'Unknown resource {name!r}', 404)
+    return RESOURCES[name]
+
+
+def _fields(resource):
+    """Requested ?fields=, validated, with id first."""
+    if not request.args.get('fields'):
+        return resource.fields
+    fields = [f.strip() for f in request.args['fields'].split(',') if f.strip()]
+    unknown = [f for f in fields if f not in resource.fields]
+    if unknown:
+        raise ApiError(f'Unknown field(s): {", ".join(unknown)}')
+    return ('id',) + tuple(f for f in dict.fromkeys(fields) if f != 'id')
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode())
+    except ValueError:
+        raise ApiError('Invalid cursor')
+
+
+@api_routes.route('/<name>', methods=['GET'])
+@read_only
+def list_resource(name):
+    resource = _resource(name)
+    model = resource.model
+    fields = _fields(resource)
+    limit = min(max(request.args.get('limit', PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+
+    query = db.session.query(*[getattr(model, f) for f in fields]).order_by(model.id)
+    for param, condition in resource.filters.items():
+        if param in request.args:
+            query = query.filter(condition(request.args[param]))
+    if request.args.get('cursor'):
+        query = query.filter(model.id > _decode_cursor(request.args['cursor']))
+
+    rows = query.limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify({
+        'success': True,
+        'data': [{f: _value(v) for f, v in zip(fields, row)} for row in rows],
+        'next_cursor': _encode_cursor(rows[-1][0]) if more else None,
+    })
+
+
+@api_routes.route('/<name>/<int:item_id>', methods=['GET'])
+@read_only
+def get_resource(name, item_id):
+    resource = _resource(name)
+    fields = _fields(resource)
+    row = db.session.query(*[getattr(resource.model, f) for f in fields]) \
+        .filter(resource.model.id == item_id).first()
+    if row is None:
+        raise ApiError(f'No {name} item {item_id}', 404)
+    return jsonify({'success': True, 'data': {f: _value(v) for f, v in zip(fields, row)}})
+
+
+# ---------------------------------------------------------------------------
+# Bulk writes: each takes the request's items and returns (extra result fields,
+# [(index, message)] for the items that were not saved)
+# ---------------------------------------------------------------------------
+
+def _save_teachers(items):
+    from importer import ImportReport, import_teachers
+
+    records = [(index, {key: str(value).strip() for key, value in item.items() if value is not None})
+               for index, item in enumerate(items)]
+    report = import_teachers(records, ImportReport('teachers'), hash_later=True)
+    return {'saved': report.saved, 'created': report.created, 'accounts': report.accounts}, report.errors
+
+
+def _is_id(value):
+    """True for a JSON integer (not a boolean, which Python treats as one)."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _known_teachers(items):
+    """The teacher ids of `items` that exist."""
+    teacher_ids = {item.get('teacher_id') for item in items if _is_id(item.get('teacher_id'))}
+    return {t for (t,) in db.session.query(Teacher.id).filter(Teacher.id.in_(teacher_ids))}
+
+
+def _save_routines(items):
+    from timetable import active_routines, class_conflicts, save_timetable
+
+    effective_from = _date(request.args['effective_from']) if request.args.get('effective_from') \
+        else get_current_date()
+    known = _known_teachers(items)
+
+    changes, indexes, errors = {}, {}, []
+    for index, item in enumerate(items):
+        slot = (item.get('teacher_id'), item.get('day'), item.get('period'))
+        class_name, section = str(item.get('class_name') or ''), str(item.get('section') or '')
+        problems = []
+        if not _is_id(slot[0]) or slot[0] not in known:
+            problems.append(f'unknown teacher_id {slot[0]}')
+        if slot[1] not in ROTATION_DAYS:
+            problems.append(f'day must be one of {", ".join(ROTATION_DAYS)}')
+        if not isinstance(slot[2], int) or not 1 <= slot[2] <= PERIOD_COUNT:
+            problems.append(f'period must be a number from 1 to {PERIOD_COUNT}')
+        if not 1 <= len(class_name) <= 20:
+            problems.append('class_name must be 1-20 characters')
+        if len(section) > 10:
+            problems.append('section must be at most 10 characters')
+        if not problems and slot in changes:
+            problems.append(f'duplicate slot {slot[1]} period {slot[2]} for teacher {slot[0]}')
+        if problems:
+            errors.append((index, '; '.join(problems)))
+        else:
+            changes[slot] = (class_name, section)
+            indexes[slot] = index
+
+    # As in edit_schedule, a class-section has one teacher per slot: check newly
+    # booked slots against other teachers' timetables and against each other
+    current = {(r.teacher_id, r.day, r.period): (r.class_name, r.section or '') for r in
+               active_routines(effective_from).filter(TeacherRoutine.teacher_id.in_({t for t, _, _ in changes}))}
+    booked, claimed = {}, {}
+    for (teacher_id, day, period), (class_name, section) in list(changes.items()):
+        if class_name == 'Free' or (class_name, section) == current.get((teacher_id, day, period)):
+            continue
+        other = claimed.setdefault((day, period, class_name, section), teacher_id)
+        if other != teacher_id:
+            errors.append((indexes[(teacher_id, day, period)],
+                           f'{day} period {period}: Class {class_name}{section} is also booked for teacher {other} '
+                           f'in this request'))
+            del changes[(teacher_id, day, period)]
+            continue
+        booked.setdefault(teacher_id, {})[(day, period)] = (class_name, section)
+    for teacher_id, slots in booked.items():
+        taught_by = {}
+        for day, period, class_name, section, name in class_conflicts(teacher_id, slots, effective_from):
+            taught_by.setdefault((day, period, class_name, section), []).append(name)
+        for (day, period, class_name, section), names in taught_by.items():
+            errors.append((indexes[(teacher_id, day, period)],
+                           f'{day} period {period}: Class {class_name}{section} is already taught by {", ".join(names)}'))
+            del changes[(teacher_id, day, period)]
+    errors.sort()
+
+    changed = save_timetable(changes, effective_from)
+    db.session.commit()
+    return {'saved': len(changes), 'changed': changed, 'effective_from': effective_from.isoformat()}, errors
+
+
+def _save_absences(items):
+    from events import publish_plan_change
+
+    known = _known_teachers(items)
+
+    entries, seen, errors = [], set(), []
+    for index, item in enumerate(items):
+        try:
+            if not _is_id(item.get('teacher_id')) or item['teacher_id'] not in known:
+                raise ApiError(f'unknown teacher_id {item.get("teacher_id")}')
+            absence_date = _date(item.get('date'))
+            if day_for_date(absence_date) is None:
+                raise ApiError(f'{absence_date} is not a school day')
+            periods = item.get('periods')
+            if isinstance(periods, str):
+                periods = parse_periods(periods)
+            elif periods is not None and (not isinstance(periods, int) or not 0 < periods < 1 << PERIOD_COUNT):
+                raise ApiError('periods must be a bitmask or text like "5-8"')
+            if (item['teacher_id'], absence_date) in seen:
+                raise ApiError(f'duplicate absence of teacher {item["teacher_id"]} on {absence_date}')
+        except (ApiError, ValueError) as e:
+            errors.append((index, str(e)))
+            continue
+        seen.add((item['teacher_id'], absence_date))
+        entries.append((item['teacher_id'], absence_date, periods))
+
+    dates = record_absences(entries)
+    for planned in dates:
+        publish_plan_change(planned)
+    return {'saved': len(entries), 'dates': [d.isoformat() for d in dates]}, errors
+
+
+def _decide_transfers(items):
+    from events import publish_plan_change
+
+    ids = {item.get('id') for item in items if _is_id(item.get('id'))}
+    pending = dict(db.session.query(SubstitutionTransfer.id, SubstitutionTransfer.substitution_id)
+                   .filter(SubstitutionTransfer.id.in_(ids), SubstitutionTransfer.status == 'pending'))
+
+    decisions, approved_substitutions, errors = {}, set(), []
+    for index, item in enumerate(items):
+        transfer_id, status = item.get('id'), item.get('status')
+        if not _is_id(transfer_id):
+            errors.append((index, 'id must be an integer'))
+        elif status not in ('approved', 'rejected'):
+            errors.append((index, 'status must be "approved" or "rejected"'))
+        elif transfer_id not in pending:
+            errors.append((index, f'no pending transfer {transfer_id}'))
+        elif transfer_id in decisions:
+            errors.append((index, f'duplicate transfer {transfer_id}'))
+        elif status == 'approved' and pending[transfer_id] in approved_substitutions:
+            errors.append((index, f'another approved transfer already moves substitution {pending[transfer_id]}'))
+        else:
+            decisions[transfer_id] = status
+            if status == 'approved':
+                approved_substitutions.add(pending[transfer_id])
+
+    transfers = decide_transfers(decisions)
+    dates = {t.substitution.date for t in transfers}
+    db.session.commit()
+    for changed in dates:
+        publish_plan_change(changed)
+    return {'saved': len(transfers)}, errors
+
+
+WRITERS = {
+    ('teachers', 'POST'): _save_teachers,
+    ('routines', 'POST'): _save_routines,
+    ('absences', 'POST'): _save_absences,
+    ('transfers', 'PATCH'): _decide_transfers,
+}
+
+
+@api_routes.route('/<name>', methods=['POST', 'PATCH'])
+def write_resource(name):
+    _resource(name)
+    writer = WRITERS.get((name, request.method))
+    if writer is None:
+        raise ApiError(f'{request.method} is not supported on {name}', 405)
+    items = request.get_json(silent=True)
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ApiError('Expected a JSON list of objects')
+    if len(items) > MAX_BULK_ITEMS:
+        raise ApiError(f'At most {MAX_BULK_ITEMS} items per request', 413)
+
+    try:
+        result, errors = writer(items)
+    except ApiError:
+        db.session.rollback()
+        raise
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception('Error in bulk %s of %s', request.method, name)
+        return jsonify({'success': False, 'message': 'An error occurred; items before it may already have been saved.'}), 500
+    return jsonify(dict(result, success=not errors,
+                        errors=[{'index': index, 'message': message} for index, message in errors])), \
+        200 if not errors else 422
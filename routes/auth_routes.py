@@ -1,5 +1,5 @@
 
-from flask import Blueprint, redirect, url_for, request, flash
+from flask import Blueprint, redirect, url_for, request, flash, session, current_app
 from routes import render_template_with_htmx as render_template
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User, Teacher, db
@@ -130,5 +130,7 @@ def create_admin():
 @login_required
 def logout():
     logout_user()
+    # The next login gets a fresh CSRF token (and page ETags, see page_etag)
+    session.pop(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token'), None)
     flash('You have been logged out', 'info')
     return redirect(url_for('auth_routes.login'))
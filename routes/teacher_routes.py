@@ -1,38 +1,50 @@
 
-from flask import Blueprint, request, redirect, url_for, flash, jsonify
-from routes import render_template_with_htmx as render_template
+from flask import Blueprint, request, redirect, url_for, flash, jsonify, abort
+from routes import render_template_with_htmx as render_template, conditional_page
 from flask_login import login_required, current_user
-from models import Teacher, TeacherRoutine, Absence, Substitution, SubstitutionTransfer
+from models import Teacher, Absence, Substitution, SubstitutionTransfer
 from app import db
-from utils import get_current_date, get_day_from_date
-from datetime import datetime
+from db_routing import read_only
+from utils import get_current_date, bump_data_versions, free_teachers, parse_periods, format_periods
+from school_calendar import day_for_date, ROTATION_DAYS
+from timetable import routines_on
+from reports import serve_report, build_teacher_week_pdf
+from calendar_feed import feed_token, teacher_for_token, serve_feed
+from events import publish_plan_change
+from datetime import datetime, timedelta
 
 teacher_routes = Blueprint('teacher_routes', __name__)
 
+def _teacher_versions(*keys):
+    """DataVersion keys for the logged-in teacher's page, or None (no ETag)."""
+    if not current_user.is_authenticated or current_user.role != 'teacher' or not current_user.teacher_id:
+        return None
+    return [('teacher', current_user.teacher_id)] + list(keys)
+
 @teacher_routes.route('/teacher/dashboard')
 @login_required
+@read_only
+@conditional_page(lambda: _teacher_versions(('date', get_current_date()), ('roster',)))
 def dashboard():
     if current_user.role != 'teacher' or not current_user.teacher_id:
         flash('Access denied.', 'danger')
         return redirect(url_for('index'))
     
     today = get_current_date()
-    day = get_day_from_date(today)
+    day = day_for_date(today)  # None when there is no school today
     
     # Get teacher information
     teacher = Teacher.query.get(current_user.teacher_id)
     
-    # Check if teacher is absent today
-    is_absent = Absence.query.filter_by(
+    # Check if teacher is absent today (possibly only for some periods)
+    absence = Absence.query.filter_by(
         teacher_id=teacher.id,
         date=today
-    ).first() is not None
+    ).first()
+    is_absent = absence is not None
     
     # Get teacher's schedule for today
-    schedule = TeacherRoutine.query.filter_by(
-        teacher_id=teacher.id,
-        day=day
-    ).order_by(TeacherRoutine.period).all()
+    schedule = routines_on(today, day, teacher.id) if day else []
     
     # Get substitutions assigned to the teacher
     substitutions = Substitution.query.filter_by(
@@ -43,6 +55,7 @@ def dashboard():
     return render_template('teacher/dashboard.html',
                           teacher=teacher,
                           is_absent=is_absent,
+                          absent_periods=format_periods(absence.periods) if absence else None,
                           schedule=schedule,
                           substitutions=substitutions,
                           today=today,
@@ -55,7 +68,9 @@ def mark_absent():
         return jsonify({'success': False, 'message': 'Access denied'})
     
     today = get_current_date()
-    day = get_day_from_date(today)
+    day = day_for_date(today)
+    if day is None:
+        return jsonify({'success': False, 'message': 'There is no school today'})
     
     # Check if already marked absent
     existing = Absence.query.filter_by(
@@ -66,12 +81,19 @@ def mark_absent():
     if existing:
         return jsonify({'success': False, 'message': 'Already marked absent for today'})
     
+    # Optional periods ('5-8' when leaving after period 4); the whole day by default
+    try:
+        periods = parse_periods((request.get_json(silent=True) or {}).get('periods') or request.form.get('periods', ''))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    
     # Mark as absent
     absence = Absence(
         teacher_id=current_user.teacher_id,
         date=today,
         day=day,
-        reported_by='self'
+        reported_by='self',
+        periods=periods
     )
     db.session.add(absence)
     
@@ -79,6 +101,7 @@ def mark_absent():
     from utils import find_substitutes
     db.session.commit()
     find_substitutes(today, day)
+    publish_plan_change(today)
     
     return jsonify({'success': True, 'message': 'Successfully marked as absent'})
 
@@ -116,13 +139,16 @@ def request_transfer(substitution_id):
             transfer_all=transfer_all
         )
         db.session.add(transfer)
+        bump_data_versions(dates=[substitution.date], teachers=[current_user.teacher_id])
         db.session.commit()
+        publish_plan_change(substitution.date)
         
         flash('Transfer request submitted successfully!', 'success')
         return redirect(url_for('teacher_routes.dashboard'))
     
-    # Get list of available teachers
-    teachers = Teacher.query.filter(Teacher.id != current_user.teacher_id).all()
+    # Teachers free in this period (respecting partial absences)
+    teachers = [t for t in free_teachers(substitution.date, substitution.day, substitution.period)
+                if t.id != current_user.teacher_id]
     
     return render_template('teacher/transfer.html',
                           substitution=substitution,
@@ -130,6 +156,8 @@ def request_transfer(substitution_id):
 
 @teacher_routes.route('/teacher/schedule')
 @login_required
+@read_only
+@conditional_page(lambda: _teacher_versions(('date', get_current_date())))
 def view_schedule():
     if current_user.role != 'teacher' or not current_user.teacher_id:
         flash('Access denied.', 'danger')
@@ -137,17 +165,44 @@ def view_schedule():
     
     teacher = Teacher.query.get(current_user.teacher_id)
     
-    # Get full weekly schedule
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    # Get the timetable in force today, one column per rotation day
+    days = list(ROTATION_DAYS)
     schedule = {}
+    today = get_current_date()
     
     for day in days:
-        schedule[day] = TeacherRoutine.query.filter_by(
-            teacher_id=teacher.id,
-            day=day
-        ).order_by(TeacherRoutine.period).all()
+        schedule[day] = routines_on(today, day, teacher.id)
     
     return render_template('teacher/schedule.html',
                           teacher=teacher,
                           schedule=schedule,
-                          days=days)
+                          days=days,
+                          feed_url=url_for('teacher_routes.calendar_feed', token=feed_token(teacher.id),
+                                           _external=True))
+
+@teacher_routes.route('/teacher/reports/schedule.pdf')
+@login_required
+@read_only
+def schedule_report():
+    if current_user.role != 'teacher' or not current_user.teacher_id:
+        flash('Access denied.', 'danger')
+        return redirect(url_for('index'))
+    
+    teacher = Teacher.query.get_or_404(current_user.teacher_id)
+    today = get_current_date()
+    week_start = today - timedelta(days=today.weekday())
+    
+    return serve_report('week', f'{teacher.id}:{week_start}',
+                        [('teacher', teacher.id), ('roster',)],
+                        lambda as_of: build_teacher_week_pdf(teacher, week_start, as_of),
+                        f"schedule_{teacher.name.replace(' ', '_')}_{week_start}.pdf")
+
+@teacher_routes.route('/teacher/calendar/<token>.ics')
+@read_only
+def calendar_feed(token):
+    """ICS feed of a teacher's timetable and covers; the signed token stands in for a login."""
+    teacher_id = teacher_for_token(token)
+    response = serve_feed(teacher_id) if teacher_id is not None else None
+    if response is None:
+        abort(404)
+    return response
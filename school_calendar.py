@@ -0,0 +1,234 @@
+"""
+School calendar: which dates have classes and which rotation day they follow.
+
+School days are the SCHOOL_WEEKDAYS that are not a SchoolHoliday. Each school
+day follows one of the ROTATION_DAYS timetables:
+
+* CALENDAR_ROTATION = 'weekday'  Monday is Day 1, Tuesday Day 2, ... (a
+  holiday skips that day's timetable)
+* CALENDAR_ROTATION = 'cycle'    the rotation advances one step per school
+  day from Day 1 on the first school day of the academic year, so it drifts
+  across weeks after a holiday
+
+Each academic year is precomputed into the CalendarDay table (`flask calendar
+build`, and automatically when holidays change), and held in-process as a
+{date: day} dict per year. The dicts are checked against the 'calendar'
+DataVersion once per request (outside requests, at most every
+VERSION_CHECK_SECONDS), so day_for_date() is a dictionary lookup for the
+planner, dashboards, forms and CLI commands alike.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, g, has_app_context, has_request_context
+
+from app import db
+from archive import academic_year_of, academic_year_bounds, academic_year_label, current_academic_year
+from utils import bump_data_versions, get_data_versions
+
+ROTATION_DAYS = ('Day 1', 'Day 2', 'Day 3', 'Day 4', 'Day 5')
+
+# How long CLI commands and workers (no request) reuse the calendar version
+VERSION_CHECK_SECONDS = 5
+
+# academic year -> (calendar version, {date: rotation day or None})
+_years = {}
+_years_lock = threading.Lock()
+
+
+def check_calendar_config(config):
+    """Raise ValueError for a SCHOOL_WEEKDAYS / CALENDAR_ROTATION combination that drops school days."""
+    if config['CALENDAR_ROTATION'] not in ('weekday', 'cycle'):
+        raise ValueError(f"CALENDAR_ROTATION must be 'weekday' or 'cycle', not {config['CALENDAR_ROTATION']!r}")
+    weekdays = config['SCHOOL_WEEKDAYS']
+    if any(not 0 <= d <= 6 for d in weekdays):
+        raise ValueError('SCHOOL_WEEKDAYS must be weekday numbers 0 (Monday) to 6 (Sunday)')
+    if config['CALENDAR_ROTATION'] == 'weekday' and any(d >= len(ROTATION_DAYS) for d in weekdays):
+        raise ValueError(f'With CALENDAR_ROTATION=weekday only weekdays 0-{len(ROTATION_DAYS) - 1} have a '
+                         f'timetable; use CALENDAR_ROTATION=cycle to teach on other days')
+
+
+def _compute_year(year):
+    """[(date, day or None, holiday name or None)] for every date of an academic year."""
+    from models import SchoolHoliday
+
+    start, end = academic_year_bounds(year)
+    holidays = dict(db.session.query(SchoolHoliday.date, SchoolHoliday.name)
+                    .filter(SchoolHoliday.date >= start, SchoolHoliday.date < end).all())
+    weekdays = set(current_app.config['SCHOOL_WEEKDAYS'])
+    cycle = current_app.config['CALENDAR_ROTATION'] == 'cycle'
+
+    rows, step, day = [], 0, start
+    while day < end:
+        rotation = None
+        if day.weekday() in weekdays and day not in holidays:
+            if cycle:
+                rotation = ROTATION_DAYS[step % len(ROTATION_DAYS)]
+                step += 1
+            else:
+                rotation = ROTATION_DAYS[day.weekday()]  # check_calendar_config() keeps this in range
+        rows.append((day, rotation, holidays.get(day)))
+        day += timedelta(days=1)
+    return rows
+
+
+def build_calendar(year):
+    """Recompute the CalendarDay rows of an academic year. The caller commits."""
+    from models import CalendarDay
+
+    rows = _compute_year(year)
+    CalendarDay.query.filter_by(academic_year=year).delete()
+    db.session.execute(CalendarDay.__table__.insert(), [
+        {'date': day, 'academic_year': year, 'day': rotation, 'holiday': holiday}
+        for day, rotation, holiday in rows
+    ])
+    # Dashboards and plans are keyed on the roster version; a new calendar changes them too
+    bump_data_versions(roster=True, calendar=True)
+    if has_app_context():
+        g.pop('calendar_version', None)
+    return len(rows)
+
+
+def _calendar_version():
+    """
+    The 'calendar' DataVersion, read once per request. Without a request
+    (CLI commands, workers) it is kept on the app context for up to
+    VERSION_CHECK_SECONDS, so long-running loops still see holiday changes.
+    """
+    now = time.monotonic()
+    cached = g.get('calendar_version')
+    if cached is None or (not has_request_context() and now - cached[1] > VERSION_CHECK_SECONDS):
+        cached = g.calendar_version = (get_data_versions(('calendar',))[0], now)
+    return cached[0]
+
+
+def _year_table(year):
+    """{date: rotation day or None} for an academic year, from the in-process cache."""
+    from models import CalendarDay
+
+    version = _calendar_version()
+    cached = _years.get(year)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    rows = db.session.query(CalendarDay.date, CalendarDay.day).filter_by(academic_year=year).all()
+    if not rows:
+        # Not built yet: compute it on the fly (read-only, so this also works on a replica)
+        rows = [(day, rotation) for day, rotation, _ in _compute_year(year)]
+    table = dict(rows)
+    with _years_lock:
+        _years[year] = (version, table)
+    return table
+
+
+def day_for_date(date_obj):
+    """Rotation day ('Day 1'..'Day 5') of a date, or None if there is no school."""
+    return _year_table(academic_year_of(date_obj)).get(date_obj)
+
+
+def is_school_day(date_obj):
+    """True if `date_obj` has classes."""
+    return day_for_date(date_obj) is not None
+
+
+def school_days(start, end):
+    """[(date, rotation day)] for the school days in [start, end]."""
+    days, day = [], start
+    while day <= end:
+        rotation = day_for_date(day)
+        if rotation is not None:
+            days.append((day, rotation))
+        day += timedelta(days=1)
+    return days
+
+
+def next_school_day(date_obj):
+    """The first school day on or after `date_obj` (None if none within a year)."""
+    for offset in range(366):
+        day = date_obj + timedelta(days=offset)
+        if is_school_day(day):
+            return day
+    return None
+
+
+def holidays_in_year(year):
+    from models import SchoolHoliday
+
+    start, end = academic_year_bounds(year)
+    return SchoolHoliday.query.filter(SchoolHoliday.date >= start, SchoolHoliday.date < end) \
+        .order_by(SchoolHoliday.date).all()
+
+
+def add_holiday(date_obj, name):
+    """Add (or rename) a holiday and rebuild its academic year. Commits."""
+    from models import SchoolHoliday
+
+    holiday = SchoolHoliday.query.filter_by(date=date_obj).first()
+    if holiday is None:
+        holiday = SchoolHoliday(date=date_obj, name=name)
+        db.session.add(holiday)
+    else:
+        holiday.name = name
+    db.session.flush()
+    build_calendar(academic_year_of(date_obj))
+    db.session.commit()
+    return holiday
+
+
+def remove_holiday(date_obj):
+    """Remove a holiday and rebuild its academic year. Commits. Returns False if there was none."""
+    from models import SchoolHoliday
+
+    deleted = SchoolHoliday.query.filter_by(date=date_obj).delete()
+    if not deleted:
+        return False
+    build_calendar(academic_year_of(date_obj))
+    db.session.commit()
+    return True
+
+
+def init_calendar_cli(app):
+    @app.cli.group('calendar')
+    def calendar_cli():
+        """Build the school calendar and manage holidays."""
+
+    @calendar_cli.command('build')
+    @click.argument('year', type=int, required=False)
+    def build_command(year):
+        """Precompute the academic year starting in YEAR (default: current and next)."""
+        years = [year] if year is not None else [current_academic_year(), current_academic_year() + 1]
+        for y in years:
+            count = build_calendar(y)
+            db.session.commit()
+            click.echo(f'{academic_year_label(y)}: {count} dates')
+
+    @calendar_cli.command('holiday')
+    @click.argument('date')
+    @click.argument('name', required=False)
+    @click.option('--remove', is_flag=True, help='Remove the holiday on DATE.')
+    def holiday_command(date, name, remove):
+        """Add a holiday on DATE (YYYY-MM-DD) called NAME, or --remove it."""
+        try:
+            date_obj = datetime.strptime(date, '%Y-%m-%d').date()
+        except ValueError:
+            raise click.BadParameter('Use YYYY-MM-DD', param_hint='DATE')
+        if remove:
+            if not remove_holiday(date_obj):
+                raise click.ClickException(f'No holiday on {date_obj}')
+            click.echo(f'Removed the holiday on {date_obj}.')
+        else:
+            if not name:
+                raise click.UsageError('NAME is required when adding a holiday')
+            add_holiday(date_obj, name)
+            click.echo(f'{date_obj}: {name}')
+
+    @calendar_cli.command('show')
+    @click.option('--days', type=int, default=14, help='Number of dates to show.')
+    def show_command(days):
+        """Show the rotation of the coming dates."""
+        today = datetime.now().date()
+        for offset in range(days):
+            day = today + timedelta(days=offset)
+            click.echo(f'{day} {day:%a}  {day_for_date(day) or "-"}')
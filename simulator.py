@@ -0,0 +1,295 @@
+"""
+Monte Carlo what-if simulation of a term's cover load.
+
+Absence scenarios are drawn from the absence history of the
+CAPACITY_LOOKBACK_DAYS before the term: each teacher is absent on a school
+day with their historical rate, stays absent on the next school day with
+the school-wide rate at which absences ran on, and is absent for one of the
+period masks they were actually absent for. Every simulated day is planned
+with the planner's own cover rules (utils.assign_covers) against the
+timetable in force on that date.
+
+The teachers, timetables and rates are read once into a picklable snapshot;
+the trials run on it without database access, spread over a process pool.
+Trial n always uses seed + n, so results do not depend on --workers.
+
+    flask --app main simulate                              # the next 13 weeks
+    flask --app main simulate --start 2026-11-02 --end 2027-01-29 --trials 1000
+    flask --app main simulate --absent T012 --absent T031  # what if both were on leave?
+"""
+import json
+import multiprocessing
+import random
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import click
+from flask import current_app
+
+from app import db
+from utils import ALL_PERIODS, assign_covers, day_timetable, get_current_date
+
+
+class SimulationError(Exception):
+    pass
+
+
+# Everything a trial needs, as plain picklable data:
+#   teacher_ids   all teachers, in id order
+#   days          [(week index, timetable key)] for each school day of the term
+#   timetables    {timetable key: day_timetable() of that rotation day and version}
+#   rates         {teacher id: share of the history's school days they were absent}
+#   starts        {teacher id: chance of an absence starting on a school day}
+#   carry_over    chance that an absence runs on to the next school day
+#   masks         {teacher id: [absent-period masks seen in the history]}
+#   forced        teachers absent for the whole term
+Snapshot = namedtuple('Snapshot', 'teacher_ids days timetables rates starts carry_over masks forced')
+
+
+def _absence_history(start, teacher_ids):
+    """(rates, starts, carry-over rate, masks) of the lookback window before `start` (see Snapshot)."""
+    from models import Absence
+    from school_calendar import school_days
+
+    lookback = start - timedelta(days=current_app.config['CAPACITY_LOOKBACK_DAYS'])
+    history = [day for day, _ in school_days(lookback, start - timedelta(days=1))]
+    if not history:
+        return {}, {}, 0.0, {}
+
+    absent = defaultdict(set)
+    masks = defaultdict(list)
+    for teacher_id, day, periods in db.session.query(Absence.teacher_id, Absence.date, Absence.periods) \
+            .filter(Absence.date >= lookback, Absence.date < start):
+        absent[teacher_id].add(day)
+        masks[teacher_id].append(periods or ALL_PERIODS)
+
+    school = set(history)
+    rates = {t: len(absent[t] & school) / len(history) for t in teacher_ids if absent[t]}
+
+    # How often an absence day is followed by another one
+    next_day = dict(zip(history, history[1:]))
+    runs = [next_day[day] in days for days in absent.values() for day in days if day in next_day]
+    carry_over = sum(runs) / len(runs) if runs else 0.0
+
+    # Split each teacher's rate into new absences and days carried over, so that
+    # the long-run rate of the simulation matches the history
+    starts = {}
+    for teacher_id, rate in rates.items():
+        if rate >= 1:
+            starts[teacher_id] = 1.0
+        else:
+            starts[teacher_id] = rate * (1 - carry_over) / (1 - rate) if carry_over < 1 else rate
+    return rates, starts, carry_over, {t: masks[t] for t in rates}
+
+
+def build_snapshot(start, end, absent_codes=()):
+    """Read the teachers, the term's timetables and the absence history into a Snapshot."""
+    from models import Teacher
+    from school_calendar import school_days
+    from timetable import routines_on, version_start
+
+    teachers = {code: teacher_id for teacher_id, code in db.session.query(Teacher.id, Teacher.teacher_id)}
+    unknown = [code for code in absent_codes if code not in teachers]
+    if unknown:
+        raise SimulationError(f'Unknown teacher(s): {", ".join(unknown)}')
+    teacher_ids = sorted(teachers.values())
+
+    term = school_days(start, end)
+    if not term:
+        raise SimulationError(f'No school days between {start} and {end}')
+
+    first_week = start - timedelta(days=start.weekday())
+    days, timetables = [], {}
+    for date_obj, day in term:
+        key = (version_start(date_obj), day)
+        if key not in timetables:
+            timetables[key] = tuple(dict(index) for index in day_timetable(routines_on(date_obj, day)))
+        days.append(((date_obj - first_week).days // 7, key))
+
+    rates, starts, carry_over, masks = _absence_history(start, teacher_ids)
+    return Snapshot(teacher_ids, days, timetables, rates, starts, carry_over, masks,
+                    frozenset(teachers[code] for code in absent_codes))
+
+
+def _simulate_term(snapshot, rng):
+    """One trial: (uncovered classes per day, {teacher id: [covers per week]})."""
+    absent_yesterday = {}
+    week_loads = defaultdict(dict)
+    uncovered = []
+    for week, key in snapshot.days:
+        absent = {}
+        for teacher_id in snapshot.teacher_ids:
+            if teacher_id in snapshot.forced:
+                absent[teacher_id] = ALL_PERIODS
+                continue
+            chance = snapshot.starts.get(teacher_id)
+            if not chance:
+                continue
+            if teacher_id in absent_yesterday:
+                chance = snapshot.carry_over
+            if rng.random() < chance:
+                absent[teacher_id] = rng.choice(snapshot.masks[teacher_id])
+        absent_yesterday = absent
+
+        slots, classes = snapshot.timetables[key]
+        missed = assign_covers(absent, slots, classes, snapshot.teacher_ids, week_loads[week])[1]
+        uncovered.append(len(missed))
+
+    loads = defaultdict(list)
+    for week_load in week_loads.values():
+        for teacher_id, covers in week_load.items():
+            loads[teacher_id].append(covers)
+    return uncovered, loads
+
+
+# The snapshot of a pool worker, set once by _init_worker rather than pickled per task
+_snapshot = None
+
+
+def _init_worker(snapshot):
+    global _snapshot
+    _snapshot = snapshot
+
+
+def _run_trials(task):
+    """Partial totals of trials first..first+count-1."""
+    first, count, seed = task
+    per_day = Counter()
+    term_totals = []
+    covers = Counter()
+    worst_week = Counter()
+    for trial in range(first, first + count):
+        uncovered, loads = _simulate_term(_snapshot, random.Random(seed + trial))
+        per_day.update(uncovered)
+        term_totals.append(sum(uncovered))
+        for teacher_id, weeks in loads.items():
+            covers[teacher_id] += sum(weeks)
+            worst_week[teacher_id] = max(worst_week[teacher_id], max(weeks))
+    return per_day, term_totals, covers, worst_week
+
+
+def _percentile(counts, fraction):
+    """Value at `fraction` of a {value: occurrences} distribution."""
+    total = sum(counts.values())
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= fraction * total:
+            return value
+    return 0
+
+
+def simulate(start, end, trials=200, absent_codes=(), workers=None, seed=0):
+    """
+    Run `trials` simulated terms from `start` to `end` and summarize the
+    uncovered classes per day and per term, and each teacher's cover load.
+    """
+    from models import Teacher
+
+    started = time.perf_counter()
+    snapshot = build_snapshot(start, end, absent_codes)
+
+    chunks = max(1, min(trials, (workers or multiprocessing.cpu_count()) * 4))
+    tasks = [(trials * i // chunks, trials * (i + 1) // chunks - trials * i // chunks, seed)
+             for i in range(chunks)]
+    if workers == 1 or len(tasks) < 2:
+        _init_worker(snapshot)
+        results = [_run_trials(task) for task in tasks]
+    else:
+        # spawn: forking a threaded web worker is unsafe
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(snapshot,)) as pool:
+            results = list(pool.map(_run_trials, tasks))
+
+    per_day, term_totals, covers, worst_week = Counter(), [], Counter(), Counter()
+    for day_counts, totals, teacher_covers, teacher_worst in results:
+        per_day.update(day_counts)
+        term_totals += totals
+        covers.update(teacher_covers)
+        for teacher_id, worst in teacher_worst.items():
+            worst_week[teacher_id] = max(worst_week[teacher_id], worst)
+
+    weeks = len({week for week, _ in snapshot.days})
+    simulated_days = trials * len(snapshot.days)
+    names = dict(db.session.query(Teacher.id, Teacher.name))
+    codes = dict(db.session.query(Teacher.id, Teacher.teacher_id))
+    totals = Counter(term_totals)
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'trials': trials,
+        'school_days': len(snapshot.days),
+        'simulated_days': simulated_days,
+        'forced_absent': sorted(codes[t] for t in snapshot.forced),
+        'carry_over': round(snapshot.carry_over, 3),
+        'uncovered_per_day': {
+            'mean': round(sum(n * days for n, days in per_day.items()) / simulated_days, 3),
+            'p50': _percentile(per_day, 0.5),
+            'p90': _percentile(per_day, 0.9),
+            'p99': _percentile(per_day, 0.99),
+            'max': max(per_day),
+            'days_with_uncovered': round(1 - per_day[0] / simulated_days, 3),
+            'histogram': {str(n): per_day[n] for n in sorted(per_day)},
+        },
+        'uncovered_per_term': {
+            'mean': round(sum(term_totals) / trials, 2),
+            'p10': _percentile(totals, 0.1),
+            'p50': _percentile(totals, 0.5),
+            'p90': _percentile(totals, 0.9),
+            'max': max(term_totals),
+        },
+        'teachers': sorted(({
+            'id': teacher_id,
+            'teacher_id': codes[teacher_id],
+            'name': names[teacher_id],
+            'absence_rate': round(snapshot.rates.get(teacher_id, 0.0), 3),
+            'covers_per_week': round(covers[teacher_id] / trials / weeks, 2),
+            'worst_week': worst_week[teacher_id],
+        } for teacher_id in snapshot.teacher_ids), key=lambda row: -row['covers_per_week']),
+        'duration': round(time.perf_counter() - started, 2),
+    }
+
+
+def init_simulator_cli(app):
+    @app.cli.command('simulate')
+    @click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='First day of the term (default: today).')
+    @click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Last day of the term (default: 13 weeks after the start).')
+    @click.option('--trials', type=click.IntRange(1), default=200, show_default=True,
+                  help='Simulated terms.')
+    @click.option('--absent', 'absent_codes', multiple=True, metavar='TEACHER_ID',
+                  help='Teacher absent for the whole term (repeatable).')
+    @click.option('--workers', type=int, default=None, help='Processes for the trials (default: CPUs).')
+    @click.option('--seed', type=int, default=0, show_default=True)
+    @click.option('--top', type=int, default=10, show_default=True, help='Teachers listed by cover load.')
+    @click.option('--json', 'json_path', type=click.Path(dir_okay=False),
+                  help='Write the full result to this JSON file.')
+    def simulate_command(start, end, trials, absent_codes, workers, seed, top, json_path):
+        """Simulate a term's absences and report uncovered classes and cover load."""
+        start = start.date() if start else get_current_date()
+        end = end.date() if end else start + timedelta(weeks=13, days=-1)
+        try:
+            result = simulate(start, end, trials, absent_codes, workers, seed)
+        except SimulationError as e:
+            raise click.ClickException(str(e))
+
+        day, term = result['uncovered_per_day'], result['uncovered_per_term']
+        click.echo(f'{result["trials"]} trial(s) x {result["school_days"]} school day(s) '
+                   f'= {result["simulated_days"]} simulated days in {result["duration"]:.1f}s.')
+        if result['forced_absent']:
+            click.echo(f'Absent all term: {", ".join(result["forced_absent"])}')
+        click.echo(f'Uncovered classes per day: mean {day["mean"]}, p50 {day["p50"]}, p90 {day["p90"]}, '
+                   f'p99 {day["p99"]}, max {day["max"]}; {day["days_with_uncovered"]:.1%} of days short.')
+        click.echo(f'Uncovered classes per term: mean {term["mean"]}, p10 {term["p10"]}, '
+                   f'p50 {term["p50"]}, p90 {term["p90"]}, max {term["max"]}.')
+        click.echo('Highest cover load (covers per week, worst week):')
+        for row in result['teachers'][:top]:
+            click.echo(f'  {row["teacher_id"]:<10} {row["name"]:<30} {row["covers_per_week"]:>6} '
+                       f'{row["worst_week"]:>4}')
+        if json_path:
+            with open(json_path, 'w') as f:
+                json.dump(result, f, indent=2)
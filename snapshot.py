@@ -0,0 +1,338 @@
+"""
+Full-database snapshot and restore.
+
+A snapshot is a directory holding manifest.json and one <table>.jsonl.gz
+per model table. Each line of a table file is one chunk of up to
+SNAPSHOT_CHUNK_SIZE rows stored column-major ({"column": [values, ...]}),
+which gzip compresses far better than row-wise dumps. Tables are read in
+primary-key order as of one point in time: on PostgreSQL by parallel worker
+threads whose REPEATABLE READ transactions share one exported snapshot
+(pg_export_snapshot), elsewhere one after another in a single transaction.
+
+Restore creates missing tables, then deletes the old rows and loads every
+table in foreign key order in one transaction, so a failed load leaves the
+database as it was. PostgreSQL uses COPY, SQLite batched executemany
+inserts. Serial id sequences are reset afterwards.
+
+The manifest records a row count and a SHA-256 over every table's rows;
+restore and `flask snapshot verify` recompute both from the database.
+
+    flask --app main snapshot create [--output DIR]
+    flask --app main snapshot restore DIR [--force]
+    flask --app main snapshot verify DIR
+"""
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import click
+from sqlalchemy import Date, DateTime, func, select, text
+
+from app import db
+
+FORMAT_VERSION = 1
+SNAPSHOT_CHUNK_SIZE = 5000
+MANIFEST_NAME = 'manifest.json'
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Value encoding
+# ---------------------------------------------------------------------------
+
+def _encode(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _decoder(column):
+    if isinstance(column.type, DateTime):
+        return lambda v: None if v is None else datetime.fromisoformat(v)
+    if isinstance(column.type, Date):
+        return lambda v: None if v is None else date.fromisoformat(v)
+    return lambda v: v
+
+
+class _Checksum:
+    """SHA-256 over the JSON encoding of each row, in primary-key order."""
+
+    def __init__(self):
+        self._hash = hashlib.sha256()
+        self.rows = 0
+
+    def update(self, row):
+        self._hash.update(json.dumps(row, separators=(',', ':')).encode('utf-8'))
+        self._hash.update(b'\n')
+        self.rows += 1
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def _tables():
+    import models  # noqa: F401  (registers every model table)
+    return db.metadata.sorted_tables
+
+
+def _ordered_select(table):
+    return select(table).order_by(*table.primary_key.columns)
+
+
+def _iter_encoded_rows(connection, table):
+    result = connection.execution_options(stream_results=True, yield_per=SNAPSHOT_CHUNK_SIZE) \
+        .execute(_ordered_select(table))
+    for row in result:
+        yield [_encode(value) for value in row]
+
+
+# ---------------------------------------------------------------------------
+# Create
+# ---------------------------------------------------------------------------
+
+def _dump_table(connection, table, directory):
+    columns = [column.name for column in table.columns]
+    checksum = _Checksum()
+    filename = f'{table.name}.jsonl.gz'
+    with gzip.open(os.path.join(directory, filename), 'wt', encoding='utf-8', compresslevel=6) as out:
+        chunk = []
+
+        def flush():
+            out.write(json.dumps({name: [row[i] for row in chunk] for i, name in enumerate(columns)},
+                                 separators=(',', ':')))
+            out.write('\n')
+            chunk.clear()
+
+        for row in _iter_encoded_rows(connection, table):
+            checksum.update(row)
+            chunk.append(row)
+            if len(chunk) >= SNAPSHOT_CHUNK_SIZE:
+                flush()
+        if chunk:
+            flush()
+    return table.name, {'file': filename, 'columns': columns,
+                        'rows': checksum.rows, 'sha256': checksum.hexdigest()}
+
+
+def _dump_tables(engine, tables, directory, workers):
+    """{table name: manifest entry} for every table, all read as of the same moment."""
+    if engine.dialect.name == 'postgresql':
+        # Worker transactions adopt the coordinator's snapshot, which must stay open until they do
+        with engine.connect().execution_options(isolation_level='REPEATABLE READ') as coordinator, \
+                coordinator.begin():
+            snapshot_id = coordinator.execute(text('SELECT pg_export_snapshot()')).scalar()
+
+            def dump(table):
+                with engine.connect().execution_options(isolation_level='REPEATABLE READ') as connection, \
+                        connection.begin():
+                    connection.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+                    return _dump_table(connection, table, directory)
+
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return dict(pool.map(dump, tables))
+
+    with engine.connect() as connection:
+        if engine.dialect.name == 'sqlite':
+            connection.exec_driver_sql('BEGIN')  # pysqlite starts no transaction for reads
+        results = dict(_dump_table(connection, table, directory) for table in tables)
+        connection.rollback()
+    return results
+
+
+def create_snapshot(directory, workers=4):
+    """Write a snapshot of every model table into `directory`; returns the manifest."""
+    os.makedirs(directory, exist_ok=True)
+    engine = db.engine
+    tables = _tables()
+    results = _dump_tables(engine, tables, directory, workers)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'dialect': engine.dialect.name,
+        # Restore order: parents before children
+        'tables': {table.name: results[table.name] for table in tables},
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# ---------------------------------------------------------------------------
+# Restore
+# ---------------------------------------------------------------------------
+
+def load_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise SnapshotError(f'{directory} is not a snapshot (no {MANIFEST_NAME})')
+    if manifest.get('format') != FORMAT_VERSION:
+        raise SnapshotError(f'Unsupported snapshot format {manifest.get("format")}')
+    return manifest
+
+
+def _read_chunks(directory, info):
+    with gzip.open(os.path.join(directory, info['file']), 'rt', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _dependency_levels(tables):
+    """Group tables so that each level only references tables in earlier levels."""
+    levels, placed = [], set()
+    remaining = list(tables)
+    while remaining:
+        level = [t for t in remaining
+                 if all(fk.column.table.name in placed or fk.column.table is t for fk in t.foreign_keys)]
+        if not level:
+            raise SnapshotError('Circular foreign keys between tables')
+        levels.append(level)
+        placed.update(t.name for t in level)
+        remaining = [t for t in remaining if t not in level]
+    return levels
+
+
+def _copy_chunk(connection, table, columns, rows):
+    """PostgreSQL COPY ... FROM STDIN for one chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if v is None else ('t' if v is True else 'f' if v is False else v) for v in row])
+    buffer.seek(0)
+    column_list = ', '.join(f'"{name}"' for name in columns)
+    cursor = connection.connection.driver_connection.cursor()
+    try:
+        cursor.copy_expert(f'COPY "{table.name}" ({column_list}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')',
+                           buffer)
+    finally:
+        cursor.close()
+
+
+def _load_table(connection, table, directory, info):
+    decoders = {column.name: _decoder(column) for column in table.columns}
+    columns = info['columns']
+    postgresql = connection.dialect.name == 'postgresql'
+    for chunk in _read_chunks(directory, info):
+        raw_rows = list(zip(*(chunk[name] for name in columns)))
+        if postgresql:
+            _copy_chunk(connection, table, columns, raw_rows)
+        else:
+            connection.execute(table.insert(), [
+                {name: decoders[name](value) for name, value in zip(columns, row)} for row in raw_rows
+            ])
+    if postgresql:
+        column = table.autoincrement_column
+        if column is not None:
+            # COPY bypasses the serial default; move the sequence past the loaded ids
+            connection.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table.name}\"', '{column.name}'), "
+                f"COALESCE((SELECT MAX(\"{column.name}\") FROM \"{table.name}\"), 0) + 1, false)"))
+    return table.name
+
+
+def verify_snapshot(directory, manifest=None, workers=4):
+    """Compare row counts and checksums of the live database with a snapshot. Returns mismatches."""
+    manifest = manifest or load_manifest(directory)
+    engine = db.engine
+    tables = {t.name: t for t in _tables()}
+
+    def check(name):
+        if name not in tables:
+            return name, 'table missing from the models'
+        checksum = _Checksum()
+        with engine.connect() as connection:
+            for row in _iter_encoded_rows(connection, tables[name]):
+                checksum.update(row)
+        expected = manifest['tables'][name]
+        if checksum.rows != expected['rows']:
+            return name, f'{checksum.rows} rows, snapshot has {expected["rows"]}'
+        if checksum.hexdigest() != expected['sha256']:
+            return name, 'checksum mismatch'
+        return name, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(check, manifest['tables'])
+    return {name: problem for name, problem in results if problem}
+
+
+def restore_snapshot(directory, force=False, workers=4):
+    """
+    Replace the configured database's rows with a snapshot, all or nothing.
+    Returns the table mismatches after loading.
+    """
+    from app import init_schema
+
+    manifest = load_manifest(directory)
+    init_schema()
+    engine = db.engine
+    tables = [t for t in _tables() if t.name in manifest['tables']]
+
+    with engine.begin() as connection:
+        non_empty = [t.name for t in tables
+                     if connection.execute(select(func.count()).select_from(t)).scalar()]
+        if non_empty and not force:
+            raise SnapshotError(f'Tables not empty: {", ".join(non_empty)} (use --force to replace them)')
+        for table in reversed(tables):
+            connection.execute(table.delete())
+        # Same transaction: if any table fails to load, the old rows come back
+        for level in _dependency_levels(tables):
+            for table in level:
+                _load_table(connection, table, directory, manifest['tables'][table.name])
+
+    return verify_snapshot(directory, manifest, workers=workers)
+
+
+def init_snapshot_cli(app):
+    @app.cli.group('snapshot')
+    def snapshot_cli():
+        """Snapshot, restore and verify the whole database."""
+
+    @snapshot_cli.command('create')
+    @click.option('--output', type=click.Path(file_okay=False),
+                  default=lambda: f'snapshots/snapshot-{datetime.now():%Y%m%d-%H%M%S}')
+    @click.option('--workers', type=int, default=4, help='Tables dumped in parallel (PostgreSQL only).')
+    def create_command(output, workers):
+        """Write every model table to a compressed snapshot directory."""
+        manifest = create_snapshot(output, workers=workers)
+        total = sum(t['rows'] for t in manifest['tables'].values())
+        click.echo(f'Snapshot of {len(manifest["tables"])} table(s), {total} row(s) written to {output}')
+
+    @snapshot_cli.command('restore')
+    @click.argument('directory', type=click.Path(exists=True, file_okay=False))
+    @click.option('--force', is_flag=True, help='Delete existing rows before loading.')
+    @click.option('--workers', type=int, default=4, help='Tables verified in parallel.')
+    def restore_command(directory, force, workers):
+        """Load a snapshot and verify row counts and checksums."""
+        try:
+            problems = restore_snapshot(directory, force=force, workers=workers)
+        except SnapshotError as e:
+            raise click.ClickException(str(e))
+        if problems:
+            for name, problem in problems.items():
+                click.echo(f'  {name}: {problem}')
+            raise click.ClickException('Restore finished but verification failed')
+        click.echo('Restore complete; row counts and checksums match.')
+
+    @snapshot_cli.command('verify')
+    @click.argument('directory', type=click.Path(exists=True, file_okay=False))
+    def verify_command(directory):
+        """Check that the database matches a snapshot."""
+        try:
+            problems = verify_snapshot(directory)
+        except SnapshotError as e:
+            raise click.ClickException(str(e))
+        for name, problem in problems.items():
+            click.echo(f'  {name}: {problem}')
+        if problems:
+            raise click.ClickException('Database does not match the snapshot')
+        click.echo('Database matches the snapshot.')
@@ -6,36 +6,6 @@ document.addEventListener('DOMContentLoaded', function() {
     const selectedTeachersList = document.getElementById('selectedTeachersList');
     const cancelBtn = document.getElementById('cancelBtn');
     const teacherTable = document.getElementById('teacherTable');
-    const dateInput = document.querySelector('input[name="date"]');
-    const daySelect = document.querySelector('select[name="day"]');
-    
-    // Initialize date and day mapping
-    const dayMap = {
-        0: 'Day 1',
-        1: 'Day 2',
-        2: 'Day 3',
-        3: 'Day 4',
-        4: 'Day 5',
-        5: 'Day 1', // Weekend defaults to Day 1
-        6: 'Day 1'  // Weekend defaults to Day 1
-    };
-    
-    // Update day based on selected date
-    function updateDayFromDate() {
-        if (dateInput.value) {
-            const selectedDate = new Date(dateInput.value);
-            const dayOfWeek = selectedDate.getDay();
-            daySelect.value = dayMap[dayOfWeek];
-        }
-    }
-    
-    // Initial update
-    if (dateInput && daySelect) {
-        updateDayFromDate();
-        
-        // Add event listener for date changes
-        dateInput.addEventListener('change', updateDayFromDate);
-    }
     
     // Search functionality
     if (teacherSearch) {
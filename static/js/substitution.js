@@ -1,7 +1,7 @@
 document.addEventListener('DOMContentLoaded', function() {
     // Elements
     const dateSelector = document.getElementById('dateSelector');
-    const editSubstitutionButtons = document.querySelectorAll('.edit-substitution');
+    const substitutionContent = document.getElementById('substitutionContent');
     const editSubstitutionModal = document.getElementById('editSubstitutionModal');
     const saveSubstitutionBtn = document.getElementById('saveSubstitutionBtn');
     
@@ -12,23 +12,109 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
-    // Edit substitution button click events
-    if (editSubstitutionButtons.length > 0) {
-        editSubstitutionButtons.forEach(button => {
-            button.addEventListener('click', function() {
-                const substitutionId = this.getAttribute('data-id');
-                
-                // Store the ID in the modal
-                document.getElementById('substitutionId').value = substitutionId;
-                
-                // Fetch available teachers for this period
-                fetchAvailableTeachers(substitutionId);
-                
-                // Show the modal
-                const modal = new bootstrap.Modal(editSubstitutionModal);
-                modal.show();
+    // Edit substitution button click events (delegated so live-inserted rows work too)
+    if (substitutionContent) {
+        substitutionContent.addEventListener('click', function(e) {
+            const button = e.target.closest('.edit-substitution');
+            if (!button) {
+                return;
+            }
+            const substitutionId = button.getAttribute('data-id');
+            
+            // Store the ID in the modal
+            document.getElementById('substitutionId').value = substitutionId;
+            
+            // Fetch available teachers for this period
+            fetchAvailableTeachers(substitutionId);
+            
+            // Show the modal
+            const modal = new bootstrap.Modal(editSubstitutionModal);
+            modal.show();
+        });
+    }
+    
+    // Live board: apply plan diffs pushed by the server
+    if (substitutionContent && substitutionContent.dataset.streamUrl && window.EventSource) {
+        const source = new EventSource(substitutionContent.dataset.streamUrl);
+        
+        source.addEventListener('snapshot', function(e) {
+            const data = JSON.parse(e.data);
+            const live = new Set(data.substitutions.map(sub => sub.slot));
+            substitutionContent.querySelectorAll('tr[data-slot]').forEach(row => {
+                if (!live.has(row.dataset.slot)) {
+                    removeRow(row);
+                }
             });
+            data.substitutions.forEach(upsertRow);
         });
+        
+        source.addEventListener('plan', function(e) {
+            const data = JSON.parse(e.data);
+            data.removed.forEach(sub => {
+                const row = findRow(sub.slot);
+                if (row) {
+                    removeRow(row);
+                }
+            });
+            data.added.forEach(upsertRow);
+            data.reassigned.forEach(upsertRow);
+            data.updated.forEach(upsertRow);
+        });
+    }
+    
+    function findRow(slot) {
+        return substitutionContent.querySelector(`tr[data-slot="${CSS.escape(slot)}"]`);
+    }
+    
+    function togglePeriodBlock(block) {
+        const hasRows = block.querySelector('tbody tr') !== null;
+        block.querySelector('.table-responsive').classList.toggle('d-none', !hasRows);
+        block.querySelector('.no-substitutions').classList.toggle('d-none', hasRows);
+    }
+    
+    function removeRow(row) {
+        const block = row.closest('.period-block');
+        row.remove();
+        togglePeriodBlock(block);
+    }
+    
+    function upsertRow(sub) {
+        const block = substitutionContent.querySelector(`.period-block[data-period="${sub.period}"]`);
+        if (!block) {
+            return;
+        }
+        let row = findRow(sub.slot);
+        if (!row) {
+            row = document.createElement('tr');
+            row.dataset.slot = sub.slot;
+            row.innerHTML = '<td class="original-teacher"></td><td class="substitute-teacher"></td>' +
+                            '<td></td><td></td><td class="substitution-action"></td>';
+            block.querySelector('tbody').appendChild(row);
+        } else if (row.cells[1].textContent !== (sub.substitute_teacher || 'No free teacher')) {
+            row.classList.add('table-info');
+        }
+        row.classList.toggle('table-danger', Boolean(sub.uncovered));
+        row.cells[0].textContent = sub.original_teacher;
+        row.cells[1].textContent = sub.substitute_teacher || 'No free teacher';
+        row.cells[2].textContent = sub.class_name;
+        row.cells[3].textContent = sub.section || '';
+        
+        const action = row.cells[4];
+        action.innerHTML = '';
+        if (sub.uncovered) {
+            action.innerHTML = '<span class="badge bg-danger">' +
+                               '<i class="fas fa-exclamation-triangle me-1"></i> Uncovered</span>';
+        } else if (sub.transfer_requests > 0) {
+            action.innerHTML = '<span class="badge bg-warning text-dark">' +
+                               '<i class="fas fa-sync-alt me-1"></i> Transfer Requested</span>';
+        } else {
+            const button = document.createElement('button');
+            button.className = 'btn btn-sm btn-outline-primary edit-substitution';
+            button.dataset.id = sub.id;
+            button.innerHTML = '<i class="fas fa-edit me-1"></i> Edit';
+            action.appendChild(button);
+        }
+        togglePeriodBlock(block);
     }
     
     // Save substitution changes
@@ -1,69 +1,70 @@
 document.addEventListener('DOMContentLoaded', function() {
-    // Elements
-    const transferRequestButtons = document.querySelectorAll('.approve-transfer, .reject-transfer');
-    
-    // Handle approve/reject transfer requests
-    if (transferRequestButtons.length > 0) {
-        transferRequestButtons.forEach(button => {
-            button.addEventListener('click', function() {
-                const transferId = this.getAttribute('data-id');
-                const action = this.classList.contains('approve-transfer') ? 'approve' : 'reject';
-                const url = `/admin/${action}_transfer/${transferId}`;
-                
-                // Confirm action
-                Swal.fire({
-                    title: `${action.charAt(0).toUpperCase() + action.slice(1)} Transfer?`,
-                    text: `Are you sure you want to ${action} this transfer request?`,
-                    icon: 'question',
-                    showCancelButton: true,
-                    confirmButtonText: `Yes, ${action} it`,
-                    cancelButtonText: 'No, cancel'
-                }).then((result) => {
-                    if (result.isConfirmed) {
-                        // Send AJAX request
-                        fetch(url, {
-                            method: 'POST',
-                            headers: {
-                                'Content-Type': 'application/json',
-                                'X-CSRFToken': getCsrfToken()
-                            }
-                        })
-                        .then(response => response.json())
-                        .then(data => {
-                            if (data.success) {
-                                // Show success message
-                                Swal.fire({
-                                    title: 'Success',
-                                    text: `Transfer request ${action}d successfully.`,
-                                    icon: 'success',
-                                    confirmButtonText: 'OK'
-                                }).then(() => {
-                                    // Reload page to reflect changes
-                                    window.location.reload();
-                                });
+    // Handle approve/reject transfer requests (delegated so swapped-in rows work too)
+    document.addEventListener('click', function(e) {
+        const button = e.target.closest('.approve-transfer, .reject-transfer');
+        if (!button) {
+            return;
+        }
+        const transferId = button.getAttribute('data-id');
+        const action = button.classList.contains('approve-transfer') ? 'approve' : 'reject';
+        const url = `/admin/${action}_transfer/${transferId}`;
+        
+        // Confirm action
+        Swal.fire({
+            title: `${action.charAt(0).toUpperCase() + action.slice(1)} Transfer?`,
+            text: `Are you sure you want to ${action} this transfer request?`,
+            icon: 'question',
+            showCancelButton: true,
+            confirmButtonText: `Yes, ${action} it`,
+            cancelButtonText: 'No, cancel'
+        }).then((result) => {
+            if (result.isConfirmed) {
+                // Send AJAX request
+                fetch(url, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': getCsrfToken()
+                    }
+                })
+                .then(response => response.json())
+                .then(data => {
+                    if (data.success) {
+                        // Show success message
+                        Swal.fire({
+                            title: 'Success',
+                            text: `Transfer request ${action}d successfully.`,
+                            icon: 'success',
+                            confirmButtonText: 'OK'
+                        }).then(() => {
+                            // Refresh only the pending table when HTMX is available
+                            if (window.htmx) {
+                                htmx.trigger(document.body, 'transfersChanged');
                             } else {
-                                Swal.fire({
-                                    title: 'Error',
-                                    text: data.message || `Failed to ${action} transfer.`,
-                                    icon: 'error',
-                                    confirmButtonText: 'OK'
-                                });
+                                window.location.reload();
                             }
-                        })
-                        .catch(error => {
-                            console.error('Error:', error);
-                            Swal.fire({
-                                title: 'Error',
-                                text: 'An unexpected error occurred.',
-                                icon: 'error',
-                                confirmButtonText: 'OK'
-                            });
+                        });
+                    } else {
+                        Swal.fire({
+                            title: 'Error',
+                            text: data.message || `Failed to ${action} transfer.`,
+                            icon: 'error',
+                            confirmButtonText: 'OK'
                         });
                     }
+                })
+                .catch(error => {
+                    console.error('Error:', error);
+                    Swal.fire({
+                        title: 'Error',
+                        text: 'An unexpected error occurred.',
+                        icon: 'error',
+                        confirmButtonText: 'OK'
+                    });
                 });
-            });
+            }
         });
-    }
+    });
     
     // Helper function to get CSRF token
     function getCsrfToken() {
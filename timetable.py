@@ -0,0 +1,260 @@
+"""
+Effective-dated timetable versions.
+
+TeacherRoutine rows apply to the dates in [valid_from, valid_to). Changing
+timetables from a date (a TimetableVersion) is copy-on-write: only the slots
+whose content changes are closed on that date and re-inserted from it, so
+unchanged slots, and the timetables of every teacher not edited, are shared
+by all versions. Past dates keep the timetable they were planned with, and
+replanning them gives the same covers.
+
+A date resolves to the latest version starting on or before it. The routines
+of one rotation day in one version are loaded with an indexed range query
+(day, valid_from <= start < valid_to) and cached on the 'timetable'
+DataVersion, so every date of a version shares one cached copy.
+
+class_index() inverts a cached day into {(class, section): {period: slots}}
+for the class timetable page, and class_conflicts() uses the
+(class_name, section, day, period) index to refuse double-booking a class
+when a schedule is saved.
+"""
+from bisect import bisect_right
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from app import db
+from cache import data_cache
+from utils import bump_data_versions, get_data_versions
+
+# Detached copy of a TeacherRoutine row, safe to cache across requests
+Slot = namedtuple('Slot', 'id teacher_id day period class_name section is_free')
+
+
+def active_routines(date_obj):
+    """TeacherRoutine query restricted to the rows in force on `date_obj`."""
+    from models import TeacherRoutine
+
+    return TeacherRoutine.query.filter(TeacherRoutine.valid_from <= date_obj,
+                                       TeacherRoutine.valid_to > date_obj)
+
+
+def version_starts(versions=None):
+    """Sorted effective_from dates of all timetable versions."""
+    from models import TimetableVersion
+
+    return data_cache.get_or_build(
+        'timetable-versions', '', [('timetable',)],
+        lambda: [start for (start,) in db.session.query(TimetableVersion.effective_from)
+                 .order_by(TimetableVersion.effective_from)],
+        versions=versions)
+
+
+def version_start(date_obj, versions=None):
+    """Start of the timetable version in force on `date_obj` (None: the original timetable)."""
+    starts = version_starts(versions)
+    index = bisect_right(starts, date_obj)
+    return starts[index - 1] if index else None
+
+
+def _day_slots(date_obj, day):
+    """(versions, version start, cached Slot tuple) of rotation `day` as timetabled on `date_obj`."""
+    from models import TeacherRoutine, TIMETABLE_START
+
+    versions = get_data_versions(('timetable',))
+    start = version_start(date_obj, versions) or TIMETABLE_START
+
+    def build():
+        rows = active_routines(start).filter(TeacherRoutine.day == day) \
+            .order_by(TeacherRoutine.period, TeacherRoutine.id).all()
+        return tuple(Slot(r.id, r.teacher_id, r.day, r.period, r.class_name, r.section or '', bool(r.is_free))
+                     for r in rows)
+
+    return versions, start, data_cache.get_or_build('timetable', (start, day), [('timetable',)], build,
+                                                    versions=versions)
+
+
+def routines_on(date_obj, day, teacher_id=None):
+    """Slots of rotation `day` as timetabled on `date_obj`, ordered by period."""
+    slots = _day_slots(date_obj, day)[2]
+    if teacher_id is not None:
+        return [slot for slot in slots if slot.teacher_id == teacher_id]
+    return list(slots)
+
+
+def class_index(date_obj, day):
+    """
+    Inverse index of rotation `day` as timetabled on `date_obj`:
+    {(class name, section): {period: [Slot]}}. Cached with the day's slots.
+    """
+    versions, start, slots = _day_slots(date_obj, day)
+
+    def build():
+        index = {}
+        for slot in slots:
+            if not slot.is_free:
+                index.setdefault((slot.class_name, slot.section), {}).setdefault(slot.period, []).append(slot)
+        return index
+
+    return data_cache.get_or_build('timetable-classes', (start, day), [('timetable',)], build, versions=versions)
+
+
+def _class_sort_key(class_section):
+    class_name, section = class_section
+    return (0, int(class_name), '', section) if class_name.isdigit() else (1, 0, class_name, section)
+
+
+def class_sections(date_obj):
+    """Every (class name, section) timetabled on `date_obj`'s version, in class order."""
+    from school_calendar import ROTATION_DAYS
+
+    found = set()
+    for day in ROTATION_DAYS:
+        found.update(class_index(date_obj, day))
+    return sorted(found, key=_class_sort_key)
+
+
+def class_timetable(date_obj, class_name, section):
+    """
+    One class-section on `date_obj`: its week as timetabled then, and the
+    rotation day of the date with each period's teachers merged with the
+    covers planned for it. Teachers are given as {'id', 'name'} dicts.
+    """
+    from models import Teacher, Substitution
+    from school_calendar import ROTATION_DAYS, day_for_date
+
+    section = section or ''
+    key = (class_name, section)
+    week = {day: class_index(date_obj, day).get(key, {}) for day in ROTATION_DAYS}
+    day = day_for_date(date_obj)
+
+    covers = {}
+    if day is not None:
+        # Uses the (date, class_name, section) index
+        for sub in Substitution.query.filter(Substitution.date == date_obj, Substitution.class_name == class_name,
+                                             db.func.coalesce(Substitution.section, '') == section):
+            covers.setdefault(sub.period, []).append(sub)
+
+    teacher_ids = {slot.teacher_id for by_period in week.values() for slots in by_period.values() for slot in slots}
+    teacher_ids |= {t for subs in covers.values() for sub in subs for t in (sub.teacher_id, sub.original_teacher_id)}
+    names = dict(db.session.query(Teacher.id, Teacher.name).filter(Teacher.id.in_(teacher_ids))) \
+        if teacher_ids else {}
+
+    def teachers(ids):
+        return [{'id': t, 'name': names.get(t, '?')} for t in ids]
+
+    periods = []
+    for period in range(1, 9):
+        scheduled = week[day].get(period, []) if day else []
+        periods.append({
+            'period': period,
+            'teachers': teachers(slot.teacher_id for slot in scheduled),
+            'covers': [{'substitute': teachers([sub.teacher_id])[0], 'original': teachers([sub.original_teacher_id])[0]}
+                       for sub in covers.get(period, [])],
+        })
+    return {
+        'class_name': class_name,
+        'section': section,
+        'date': date_obj,
+        'day': day,
+        'periods': periods,
+        'week': {d: {period: teachers(slot.teacher_id for slot in slots) for period, slots in by_period.items()}
+                 for d, by_period in week.items()},
+    }
+
+
+def class_conflicts(teacher_id, slots, effective_from):
+    """
+    Other teachers already booked, on or after `effective_from`, into the
+    class-section slots of `slots` ({(day, period): (class name, section)}).
+    Returns [(day, period, class name, section, teacher name)].
+    """
+    from models import Teacher, TeacherRoutine
+
+    wanted = {(day, period): (class_name, section or '') for (day, period), (class_name, section) in slots.items()
+              if class_name and class_name != 'Free'}
+    if not wanted:
+        return []
+    rows = db.session.query(TeacherRoutine.day, TeacherRoutine.period, TeacherRoutine.class_name,
+                            TeacherRoutine.section, Teacher.name) \
+        .join(Teacher, Teacher.id == TeacherRoutine.teacher_id) \
+        .filter(TeacherRoutine.class_name.in_({class_name for class_name, _ in wanted.values()}),
+                TeacherRoutine.day.in_({day for day, _ in wanted}),
+                TeacherRoutine.valid_to > effective_from,
+                TeacherRoutine.teacher_id != teacher_id)
+    conflicts = set()
+    for day, period, class_name, section, name in rows:
+        if wanted.get((day, period)) == (class_name, section or ''):
+            conflicts.add((day, period, class_name, section or '', name))
+    return sorted(conflicts)
+
+
+def teacher_change_dates(teacher_id):
+    """Dates on which a teacher's timetable changed, newest first."""
+    from models import TeacherRoutine, TIMETABLE_START, TIMETABLE_END
+
+    starts = db.session.query(TeacherRoutine.valid_from).filter_by(teacher_id=teacher_id)
+    ends = db.session.query(TeacherRoutine.valid_to).filter_by(teacher_id=teacher_id)
+    dates = {d for (d,) in starts.union(ends)} - {TIMETABLE_START, TIMETABLE_END}
+    return sorted(dates, reverse=True)
+
+
+def save_timetable(changes, effective_from, note=None):
+    """
+    Apply timetable changes from `effective_from` on, copy-on-write.
+    `changes` maps (teacher id, day, period) to (class name, section), or to
+    None to empty the slot; slots not listed are left alone. Later versions
+    keep the slots they changed themselves. The caller commits. Returns the
+    number of slots changed.
+    """
+    from models import TeacherRoutine, TimetableVersion, TIMETABLE_END
+
+    if not changes:
+        return 0
+    teacher_ids = {teacher_id for teacher_id, _, _ in changes}
+
+    if TimetableVersion.query.filter_by(effective_from=effective_from).first() is None:
+        db.session.add(TimetableVersion(effective_from=effective_from, note=note))
+
+    current = {(r.teacher_id, r.day, r.period): r for r in
+               active_routines(effective_from).filter(TeacherRoutine.teacher_id.in_(teacher_ids))}
+    # Where the next version of an empty slot starts, so the new row stops there
+    later = {(teacher_id, day, period): start for teacher_id, day, period, start in
+             db.session.query(TeacherRoutine.teacher_id, TeacherRoutine.day, TeacherRoutine.period,
+                              func.min(TeacherRoutine.valid_from))
+             .filter(TeacherRoutine.teacher_id.in_(teacher_ids), TeacherRoutine.valid_from > effective_from)
+             .group_by(TeacherRoutine.teacher_id, TeacherRoutine.day, TeacherRoutine.period)}
+
+    replaced, closed, rows = [], [], []
+    changed = 0
+    for key, value in changes.items():
+        old = current.get(key)
+        if old is None and value is None:
+            continue
+        if old is not None and value is not None and \
+                (old.class_name, old.section or '') == (value[0], value[1] or ''):
+            continue  # Unchanged: the existing row stays shared
+        changed += 1
+        if old is not None:
+            end = old.valid_to
+            (replaced if old.valid_from == effective_from else closed).append(old.id)
+        else:
+            end = later.get(key, TIMETABLE_END)
+        if value is not None:
+            teacher_id, day, period = key
+            class_name, section = value
+            rows.append({'teacher_id': teacher_id, 'day': day, 'period': period,
+                         'class_name': class_name, 'section': section or '',
+                         'is_free': class_name == 'Free',
+                         'valid_from': effective_from, 'valid_to': end})
+
+    if replaced:
+        TeacherRoutine.query.filter(TeacherRoutine.id.in_(replaced)).delete(synchronize_session=False)
+    if closed:
+        TeacherRoutine.query.filter(TeacherRoutine.id.in_(closed)) \
+            .update({TeacherRoutine.valid_to: effective_from}, synchronize_session=False)
+    if rows:
+        db.session.execute(TeacherRoutine.__table__.insert(), rows)
+
+    bump_data_versions(teachers=teacher_ids, timetable=True)
+    return changed
@@ -1,19 +1,120 @@
+import logging
+import time
+from collections import defaultdict
 from datetime import datetime, date
+from sqlalchemy import update
 from app import db
 
+logger = logging.getLogger(__name__)
+
+PERIOD_COUNT = 8
+ALL_PERIODS = (1 << PERIOD_COUNT) - 1  # Absence.periods bitmask for the whole day
+
 def get_current_date():
     """Get the current date in the format YYYY-MM-DD."""
     return datetime.now().date()
 
-def get_day_from_date(date_obj):
-    """Get the day name from a date object."""
-    days = ["Day 1", "Day 2", "Day 3", "Day 4", "Day 5", "Day 1", "Day 1"]
-    # Python's weekday() returns 0 for Monday and 6 for Sunday
-    weekday = date_obj.weekday()
-    # Convert to school days (only Day 1 to Day 5)
-    if weekday >= 5:  # Weekend
-        return "Day 1"  # Default to Day 1 for weekend
-    return days[weekday]
+def data_version_key(scope, ident='*'):
+    """Build the DataVersion key for a scope ('date', 'teacher', 'roster', 'calendar', 'timetable', 'all')."""
+    if isinstance(ident, (date, datetime)):
+        ident = ident.strftime('%Y-%m-%d')
+    return f'{scope}:{ident}'
+
+def get_data_versions(*keys):
+    """
+    Return the current version of each (scope, ident) pair as a tuple.
+    Unknown keys are reported as version 0.
+    """
+    from models import DataVersion
+
+    names = [data_version_key(*key) for key in keys]
+    rows = DataVersion.query.filter(DataVersion.key.in_(names)).all()
+    found = {row.key: row.version for row in rows}
+    return tuple(found.get(name, 0) for name in names)
+
+def get_data_updated_at(*keys):
+    """When any of the (scope, ident) counters last changed, or None if none has."""
+    from models import DataVersion
+
+    names = [data_version_key(*key) for key in keys]
+    return db.session.query(db.func.max(DataVersion.updated_at)).filter(DataVersion.key.in_(names)).scalar()
+
+def bump_data_versions(dates=(), teachers=(), roster=False, calendar=False, timetable=False):
+    """
+    Increment the change counters touched by a write. The 'all' counter is
+    always bumped so that school-wide views (history) see every change.
+    Changes are added to the current session; the caller commits them.
+    """
+    from models import DataVersion
+
+    keys = [('all',)]
+    keys += [('date', d) for d in set(dates)]
+    keys += [('teacher', t) for t in set(teachers)]
+    if roster:
+        keys.append(('roster',))
+    if calendar:
+        keys.append(('calendar',))
+    if timetable:
+        keys.append(('timetable',))
+
+    # One upsert, so two requests creating the same counter cannot collide;
+    # sorted keys make concurrent writers lock rows in the same order
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    now = datetime.now()
+    table = DataVersion.__table__
+    stmt = insert(table).values([{'key': name, 'version': 1, 'updated_at': now}
+                                 for name in sorted({data_version_key(*key) for key in keys})])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['key'],
+        set_={'version': table.c.version + 1, 'updated_at': now}
+    )
+    db.session.execute(stmt)
+
+def period_bit(period):
+    """Bit of `period` (1-8) in an Absence.periods mask."""
+    return 1 << (period - 1)
+
+def parse_periods(text):
+    """
+    Absence.periods mask from '5-8' or '1,3,6-8'. Empty text (or every
+    period) means the whole day and gives None. Raises ValueError.
+    """
+    mask = 0
+    for part in (text or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= PERIOD_COUNT:
+            raise ValueError(f'Periods must be between 1 and {PERIOD_COUNT}')
+        for period in range(first, last + 1):
+            mask |= period_bit(period)
+    return None if mask in (0, ALL_PERIODS) else mask
+
+def format_periods(mask):
+    """'All day', or the absent periods as ranges ('1-2, 5-8')."""
+    if not mask or mask == ALL_PERIODS:
+        return 'All day'
+    ranges, start = [], None
+    for period in range(1, PERIOD_COUNT + 2):
+        inside = period <= PERIOD_COUNT and mask & period_bit(period)
+        if inside and start is None:
+            start = period
+        elif not inside and start is not None:
+            ranges.append(f'{start}-{period - 1}' if period - 1 > start else str(start))
+            start = None
+    return ', '.join(ranges)
+
+def absent_periods(absence):
+    """Absence.periods mask with None (whole day) expanded to every period."""
+    return absence.periods or ALL_PERIODS
+
+def substitution_slot_key(sub):
+    """Identify a substitution by the slot being covered rather than its row id."""
+    return f'{sub.period}:{sub.original_teacher_id}:{sub.class_name}:{sub.section or ""}'
 
 def find_substitutes(date_str, day):
     """
@@ -24,73 +125,321 @@ def find_substitutes(date_str, day):
     3. For each period in their schedule, find teachers who are free at that time
     4. Assign a substitute teacher from the available free teachers
     """
-    # Convert string date to date object if needed
-    if isinstance(date_str, str):
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-    else:
-        date_obj = date_str
+    return plan_substitutions([(_as_date(date_str), day)])
+
+def day_timetable(routines):
+    """
+    Index one date's timetable for assign_covers(): ({period: {teacher id:
+    is free}}, {teacher id: routines with a class}).
+    """
+    slots = defaultdict(dict)
+    classes = defaultdict(list)
+    for routine in routines:
+        slots[routine.period][routine.teacher_id] = routine.is_free
+        if not routine.is_free:
+            classes[routine.teacher_id].append(routine)
+    return slots, classes
+
+def assign_covers(absent, slots, classes, teacher_ids, load):
+    """
+    The cover assignment of one date, without database access (the planner
+    and simulator.py share it). `absent` maps absent teachers to their
+    absent-period masks, in marking order; `slots` and `classes` come from
+    day_timetable(); `load` ({teacher id: covers given this week}) is
+    updated in place. Returns ([(absent teacher, substitute, routine)],
+    [(absent teacher, routine)] for the classes nobody can cover).
+    """
+    candidates = {}  # period -> teachers still available, in preference order
+    assigned, missed = [], []
+    for teacher_id, absent_mask in absent.items():
+        for routine in classes.get(teacher_id, ()):
+            bit = period_bit(routine.period)
+            if not absent_mask & bit:
+                continue  # Present for this period
+            available = candidates.get(routine.period)
+            if available is None:
+                slot = slots[routine.period]
+                unavailable = {t for t, mask in absent.items() if mask & bit}
+                # Teachers with a free period first, then those with nothing timetabled
+                available = [t for t in teacher_ids if slot.get(t) and t not in unavailable]
+                available += [t for t in teacher_ids if t not in slot and t not in unavailable]
+                candidates[routine.period] = available
+            
+            if available:
+                substitute_id = min(available, key=lambda t: load.get(t, 0))
+                load[substitute_id] = load.get(substitute_id, 0) + 1
+                available.remove(substitute_id)  # Now covering this period
+                assigned.append((teacher_id, substitute_id, routine))
+            else:
+                missed.append((teacher_id, routine))
+    return assigned, missed
+
+def plan_substitutions(days):
+    """
+    Replace the substitution plans of several (date, day) pairs in one pass:
+    the teachers and absences are loaded once, the timetable in force on each
+    date comes from the timetable cache (timetable.py), and the new covers
+    are written with one bulk insert and a single commit.
     
-    # Import models here to avoid circular imports
-    from models import Teacher, TeacherRoutine, Absence, Substitution
+    Only the periods in each absence's mask are covered. A cover goes to a
+    teacher with a free period, or else nothing timetabled, who is neither
+    absent in that period nor already covering it; among those, the one with
+    the fewest covers given that week (see assign_covers). Periods nobody can
+    cover are logged and stored as UncoveredSlot rows. Returns (assigned,
+    uncovered).
+    """
+    from models import Teacher, Absence, Substitution, UncoveredSlot
+    from metrics import observe_planning
+    from timetable import routines_on
+    from workload import record_covers, cover_change, covers_given_in_week, week_start
+    from notifier import enqueue, slot_payload
     
-    # Clear existing substitutions for this date
-    Substitution.query.filter_by(date=date_obj).delete()
-    db.session.commit()
+    days = dict(days)
+    if not days:
+        return 0, 0
+    dates = list(days)
+    started = time.perf_counter()
     
-    # Get absent teachers
-    absences = Absence.query.filter_by(date=date_obj).all()
+    # Remember who was involved in the old plans so their views are invalidated too
+    old_substitutions = Substitution.query.filter(Substitution.date.in_(dates)).all()
+    touched_teachers = set()
+    for old in old_substitutions:
+        touched_teachers.update((old.teacher_id, old.original_teacher_id))
     
-    # Process each absent teacher
+    # Clear existing substitutions and uncovered slots for these dates
+    record_covers(cover_change(old, -1) for old in old_substitutions)
+    Substitution.query.filter(Substitution.date.in_(dates)).delete(synchronize_session=False)
+    UncoveredSlot.query.filter(UncoveredSlot.date.in_(dates)).delete(synchronize_session=False)
+    
+    # One load of the teachers and the absences; the timetable of each date is cached
+    teacher_ids = [teacher_id for (teacher_id,) in db.session.query(Teacher.id).order_by(Teacher.id)]
+    absences = Absence.query.filter(Absence.date.in_(dates)).order_by(Absence.date, Absence.id).all()
+    absent = defaultdict(dict)  # date -> {teacher id: absent periods mask}, in marking order
     for absence in absences:
-        # Get the absent teacher's schedule for the day
-        absent_teacher_routines = TeacherRoutine.query.filter_by(
-            teacher_id=absence.teacher_id,
-            day=day,
-            is_free=False  # Only handle actual classes, not free periods
-        ).all()
+        absent[absence.date][absence.teacher_id] = absent_periods(absence)
+    
+    week_loads = {}             # week -> {teacher id: covers given}
+    new_rows = []
+    uncovered_rows = []
+    
+    for date_obj, absent_today in absent.items():
+        day = days[date_obj]
+        touched_teachers.update(absent_today)
+        week = week_start(date_obj)
+        if week not in week_loads:
+            week_loads[week] = covers_given_in_week(date_obj)
         
-        # For each class that needs a substitute
-        for routine in absent_teacher_routines:
-            # Find teachers who are free during this period
-            free_teachers = Teacher.query.join(TeacherRoutine).filter(
-                TeacherRoutine.day == day,
-                TeacherRoutine.period == routine.period,
-                TeacherRoutine.is_free == True,
-                Teacher.id != absence.teacher_id  # Exclude the absent teacher
-            ).all()
-            
-            # Create a list of available teachers
-            available_teachers = list(free_teachers)
-            
-            # Add teachers who don't have any routine for this period
-            all_teachers = Teacher.query.all()
-            teachers_with_routines = [t.teacher_id for t in TeacherRoutine.query.filter_by(
-                day=day,
-                period=routine.period
-            ).all()]
-            
-            for teacher in all_teachers:
-                if teacher.id not in [t.id for t in available_teachers] and \
-                   teacher.id != absence.teacher_id and \
-                   teacher.id not in teachers_with_routines:
-                    available_teachers.append(teacher)
-            
-            # If there are available teachers, assign the first one as substitute
-            if available_teachers:
-                substitute_teacher = available_teachers[0]
-                
-                # Create substitution record
-                substitution = Substitution(
-                    original_teacher_id=absence.teacher_id,
-                    teacher_id=substitute_teacher.id,
-                    date=date_obj,
-                    day=day,
-                    period=routine.period,
-                    class_name=routine.class_name,
-                    section=routine.section
-                )
-                db.session.add(substitution)
-                db.session.commit()
+        slots, classes = day_timetable(routines_on(date_obj, day))
+        assigned, missed = assign_covers(absent_today, slots, classes, teacher_ids, week_loads[week])
+        for teacher_id, substitute_id, routine in assigned:
+            touched_teachers.add(substitute_id)
+            new_rows.append({
+                'original_teacher_id': teacher_id,
+                'teacher_id': substitute_id,
+                'date': date_obj,
+                'day': day,
+                'period': routine.period,
+                'class_name': routine.class_name,
+                'section': routine.section,
+                'created_at': datetime.now(),
+            })
+            logger.debug("Assigned teacher %d to cover teacher %d on %s, period %d, class %s",
+                         substitute_id, teacher_id, date_obj, routine.period, routine.class_name)
+        for teacher_id, routine in missed:
+            uncovered_rows.append({
+                'teacher_id': teacher_id,
+                'date': date_obj,
+                'day': day,
+                'period': routine.period,
+                'class_name': routine.class_name,
+                'section': routine.section,
+                'created_at': datetime.now(),
+            })
+            logger.debug("No free teacher for teacher %d on %s, period %d, class %s",
+                         teacher_id, date_obj, routine.period, routine.class_name)
+    
+    if new_rows:
+        db.session.execute(Substitution.__table__.insert(), new_rows)
+        record_covers((row['date'], row['teacher_id'], row['original_teacher_id'], 1) for row in new_rows)
+        # Tell substitutes about covers they did not already have before this replan
+        old_covers = {(old.date, old.period, old.original_teacher_id, old.class_name, old.section or '',
+                       old.teacher_id) for old in old_substitutions}
+        enqueue((row['teacher_id'], 'assignment',
+                 slot_payload(row['date'], row['period'], row['class_name'], row['section'], row['original_teacher_id']))
+                for row in new_rows
+                if (row['date'], row['period'], row['original_teacher_id'], row['class_name'], row['section'] or '',
+                    row['teacher_id']) not in old_covers)
+    if uncovered_rows:
+        db.session.execute(UncoveredSlot.__table__.insert(), uncovered_rows)
+        logger.warning("No free teacher for %d class(es) on %s", len(uncovered_rows),
+                       ', '.join(sorted({str(row['date']) for row in uncovered_rows})))
+    
+    bump_data_versions(dates=dates, teachers=touched_teachers)
+    db.session.commit()
+    observe_planning(time.perf_counter() - started, len(new_rows), len(uncovered_rows))
+    return len(new_rows), len(uncovered_rows)
+
+def free_teachers(date_obj, day, period):
+    """
+    Teachers who can cover `period` on `date_obj`: nothing but a free period
+    timetabled then, not absent in that period (Absence.periods bit, or a
+    whole-day absence) and not already covering it.
+    """
+    from models import Teacher, TeacherRoutine, Absence, Substitution
+    
+    teaching = db.session.query(TeacherRoutine.teacher_id).filter(
+        TeacherRoutine.day == day,
+        TeacherRoutine.valid_from <= date_obj,
+        TeacherRoutine.valid_to > date_obj,
+        TeacherRoutine.period == period,
+        TeacherRoutine.is_free.isnot(True))
+    absent = db.session.query(Absence.teacher_id).filter(
+        Absence.date == date_obj,
+        Absence.periods.is_(None) | (Absence.periods.op('&')(period_bit(period)) != 0))
+    covering = db.session.query(Substitution.teacher_id).filter(
+        Substitution.date == date_obj,
+        Substitution.period == period)
+    return Teacher.query.filter(~Teacher.id.in_(teaching), ~Teacher.id.in_(absent),
+                                ~Teacher.id.in_(covering)).order_by(Teacher.name).all()
+
+def record_absences(entries, reported_by='admin'):
+    """
+    Create or update absences from (teacher id, date, periods mask or None)
+    entries with one bulk insert and one bulk update, then plan covers for
+    all their dates together (one commit). Dates must be school days.
+    Returns the dates planned.
+    """
+    from models import Absence
+    from school_calendar import day_for_date
+    
+    if not entries:
+        return []
+    entries = {(teacher_id, d): periods for teacher_id, d, periods in entries}
+    existing = {(a.teacher_id, a.date): a.id for a in Absence.query.filter(
+        Absence.teacher_id.in_({teacher_id for teacher_id, _ in entries}),
+        Absence.date.in_({d for _, d in entries}))}
+    days = {d: day_for_date(d) for _, d in entries}
+    
+    updates = [{'id': existing[key], 'periods': periods} for key, periods in entries.items() if key in existing]
+    inserts = [{
+        'teacher_id': teacher_id,
+        'date': d,
+        'day': days[d],
+        'reported_by': reported_by,
+        'periods': periods,
+        'created_at': datetime.now(),
+    } for (teacher_id, d), periods in entries.items() if (teacher_id, d) not in existing]
+    if updates:
+        db.session.execute(update(Absence), updates)
+    if inserts:
+        db.session.execute(Absence.__table__.insert(), inserts)
+    
+    # Commits the absences together with the new plans
+    plan_substitutions(days.items())
+    return sorted(days)
+
+def mark_absence_range(teacher_id, start, end, reason=None, reported_by='admin'):
+    """
+    Record leave from `start` to `end` and plan covers for it: one Absence per
+    school day is bulk-inserted, partial absences the teacher already had on
+    those dates are widened to the whole day, then all changed dates are
+    planned together. Returns (range, dates).
+    """
+    from models import Absence, AbsenceRange
+    from school_calendar import school_days
+    
+    days = school_days(start, end)
+    absence_range = AbsenceRange(teacher_id=teacher_id, start_date=start, end_date=end,
+                                 reason=reason, reported_by=reported_by)
+    db.session.add(absence_range)
+    db.session.flush()
+    
+    already_absent = {d: (absence_id, periods) for absence_id, d, periods in db.session.query(
+        Absence.id, Absence.date, Absence.periods).filter(
+        Absence.teacher_id == teacher_id, Absence.date.in_([d for d, _ in days]))}
+    widened = [{'id': absence_id, 'periods': None}
+               for absence_id, periods in already_absent.values() if periods is not None]
+    if widened:
+        db.session.execute(update(Absence), widened)
+    partial_days = {d for d, (_, periods) in already_absent.items() if periods is not None}
+    new_days = [(d, day) for d, day in days if d not in already_absent]
+    days = [(d, day) for d, day in days if d not in already_absent or d in partial_days]
+    if new_days:
+        db.session.execute(Absence.__table__.insert(), [{
+            'teacher_id': teacher_id,
+            'date': d,
+            'day': day,
+            'reported_by': reported_by,
+            'range_id': absence_range.id,
+            'created_at': datetime.now(),
+        } for d, day in new_days])
+    
+    # Commits the absences together with the new plans
+    plan_substitutions(days)
+    if not days:
+        db.session.commit()
+    return absence_range, [d for d, _ in days]
+
+def cancel_absence_range(range_id):
+    """Delete a leave range and its absences, and replan the dates. Returns the dates."""
+    from models import Absence, AbsenceRange
+    
+    absence_range = db.session.get(AbsenceRange, range_id)
+    if absence_range is None:
+        return []
+    days = [(a.date, a.day) for a in Absence.query.filter_by(range_id=range_id)]
+    Absence.query.filter_by(range_id=range_id).delete(synchronize_session=False)
+    db.session.delete(absence_range)
+    plan_substitutions(days)
+    if not days:
+        db.session.commit()
+    return [d for d, _ in days]
+
+def decide_transfers(decisions):
+    """
+    Approve or reject pending transfer requests ({transfer id: 'approved' or
+    'rejected'}); others are left alone. Approved covers move to the new
+    teacher with one bulk update. The caller commits. Returns the decided
+    transfers.
+    """
+    from models import Substitution, SubstitutionTransfer
+    from workload import record_covers, cover_change
+    from notifier import enqueue, slot_payload
+    
+    transfers = SubstitutionTransfer.query.filter(SubstitutionTransfer.id.in_(decisions),
+                                                  SubstitutionTransfer.status == 'pending').all()
+    if not transfers:
+        return []
+    now = datetime.now()
+    substitutions = {s.id: s for s in Substitution.query.filter(
+        Substitution.id.in_([t.substitution_id for t in transfers]))}
+    approved = [t for t in transfers if decisions[t.id] == 'approved']
+    if approved:
+        # Move each cover to the new teacher's count
+        record_covers(cover_change(substitutions[t.substitution_id], -1) for t in approved)
+        record_covers((substitutions[t.substitution_id].date, t.new_teacher_id,
+                       substitutions[t.substitution_id].original_teacher_id, 1) for t in approved)
+        db.session.execute(update(Substitution), [
+            {'id': t.substitution_id, 'teacher_id': t.new_teacher_id} for t in approved])
+    db.session.execute(update(SubstitutionTransfer), [
+        {'id': t.id, 'status': decisions[t.id], 'action_date': now} for t in transfers])
+    
+    # The requester hears the decision; on approval the new teacher gets the cover
+    notifications = []
+    for t in transfers:
+        sub = substitutions[t.substitution_id]
+        slot = slot_payload(sub.date, sub.period, sub.class_name, sub.section, sub.original_teacher_id)
+        notifications.append((t.original_teacher_id, f'transfer_{decisions[t.id]}',
+                              dict(slot, transfer_id=t.id, new_teacher_id=t.new_teacher_id)))
+        if decisions[t.id] == 'approved':
+            notifications.append((t.new_teacher_id, 'assignment', slot))
+    enqueue(notifications)
+    
+    # The absent teacher's feed names the substitute, so it changes too
+    bump_data_versions(dates=[s.date for s in substitutions.values()],
+                       teachers=[teacher_id for t in transfers for teacher_id in (t.original_teacher_id, t.new_teacher_id)]
+                       + [s.original_teacher_id for s in substitutions.values()])
+    return transfers
 
 def generate_substitution_plan(date_str):
     """
@@ -104,10 +453,20 @@ def generate_substitution_plan(date_str):
         date_obj = date_str
     
     # Import models here to avoid circular imports
-    from models import Substitution, SubstitutionTransfer
+    from models import Substitution, SubstitutionTransfer, UncoveredSlot
     
     # Get all substitutions for this date
     substitutions = Substitution.query.filter_by(date=date_obj).order_by(Substitution.period).all()
+    uncovered = UncoveredSlot.query.filter_by(date=date_obj).order_by(UncoveredSlot.period, UncoveredSlot.id).all()
+    
+    # Count pending transfer requests for all of them in one query
+    pending_transfers = dict(
+        db.session.query(SubstitutionTransfer.substitution_id, db.func.count(SubstitutionTransfer.id))
+        .filter(SubstitutionTransfer.substitution_id.in_([sub.id for sub in substitutions]),
+                SubstitutionTransfer.status == 'pending')
+        .group_by(SubstitutionTransfer.substitution_id)
+        .all()
+    )
     
     # Organize substitutions by period
     plan = {}
@@ -116,14 +475,12 @@ def generate_substitution_plan(date_str):
         for sub in substitutions:
             if sub.period == period:
                 # Check if there are pending transfer requests for this substitution
-                transfer_count = SubstitutionTransfer.query.filter_by(
-                    substitution_id=sub.id,
-                    status='pending'
-                ).count()
+                transfer_count = pending_transfers.get(sub.id, 0)
                 
                 # Add substitution details
                 period_subs.append({
                     'id': sub.id,
+                    'slot': substitution_slot_key(sub),
                     'original_teacher': sub.original_teacher.name,
                     'substitute_teacher': sub.substitute_teacher.name,
                     'class_name': sub.class_name,
@@ -131,6 +488,140 @@ def generate_substitution_plan(date_str):
                     'transfer_requests': transfer_count
                 })
         
+        # Classes nobody could cover are listed with the covers, without a substitute
+        for slot in uncovered:
+            if slot.period == period:
+                period_subs.append({
+                    'id': None,
+                    'slot': f'{slot.period}:{slot.teacher_id}:{slot.class_name}:{slot.section or ""}',
+                    'original_teacher': slot.teacher.name,
+                    'substitute_teacher': None,
+                    'class_name': slot.class_name,
+                    'section': slot.section,
+                    'transfer_requests': 0,
+                    'uncovered': True
+                })
+        
         plan[period] = period_subs
     
-    return plan
\ No newline at end of file
+    return plan
+
+def _as_date(date_str):
+    if isinstance(date_str, str):
+        return datetime.strptime(date_str, '%Y-%m-%d').date()
+    return date_str
+
+def cached_substitution_plan(date_str):
+    """
+    generate_substitution_plan() for a date, cached until the date's plan or
+    the teacher roster changes. Shared by the plan page, its period fragments,
+    the PDF report and the live board.
+    """
+    from cache import data_cache
+
+    date_obj = _as_date(date_str)
+    return data_cache.get_or_build('plan', date_obj, [('date', date_obj), ('roster',)],
+                                   lambda: generate_substitution_plan(date_obj))
+
+def dashboard_counts(today):
+    """Counters shown on the admin dashboard, cached until any write."""
+    from cache import data_cache
+    from models import Teacher, Absence, Substitution, SubstitutionTransfer
+
+    def build():
+        return {
+            'absent_count': Absence.query.filter_by(date=today).count(),
+            'teacher_count': Teacher.query.count(),
+            'substitution_count': Substitution.query.filter_by(date=today).count(),
+            'transfer_requests': SubstitutionTransfer.query.filter_by(status='pending').count(),
+        }
+
+    return data_cache.get_or_build('dashboard', today, [('all',), ('date', today)], build)
+
+def pending_transfer_rows():
+    """Pending transfer requests as plain rows, cached until any write."""
+    from cache import data_cache
+    from models import SubstitutionTransfer
+
+    def build():
+        return [{
+            'id': t.id,
+            'request_date': t.request_date.strftime('%Y-%m-%d %H:%M'),
+            'original_teacher': t.original_teacher.name,
+            'new_teacher': t.new_teacher.name,
+            'date': t.substitution.date,
+            'period': t.substitution.period,
+            'class_name': t.substitution.class_name,
+            'section': t.substitution.section,
+            'reason': t.reason,
+        } for t in SubstitutionTransfer.query.filter_by(status='pending')
+                                        .order_by(SubstitutionTransfer.request_date).all()]
+
+    return data_cache.get_or_build('pending_transfers', '*', [('all',)], build)
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_KINDS = ('absences', 'substitutions', 'transfers')
+
+def history_page(kind, page=1, per_page=HISTORY_PAGE_SIZE, year=None):
+    """
+    One page of a history table as plain rows, newest first. `year` selects
+    an archived academic year (see archive.py); None reads the live tables.
+    Returns (rows, has_next). Cached until any write.
+    """
+    from cache import data_cache
+
+    def build():
+        items = history_query(kind, year).offset((page - 1) * per_page).limit(per_page + 1).all()
+        rows = [history_row(kind, item) for item in items]
+        # One extra row was fetched to know whether another page exists
+        return rows[:per_page], len(rows) > per_page
+
+    return data_cache.get_or_build('history', f'{kind}:{year or "live"}:{page}:{per_page}', [('all',)], build)
+
+def history_query(kind, year=None):
+    """Ordered query over the live or archived table for a history kind."""
+    from models import (Absence, Substitution, SubstitutionTransfer,
+                        ArchivedAbsence, ArchivedSubstitution, ArchivedSubstitutionTransfer)
+
+    if kind == 'absences':
+        model = Absence if year is None else ArchivedAbsence
+        query = model.query.order_by(model.date.desc(), model.id.desc())
+    elif kind == 'substitutions':
+        model = Substitution if year is None else ArchivedSubstitution
+        query = model.query.order_by(model.date.desc(), model.period, model.id.desc())
+    else:
+        model = SubstitutionTransfer if year is None else ArchivedSubstitutionTransfer
+        query = model.query.order_by(model.request_date.desc(), model.id.desc())
+    if year is not None:
+        query = query.filter(model.academic_year == year)
+    return query
+
+def history_row(kind, item):
+    """Plain dict for a live or archived history row; archived rows carry the teacher names."""
+    archived = hasattr(item, 'academic_year')
+    if kind == 'absences':
+        return {
+            'date': item.date,
+            'day': item.day,
+            'teacher': item.teacher_name if archived else item.teacher.name,
+            'periods': format_periods(item.periods),
+            'reported_by': item.reported_by,
+            'created_at': item.created_at.strftime('%Y-%m-%d %H:%M') if item.created_at else '',
+        }
+    if kind == 'substitutions':
+        return {
+            'date': item.date,
+            'period': item.period,
+            'original_teacher': item.original_teacher_name if archived else item.original_teacher.name,
+            'substitute_teacher': item.teacher_name if archived else item.substitute_teacher.name,
+            'class_name': item.class_name,
+            'section': item.section,
+        }
+    return {
+        'request_date': item.request_date.strftime('%Y-%m-%d %H:%M'),
+        'original_teacher': item.original_teacher_name if archived else item.original_teacher.name,
+        'new_teacher': item.new_teacher_name if archived else item.new_teacher.name,
+        'reason': item.reason,
+        'status': item.status,
+        'action_date': item.action_date.strftime('%Y-%m-%d %H:%M') if item.action_date else None,
+    }
@@ -0,0 +1,165 @@
+"""
+Per-teacher weekly cover counters.
+
+TeacherWorkload (models.py) holds, for each teacher and week, how many periods
+they covered for colleagues (covers_given) and how many of their own periods
+someone else covered (covers_received). Every write that creates, removes or
+reassigns a Substitution calls record_covers() in the same transaction, so the
+counters never need a scan of Substitution: the analytics page and API read
+only the rollup, and find_substitutes() uses covers_given to spread covers
+evenly.
+
+`flask --app main workload rebuild` recomputes the table from the live and
+archived substitutions (after upgrading, or if the counters are ever in doubt).
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+import click
+from sqlalchemy import func, select, union_all
+
+from app import db
+from utils import bump_data_versions
+
+
+def week_start(day):
+    """Monday of the week containing `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def cover_change(substitution, delta=1):
+    """The record_covers() entry for adding (delta=1) or removing (delta=-1) a substitution."""
+    return substitution.date, substitution.teacher_id, substitution.original_teacher_id, delta
+
+
+def _increment(rows):
+    """Add covers_given/covers_received to existing rows, inserting missing ones."""
+    from models import TeacherWorkload
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = TeacherWorkload.__table__
+    stmt = insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['teacher_id', 'week_start'],
+        set_={
+            'covers_given': table.c.covers_given + stmt.excluded.covers_given,
+            'covers_received': table.c.covers_received + stmt.excluded.covers_received,
+        }
+    )
+    db.session.execute(stmt)
+
+
+def record_covers(changes):
+    """
+    Apply (date, substitute_id, original_id, delta) changes to the rollup.
+    Changes are added to the current session; the caller commits them.
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for day, substitute_id, original_id, delta in changes:
+        week = week_start(day)
+        totals[(substitute_id, week)][0] += delta
+        totals[(original_id, week)][1] += delta
+    rows = [{'teacher_id': teacher_id, 'week_start': week, 'covers_given': given, 'covers_received': received}
+            for (teacher_id, week), (given, received) in totals.items() if given or received]
+    if rows:
+        _increment(rows)
+
+
+def covers_given_in_week(day):
+    """{teacher id: covers given} for the week containing `day` (used by the planner)."""
+    from models import TeacherWorkload
+
+    return dict(db.session.query(TeacherWorkload.teacher_id, TeacherWorkload.covers_given)
+                .filter(TeacherWorkload.week_start == week_start(day)).all())
+
+
+def workload_summary(start, end):
+    """
+    Covers given and received per teacher for the weeks starting in [start, end],
+    busiest first. Cached until any write.
+    """
+    from cache import data_cache
+    from models import Teacher, TeacherWorkload
+
+    first, last = week_start(start), week_start(end)
+
+    def build():
+        given = func.coalesce(func.sum(TeacherWorkload.covers_given), 0)
+        received = func.coalesce(func.sum(TeacherWorkload.covers_received), 0)
+        rows = (db.session.query(Teacher.id, Teacher.teacher_id, Teacher.name, given, received)
+                .outerjoin(TeacherWorkload, (TeacherWorkload.teacher_id == Teacher.id)
+                           & TeacherWorkload.week_start.between(first, last))
+                .group_by(Teacher.id, Teacher.teacher_id, Teacher.name)
+                .order_by(given.desc(), Teacher.name)
+                .all())
+        return [{
+            'id': id_,
+            'teacher_id': code,
+            'name': name,
+            'covers_given': given_,
+            'covers_received': received_,
+            'balance': given_ - received_,
+        } for id_, code, name, given_, received_ in rows]
+
+    return data_cache.get_or_build('workload', f'{first}:{last}', [('all',)], build)
+
+
+def teacher_weeks(teacher_id, start, end):
+    """Week-by-week counters of one teacher, oldest first."""
+    from models import TeacherWorkload
+
+    rows = (TeacherWorkload.query
+            .filter(TeacherWorkload.teacher_id == teacher_id,
+                    TeacherWorkload.week_start.between(week_start(start), week_start(end)))
+            .order_by(TeacherWorkload.week_start)
+            .all())
+    return [{'week_start': r.week_start, 'covers_given': r.covers_given, 'covers_received': r.covers_received}
+            for r in rows]
+
+
+def rebuild_workload():
+    """Recompute the whole rollup from live and archived substitutions. Returns the row count."""
+    from models import Substitution, ArchivedSubstitution, TeacherWorkload, Teacher
+
+    subs = union_all(
+        select(Substitution.date, Substitution.teacher_id, Substitution.original_teacher_id),
+        select(ArchivedSubstitution.date, ArchivedSubstitution.teacher_id, ArchivedSubstitution.original_teacher_id),
+    )
+    teacher_ids = set(db.session.execute(select(Teacher.id)).scalars())
+
+    # Archived rows may name teachers that no longer exist; count only current teachers
+    totals = defaultdict(lambda: [0, 0])
+    for day, substitute_id, original_id in db.session.execute(subs):
+        if substitute_id in teacher_ids:
+            totals[(substitute_id, week_start(day))][0] += 1
+        if original_id in teacher_ids:
+            totals[(original_id, week_start(day))][1] += 1
+    rows = [{'teacher_id': teacher_id, 'week_start': week, 'covers_given': given, 'covers_received': received}
+            for (teacher_id, week), (given, received) in totals.items()]
+
+    try:
+        TeacherWorkload.query.delete()
+        if rows:
+            db.session.execute(TeacherWorkload.__table__.insert(), rows)
+        bump_data_versions()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(rows)
+
+
+def init_workload_cli(app):
+    @app.cli.group('workload')
+    def workload_cli():
+        """Maintain the per-teacher weekly cover counters."""
+
+    @workload_cli.command('rebuild')
+    def rebuild_command():
+        """Recompute the counters from all live and archived substitutions."""
+        count = rebuild_workload()
+        click.echo(f'Rebuilt {count} teacher-week row(s).')